@@ -0,0 +1,565 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
+
+import bootstrap
+import dashboard
+import engine
+import figure_cache
+from config import read_config
+from data import prepare_data
+from dataset import build_dataset, get_content_id, read_files, \
+    register_dataset
+from plotting import get_cluster_fill_data, get_spec_fill_data, get_view, \
+    plot_multiverse, plot_treemap
+from synthetic import EXTRA_VALUES, add_which_factors, write_synthetic
+
+# Scales of the synthetic datasets, relative to the OR data
+SCALES = [1, 10, 100]
+BASE_CONFIG = "static_data/config_OR.json"
+BASE_DATA = "static_data/data_OR.csv"
+
+# Number of iterations of the boot files, which are only read
+BOOT_ITER = 10
+
+# Effects of the synthetic dataset of the payload check, see
+# check_payload(), and the bytes its cluster tilemap may take per tile
+PAYLOAD_EFFECTS = 10000
+MAX_TILE_BYTES = 64
+
+# Benchmarks in the order they are run, see run_benchmarks()
+BENCHMARKS = [
+    "read_config",
+    "prepare_data",
+    "build_dataset",
+    "get_cluster_fill_data",
+    "get_spec_fill_data",
+    "update_multiverse",
+    "update_multiverse_cached",
+    "plot_multiverse",
+    "plot_treemap",
+    "figure_json"
+]
+
+
+def get_scaled_data(data, config_json, scale, seed=0):
+    """Scale the meta-analytic data and configuration.
+
+    The data is repeated scale times with new cluster and effect IDs and
+    jittered effect sizes, so the numbers of effects and clusters grow
+    linearly. Which-factors with random values are added, such that the
+    number of specifications grows by about the same factor.
+
+    Arguments:
+        data -- The prepared meta-analytic data, see data.prepare_data().
+        config_json -- The raw configuration as a dictionary.
+        scale -- The scale factor.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+
+    Returns:
+        A tuple of the scaled data and raw configuration.
+    """
+    rng = np.random.default_rng(seed)
+    colmap = config_json["colmap"]
+    key_c = colmap["key_c"]
+    key_c_id = colmap["key_c_id"]
+    key_e_id = colmap["key_e_id"]
+    es_keys = {colmap["key_logOR"], colmap["key_main_es"]}
+    c_offset = data[key_c_id].max()
+    e_offset = data[key_e_id].max()
+
+    parts = []
+    for i in range(scale):
+        part = data.copy()
+        part[key_c_id] += i * c_offset
+        part[key_e_id] += i * e_offset
+        if i > 0:
+            part[key_c] = part[key_c] + f" ({i + 1})"
+            for key in es_keys:
+                part[key] = part[key] + rng.normal(0, 0.05, len(part))
+        parts.append(part)
+    scaled = pd.concat(parts, ignore_index=True)
+
+    n_which = config_json["which"]["n"]
+    n_extra = round(math.log(scale) / math.log(len(EXTRA_VALUES) + 1))
+    config_json = add_which_factors(config_json, n_extra)
+    for key in config_json["which"]["keys"][n_which:]:
+        scaled[key] = rng.choice(EXTRA_VALUES, len(scaled))
+    return scaled, config_json
+
+
+def write_scaled_files(scale, directory, seed=0):
+    """Write the dataset files of a scaled dataset.
+
+    The specs and boot files are computed with engine.py and bootstrap.py.
+
+    Arguments:
+        scale -- The scale factor, see get_scaled_data().
+        directory -- The directory of the files.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+
+    Returns:
+        The paths of the boot, config, data and specs files.
+    """
+    with open(BASE_CONFIG, "r") as config_file:
+        config_json = json.load(config_file)
+    base = prepare_data(read_config(path=BASE_CONFIG)["colmap"],
+                        raw=BASE_DATA)
+    data, config_json = get_scaled_data(base, config_json, scale, seed)
+
+    paths = [os.path.join(directory, f"{name}_x{scale}.{ext}")
+             for name, ext in [("boot", "csv"), ("config", "json"),
+                               ("data", "csv"), ("specs", "csv")]]
+    boot_path, config_path, data_path, specs_path = paths
+    with open(config_path, "w") as config_file:
+        json.dump(config_json, config_file, indent=4)
+    data.to_csv(data_path, index=False, na_rep="NA")
+
+    config = read_config(path=config_path)
+    data = prepare_data(config["colmap"], raw=data_path)
+    engine.write_specs(data, config, specs_path, n_workers=1, progress=False)
+    boot = bootstrap.bootstrap_specs(data, config, BOOT_ITER, seed,
+                                     n_workers=1, progress=False)
+    boot.to_csv(boot_path, index=False)
+    return paths
+
+
+def get_payload_bytes(value):
+    """Get the size of a result as sent to or kept by the dashboard.
+
+    Arguments:
+        value -- A figure, callback outputs, array or string.
+
+    Returns:
+        The size in bytes, or None for other values.
+    """
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict) and "fills" in value:
+        return value["fills"].nbytes
+    if isinstance(value, (go.Figure, tuple)):
+        return len(to_json_plotly(value).encode("utf-8"))
+    return None
+
+
+def measure(func, repeat):
+    """Measure the time and peak memory of a function.
+
+    The function is timed repeat times, and run once more with tracemalloc
+    to measure the peak of the memory allocated by Python and NumPy.
+
+    Arguments:
+        func -- The function, called without arguments.
+        repeat -- The number of timed runs.
+
+    Returns:
+        A tuple of the measurements as a dictionary and the result of the
+        function.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": statistics.median(seconds),
+        "seconds_min": min(seconds),
+        "peak_bytes": peak,
+        "payload_bytes": get_payload_bytes(result)
+    }, result
+
+
+def run_benchmarks(paths, repeat, report):
+    """Run all benchmarks on the files of a dataset.
+
+    Arguments:
+        paths -- The paths of the dataset files, see write_scaled_files().
+        repeat -- The number of timed runs of each benchmark.
+        report -- Called with the measurements of each benchmark as soon as
+                  it finishes, in the order of BENCHMARKS.
+
+    Returns:
+        The size of the dataset as a dictionary.
+    """
+    _, config_path, data_path, _ = paths
+
+    def run(name, func):
+        measurements, result = measure(func, repeat)
+        report(dict(benchmark=name, **measurements))
+        return result
+
+    config = run("read_config", lambda: read_config(path=config_path))
+    colmap = config["colmap"]
+    run("prepare_data", lambda: prepare_data(colmap, raw=data_path))
+
+    contents = read_files(paths)
+    dataset = run("build_dataset", lambda: build_dataset(paths, contents))
+    dataset_id = get_content_id(paths, contents)
+    register_dataset(dataset_id, dataset)
+    data = dataset["data"]
+    specs = dataset["specs"]
+
+    run("get_cluster_fill_data",
+        lambda: get_cluster_fill_data(data, specs, colmap,
+                                      effect_bits=dataset["effect_bits"]))
+    run("get_spec_fill_data",
+        lambda: get_spec_fill_data(config["which_lists"],
+                                   config["how_lists"], specs))
+
+    # The filter chain of the multiverse tab, without and with a figure
+    # cache hit. The first cluster is deselected, so the bitsets are used.
+    factor_keys = list(dataset["factor_lists"])
+    args = ({"dataset_id": dataset_id}, None, [1], 2, [], [], 0.05,
+            dataset["kc_range"], dataset["k_range"], 0,
+            dataset["c_ids"][1:], dataset["e_ids"], factor_keys,
+            [None] * len(factor_keys))
+
+    def update_multiverse():
+        figure_cache.clear()
+        return dashboard.update_multiverse(1, *args)
+
+    run("update_multiverse", update_multiverse)
+    run("update_multiverse_cached",
+        lambda: dashboard.update_multiverse(1, *args))
+
+    fig = run("plot_multiverse", lambda: plot_multiverse(
+        specs,
+        dataset["n_total_specs"],
+        dataset["k_range"],
+        dataset["cluster_fill_data"],
+        dataset["spec_fill_data"],
+        config["labels"],
+        dataset["colors"],
+        dataset["level"],
+        "",
+        dataset["fill_levels"],
+        dataset["y_ticks"],
+        dataset["y_limits"],
+        get_view(dataset["n_total_specs"])
+    ))
+    run("plot_treemap", lambda: plot_treemap(data, "Multiverse", colmap))
+    run("figure_json", lambda: to_json_plotly(fig))
+
+    return {
+        "n_effects": dataset["n_es"],
+        "n_clusters": dataset["n_clusters"],
+        "n_factors": len(dataset["factor_lists"]),
+        "n_specs": dataset["n_total_specs"]
+    }
+
+
+def _run_scale(scale, directory, seed, repeat, messages):
+    """Generate and benchmark a scaled dataset in a child process.
+
+    Sends ("result", measurements) for each benchmark, then
+    ("dataset", size) with the peak resident memory of the process, or
+    ("error", message) if an exception is raised.
+    """
+    try:
+        paths = write_scaled_files(scale, directory, seed)
+        size = run_benchmarks(paths, repeat,
+                              lambda m: messages.put(("result", m)))
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        messages.put(("dataset", dict(size, max_rss_bytes=max_rss)))
+    except Exception as e:
+        messages.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_scale(scale, directory, seed=0, repeat=3, timeout=None,
+              report=None):
+    """Benchmark a scaled dataset in a child process.
+
+    A scale whose process fails, e.g. because it runs out of memory or
+    time, does not end the run: the failing benchmark is recorded with an
+    error, and the remaining benchmarks of the scale are skipped.
+
+    Arguments:
+        scale -- The scale factor, see get_scaled_data().
+        directory -- The directory of the dataset files.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+        repeat -- The number of timed runs of each benchmark
+                  (default: {3}).
+        timeout -- The time limit of the scale in seconds
+                   (default: {None}, no limit).
+        report -- Called with the measurements of each benchmark as soon as
+                  it finishes (default: {None}).
+
+    Returns:
+        A tuple of the size of the dataset as a dictionary (None if the
+        scale failed) and the list of measurements.
+    """
+    messages = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_run_scale, args=(scale, directory, seed, repeat, messages))
+    process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    size = None
+    results = []
+    error = None
+    while size is None and error is None:
+        try:
+            kind, value = messages.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                error = f"process exited with code {process.exitcode}"
+            elif deadline is not None and time.monotonic() > deadline:
+                process.kill()
+                error = f"timed out after {timeout}s"
+            continue
+        if kind == "result":
+            results.append(value)
+            if report is not None:
+                report(value)
+        elif kind == "dataset":
+            size = value
+        else:
+            error = value
+    process.join()
+
+    if error is not None:
+        failed = dict(benchmark=(BENCHMARKS[len(results)]
+                                 if len(results) < len(BENCHMARKS)
+                                 else "setup"), error=error)
+        results.append(failed)
+        if report is not None:
+            report(failed)
+    return size, results
+
+
+def _check_payload(directory, n_effects, seed, messages):
+    """Measure the cluster tilemap payload in a child process.
+
+    Sends ("payload", result) or ("error", message) if an exception is
+    raised.
+    """
+    try:
+        with open(BASE_CONFIG, "r") as config_file:
+            config_json = json.load(config_file)
+        paths = write_synthetic(config_json, directory, n_effects,
+                                name=f"payload{n_effects}", seed=seed,
+                                n_workers=1, n_iter=BOOT_ITER,
+                                progress=False)
+        dataset = build_dataset(paths, read_files(paths))
+        view = get_view(dataset["n_total_specs"])
+        fig = plot_multiverse(
+            dataset["specs"],
+            dataset["n_total_specs"],
+            dataset["k_range"],
+            dataset["cluster_fill_data"],
+            dataset["spec_fill_data"],
+            read_config(path=paths[1])["labels"],
+            dataset["colors"],
+            dataset["level"],
+            "",
+            dataset["fill_levels"],
+            dataset["y_ticks"],
+            dataset["y_limits"],
+            view
+        )
+        n_columns = (view["last"] - view["first"]) // view["step"] + 1
+        messages.put(("payload", {
+            "n_effects": dataset["n_es"],
+            "n_clusters": dataset["n_clusters"],
+            "n_columns": n_columns,
+            "tiles_bytes": len(to_json_plotly(fig.data[0]).encode("utf-8")),
+            "figure_bytes": get_payload_bytes(fig)
+        }))
+    except Exception as e:
+        messages.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def check_payload(directory, n_effects=PAYLOAD_EFFECTS, seed=0,
+                  timeout=None):
+    """Check that the cluster tilemap payload grows linearly.
+
+    The multiverse figure of a synthetic level-3 dataset with many
+    clusters is rendered in a child process. Its cluster tilemap must
+    take at most MAX_TILE_BYTES per tile, i.e. per cluster and column.
+
+    Arguments:
+        directory -- The directory of the dataset files.
+
+    Keyword Arguments:
+        n_effects -- The number of effects (default: {PAYLOAD_EFFECTS}).
+        seed -- The seed of the random number generator (default: {0}).
+        timeout -- The time limit in seconds (default: {None}, no limit).
+
+    Returns:
+        A dictionary with the size of the dataset and the payload in
+        bytes, and whether the check passed, or with an error if the
+        process failed.
+    """
+    messages = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_check_payload, args=(directory, n_effects, seed, messages))
+    process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            kind, value = messages.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                result = {"error": "process exited with code "
+                                   f"{process.exitcode}"}
+            elif deadline is not None and time.monotonic() > deadline:
+                process.kill()
+                result = {"error": f"timed out after {timeout}s"}
+            continue
+        result = value if kind == "payload" else {"error": value}
+    process.join()
+
+    if "error" not in result:
+        max_bytes = (MAX_TILE_BYTES * result["n_clusters"]
+                     * result["n_columns"])
+        result["passed"] = result["tiles_bytes"] <= max_bytes
+    return result
+
+
+def _get_commit():
+    """Get the abbreviated hash of the checked out commit, if any."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(results, baseline):
+    """Print the ratios of the measurements to those of a baseline run.
+
+    Arguments:
+        results -- The results, see __main__.
+        baseline -- The results of the baseline run.
+    """
+    base = {(r["scale"], r["benchmark"]): r for r in baseline["results"]}
+    print(f"Compared to {baseline['commit']}:")
+    for r in results["results"]:
+        b = base.get((r["scale"], r["benchmark"]))
+        if b is None or "error" in r or "error" in b:
+            continue
+        print(f"{r['scale']:>5}x {r['benchmark']:<26}"
+              f" time {r['seconds'] / max(b['seconds'], 1e-9):6.2f}x"
+              f"  memory {r['peak_bytes'] / max(b['peak_bytes'], 1):6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the hot paths of the dashboard on scaled "
+                    "copies of the OR data.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES,
+                        help="scales of the datasets relative to the OR data")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="number of timed runs of each benchmark")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random number generator")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="time limit of each scale in seconds")
+    parser.add_argument("--data-dir", default=None,
+                        help="directory of the generated dataset files "
+                             "(default: a temporary directory)")
+    parser.add_argument("--output", default=None,
+                        help="path of the results file "
+                             "(default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", default=None,
+                        help="path of the results file of a baseline run")
+    parser.add_argument("--payload-effects", type=int,
+                        default=PAYLOAD_EFFECTS,
+                        help="number of effects of the synthetic dataset of "
+                             "the payload check (0 to skip it)")
+    args = parser.parse_args()
+
+    commit = _get_commit()
+    results = {
+        "commit": commit,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "datasets": [],
+        "results": [],
+        "payload": None
+    }
+    output = args.output or f"benchmark-{commit}.json"
+
+    def report(m):
+        if "error" in m:
+            print(f"  {m['benchmark']:<26} failed: {m['error']}")
+            return
+        payload = ("" if m["payload_bytes"] is None
+                   else f"  payload {m['payload_bytes'] / 2**10:9.1f} KiB")
+        print(f"  {m['benchmark']:<26} {m['seconds'] * 1e3:10.2f} ms"
+              f"  peak {m['peak_bytes'] / 2**20:8.2f} MiB{payload}",
+              flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.data_dir or tmp_dir
+        os.makedirs(directory, exist_ok=True)
+        for scale in args.scales:
+            print(f"{scale}x:", flush=True)
+            size, measurements = run_scale(scale, directory, args.seed,
+                                           args.repeat, args.timeout, report)
+            if size is not None:
+                results["datasets"].append(dict(scale=scale, **size))
+                print(f"{scale}x: {size['n_effects']} effects, "
+                      f"{size['n_clusters']} clusters, {size['n_factors']} "
+                      f"factors, {size['n_specs']} specifications, peak "
+                      f"RSS {size['max_rss_bytes'] / 2**20:.0f} MiB")
+            results["results"].extend(dict(scale=scale, **m)
+                                      for m in measurements)
+            # Written after every scale, so finished scales are kept if
+            # the run is interrupted
+            with open(output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+
+        if args.payload_effects > 0:
+            print(f"Payload check ({args.payload_effects} effects):",
+                  flush=True)
+            payload = check_payload(directory, args.payload_effects,
+                                    args.seed, args.timeout)
+            results["payload"] = payload
+            if "error" in payload:
+                print(f"  failed: {payload['error']}")
+            else:
+                print(f"  {payload['n_clusters']} clusters x "
+                      f"{payload['n_columns']} columns: cluster tilemap "
+                      f"{payload['tiles_bytes'] / 2**20:.1f} MiB, figure "
+                      f"{payload['figure_bytes'] / 2**20:.1f} MiB, "
+                      f"{'passed' if payload['passed'] else 'FAILED'}")
+            with open(output, "w") as output_file:
+                json.dump(results, output_file, indent=2)
+
+    print(f"Results written to {output}")
+    if args.compare is not None:
+        with open(args.compare, "r") as baseline_file:
+            compare_results(results, json.load(baseline_file))
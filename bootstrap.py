@@ -0,0 +1,357 @@
+import argparse
+import itertools
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import engine
+from config import read_config
+from data import prepare_data
+
+# Rank-wise quantiles of the bootstrapped specification curves
+BOOT_QUANTILES = [0.025, 0.975]
+
+# Number of effects fitted at once, summed over the iterations of a batch
+BATCH_EFFECTS = engine.CHUNK_EFFECTS
+
+# Size of a value of a specification curve, in bytes
+VALUE_BYTES = np.dtype(float).itemsize
+
+# Design of the specifications and null model, set once per worker
+_worker_design = {}
+
+
+def simulate_null(rng, v):
+    """Draw effect sizes under the null hypothesis.
+
+    Every effect is drawn from a normal distribution with a mean of zero
+    and its observed sampling variance, as for the boot files of the
+    original analyses.
+
+    Arguments:
+        rng -- The random number generator.
+        v -- The sampling variances of the effect sizes.
+
+    Returns:
+        The effect sizes as an array.
+    """
+    return rng.standard_normal(len(v)) * np.sqrt(v)
+
+
+def get_design(data, config, subsets):
+    """Get the design of the bootstrap of all specifications.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+        subsets -- The distinct effect subsets, see
+                   engine.get_unique_subsets().
+
+    Returns:
+        A dictionary with the level and methods, the sampling variances of
+        all effects, the concatenated effects of the subsets with their
+        subset and block indices, and the method of every group of
+        specifications.
+    """
+    level = config["level"]
+    how_lists = config["how_lists"]
+    arrays = engine.get_arrays(data, config["colmap"])
+    methods = how_lists.get(engine.METHOD_KEY, ["REML"])
+    spec_methods = [
+        dict(zip(how_lists, how_values)).get(engine.METHOD_KEY, "REML")
+        for how_values in itertools.product(*how_lists.values())
+    ]
+
+    effects = np.concatenate(subsets)
+    segments = np.repeat(np.arange(len(subsets)),
+                         [len(subset) for subset in subsets])
+    design = {
+        "level": level,
+        "methods": methods,
+        "spec_methods": spec_methods,
+        "v": arrays["v"],
+        "effects": effects,
+        "segments": segments,
+        "n_subsets": len(subsets)
+    }
+    if level == 3:
+        blocks, block_segments, _ = engine.get_blocks(
+            segments, arrays["c_ids"][effects])
+        design.update(blocks=blocks, block_segments=block_segments)
+    return design
+
+
+def _init_worker(design):
+    """Set the design of a worker process, see fit_curves()."""
+    _worker_design.update(design)
+
+
+def fit_curves(seed, first, last, design=None):
+    """Fit the sorted specification curves of a batch of iterations.
+
+    Iteration i draws a null data set from child i of the seed sequence of
+    seed, and the models of all subsets of all iterations are fitted at
+    once.
+
+    Arguments:
+        seed -- The seed of the bootstrap.
+        first -- The first iteration of the batch.
+        last -- The iteration after the last one of the batch.
+
+    Keyword Arguments:
+        design -- The design of the bootstrap, see get_design()
+                  (default: {None}, the design of the worker process).
+
+    Returns:
+        The sorted specification curves as an array with one row per
+        iteration.
+    """
+    if design is None:
+        design = _worker_design
+    seeds = [np.random.SeedSequence(seed, spawn_key=(i,))
+             for i in range(first, last)]
+    n_iter = len(seeds)
+    n_subsets = design["n_subsets"]
+    effects = design["effects"]
+    y = np.stack([
+        simulate_null(np.random.default_rng(child), design["v"])
+        for child in seeds
+    ])[:, effects].ravel()
+    v = np.tile(design["v"][effects], n_iter)
+    offsets = np.arange(n_iter)[:, None]
+    segments = (design["segments"] + offsets * n_subsets).ravel()
+    n_specs = n_iter * n_subsets
+    stats = engine.get_subset_stats(y, v, segments, n_specs)
+    if design["level"] == 3:
+        n_blocks = len(design["block_segments"])
+        blocks = (design["blocks"] + offsets * n_blocks).ravel()
+        block_segments = (design["block_segments"]
+                          + offsets * n_subsets).ravel()
+
+    means = {}
+    for method in design["methods"]:
+        if design["level"] == 3:
+            fit = engine.fit_three_level(y, v, blocks, block_segments,
+                                         segments, n_specs, method,
+                                         stats=stats)
+        else:
+            fit = engine.fit_random_effects(y, v, segments, n_specs, method,
+                                            stats=stats)
+        means[method] = fit["mean"].reshape(n_iter, n_subsets)
+    curves = np.concatenate(
+        [means[method] for method in design["spec_methods"]], axis=1)
+    return np.sort(curves, axis=1)
+
+
+def _get_batches(n_iter, n_effects, batch_effects, max_size=None):
+    """Split iterations into batches of about batch_effects effects."""
+    size = max(1, batch_effects // n_effects)
+    if max_size is not None:
+        size = min(size, max_size)
+    return [(first, min(first + size, n_iter))
+            for first in range(0, n_iter, size)]
+
+
+def _fit_batches(design, batches, seed, n_workers, store, progress):
+    """Fit batches of iterations and pass their curves to store().
+
+    With several workers, at most two batches per worker are submitted at
+    a time, so finished curves do not pile up faster than they are stored.
+    """
+    n_iter = batches[-1][1]
+    start = time.perf_counter()
+    done = 0
+    if n_workers <= 1:
+        for first, last in batches:
+            store(first, last, fit_curves(seed, first, last, design))
+            done += last - first
+            if progress and len(batches) > 1:
+                engine.print_progress(done, n_iter, start, "Bootstrapped",
+                                      "iterations")
+        return
+
+    batches = iter(batches)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker,
+                             initargs=(design,)) as executor:
+        while True:
+            for first, last in itertools.islice(
+                    batches, 2 * n_workers - len(pending)):
+                future = executor.submit(fit_curves, seed, first, last)
+                pending[future] = (first, last)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                first, last = pending.pop(future)
+                store(first, last, future.result())
+                done += last - first
+                if progress:
+                    engine.print_progress(done, n_iter, start,
+                                          "Bootstrapped", "iterations")
+
+
+def get_rank_quantiles(path, n_iter, n_specs, memory_bytes):
+    """Get exact rank-wise quantiles of curves spilled to a file.
+
+    The curves are read in chunks of ranks, each holding all iterations,
+    as wide as the memory budget allows.
+
+    Arguments:
+        path -- The path of the curves, as a row-major binary array with
+                one row per iteration.
+        n_iter -- The number of iterations.
+        n_specs -- The number of specifications.
+        memory_bytes -- The memory budget in bytes.
+
+    Returns:
+        The quantiles of BOOT_QUANTILES as an array with one row per
+        quantile.
+    """
+    curves = np.memmap(path, dtype=float, mode="r", shape=(n_iter, n_specs))
+    # A chunk, its copy while selecting the quantiles, and some slack
+    width = max(1, memory_bytes // (3 * VALUE_BYTES * n_iter))
+    bounds = np.empty((len(BOOT_QUANTILES), n_specs))
+    for first in range(0, n_specs, width):
+        chunk = np.array(curves[:, first:first + width])
+        bounds[:, first:first + width] = np.quantile(
+            chunk, BOOT_QUANTILES, axis=0)
+    del curves
+    return bounds
+
+
+def bootstrap_specs(data, config, n_iter=None, seed=0, n_workers=None,
+                    batch_effects=BATCH_EFFECTS, memory_bytes=None,
+                    spill_dir=None, progress=True):
+    """Compute the inferential specification curve of a multiverse analysis.
+
+    In every iteration, effect sizes are drawn under the null hypothesis,
+    see simulate_null(), all specifications are refitted and their
+    summary effects are sorted into a specification curve. The bounds are
+    rank-wise quantiles of these curves.
+
+    Iterations are batched and fitted in parallel by a pool of worker
+    processes. Every iteration draws from its own seed sequence, spawned
+    from seed, so the results do not depend on the number of workers or
+    the batch size.
+
+    By default, all curves are kept in memory. Given a memory budget, the
+    curves are spilled to a temporary file as batches finish, batches are
+    limited to a share of the budget, and the quantiles are computed
+    exactly from chunks of ranks, see get_rank_quantiles(). The memory
+    for curves then stays within the budget for any number of
+    iterations.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+
+    Keyword Arguments:
+        n_iter -- The number of iterations (default: {None}, n_boot_iter of
+                  the configuration).
+        seed -- The seed of the random number generator (default: {0}).
+        n_workers -- The number of worker processes (default: {None}, the
+                     number of CPUs).
+        batch_effects -- The number of effects per batch
+                         (default: {BATCH_EFFECTS}).
+        memory_bytes -- The memory budget for curves in bytes
+                        (default: {None}, all curves in memory).
+        spill_dir -- The directory of the temporary file of the curves
+                     (default: {None}, the system default).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The bootstrap data with the columns of a boot file (rank, obs,
+        boot_lb, boot_ub), or None if the specifications cannot be
+        computed, see engine.build_specs().
+    """
+    specs = engine.build_specs(data, config, n_workers, progress=progress)
+    if specs is None:
+        return None
+    if n_iter is None:
+        n_iter = config["n_boot_iter"]
+
+    _, subsets = engine.get_effect_subsets(
+        data, config["which_lists"], config["k_min"])
+    subsets = [subsets[i] for i in engine.get_unique_subsets(subsets)]
+    design = get_design(data, config, subsets)
+
+    n_specs = len(specs)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    if memory_bytes is None:
+        batches = _get_batches(n_iter, len(design["effects"]), batch_effects)
+        n_workers = min(n_workers, len(batches))
+        curves = np.empty((n_iter, n_specs))
+
+        def store(first, last, batch_curves):
+            curves[first:last] = batch_curves
+
+        _fit_batches(design, batches, seed, n_workers, store, progress)
+        boot_lb, boot_ub = np.quantile(curves, BOOT_QUANTILES, axis=0)
+    else:
+        # Up to two batches per worker are in flight, within half the budget
+        max_size = max(1, memory_bytes
+                       // (4 * n_workers * VALUE_BYTES * n_specs))
+        batches = _get_batches(n_iter, len(design["effects"]), batch_effects,
+                               max_size)
+        n_workers = min(n_workers, len(batches))
+        with tempfile.TemporaryDirectory(dir=spill_dir) as tmp_dir:
+            path = os.path.join(tmp_dir, "curves.bin")
+            with open(path, "wb") as f:
+                def store(first, last, batch_curves):
+                    f.seek(first * n_specs * VALUE_BYTES)
+                    f.write(np.ascontiguousarray(batch_curves).tobytes())
+
+                _fit_batches(design, batches, seed, n_workers, store,
+                             progress)
+            boot_lb, boot_ub = get_rank_quantiles(path, n_iter, n_specs,
+                                                  memory_bytes)
+
+    return pd.DataFrame({
+        "rank": specs["rank"],
+        "obs": specs["mean"],
+        "boot_lb": boot_lb,
+        "boot_ub": boot_ub
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the inferential specification curve of a "
+                    "multiverse analysis.")
+    parser.add_argument("config", help="path of the configuration file")
+    parser.add_argument("data", help="path of the meta-analytic data")
+    parser.add_argument("output", help="path of the boot file to write")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="number of iterations (default: n_boot_iter)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random number generator")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument("--batch-effects", type=int, default=BATCH_EFFECTS,
+                        help="number of effects per batch of iterations")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="memory budget for curves in MB, spilling them "
+                             "to disk (default: keep all curves in memory)")
+    parser.add_argument("--spill-dir", default=None,
+                        help="directory of the spilled curves")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    config = read_config(path=args.config)
+    data = prepare_data(config["colmap"], raw=args.data)
+    n_iter = args.iterations or config["n_boot_iter"]
+    memory_bytes = (args.memory_mb * 2**20 if args.memory_mb is not None
+                    else None)
+    boot = bootstrap_specs(data, config, n_iter, args.seed, args.workers,
+                           args.batch_effects, memory_bytes, args.spill_dir)
+    if boot is not None:
+        boot.to_csv(args.output, index=False)
+        print(f"{len(boot)} ranks of {n_iter} iterations written to "
+              f"{args.output} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Directory of the compiled dataset cache. Each entry is a directory named
+# after the content ID of the source files, so changed files are rebuilt
+# automatically. Bump the version if the layout or the preparation of the
+# dataset changes.
+CACHE_DIR = os.environ.get("MULTIVERSE_CACHE_DIR", "cache")
+CACHE_VERSION = 3
+
+
+def _get_entry_dir(dataset_id, cache_dir):
+    """Get the cache directory of a dataset.
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+        cache_dir -- The cache directory.
+
+    Returns:
+        The path of the cache entry.
+    """
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}-{dataset_id}")
+
+
+def _split_dataset(dataset, prefix=""):
+    """Split a dataset into arrays, DataFrames and plain values.
+
+    Nested dictionaries are flattened, joining keys with a dot.
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+
+    Keyword Arguments:
+        prefix -- The key prefix of nested values (default: {""}).
+
+    Returns:
+        A tuple of dictionaries with arrays, DataFrames and plain values.
+    """
+    arrays, frames, values = {}, {}, {}
+    for key, value in dataset.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, np.ndarray):
+            arrays[name] = value
+        elif isinstance(value, pd.DataFrame):
+            frames[name] = value
+        elif isinstance(value, dict) and any(
+                isinstance(v, np.ndarray) for v in value.values()):
+            a, f, v = _split_dataset(value, prefix=f"{name}.")
+            arrays.update(a)
+            frames.update(f)
+            values.update(v)
+        else:
+            values[name] = value
+    return arrays, frames, values
+
+
+def _to_json(value):
+    """Convert numpy scalars for JSON serialization."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value)}")
+
+
+def write_dataset(dataset_id, dataset, cache_dir=CACHE_DIR):
+    """Write a prepared dataset to the cache.
+
+    Arrays are stored as .npy files, DataFrames in pandas' binary pickle
+    format and all other values as JSON. The entry is written to a
+    temporary directory first and then moved into place, so readers never
+    see a partially written entry.
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+        dataset -- The dataset, see dataset.build_dataset().
+
+    Keyword Arguments:
+        cache_dir -- The cache directory (default: {CACHE_DIR}).
+
+    Returns:
+        The path of the cache entry, or None if it could not be written.
+    """
+    entry_dir = _get_entry_dir(dataset_id, cache_dir)
+    arrays, frames, values = _split_dataset(dataset)
+    tmp_dir = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        for name, frame in frames.items():
+            frame.to_pickle(os.path.join(tmp_dir, f"{name}.pkl"))
+        with open(os.path.join(tmp_dir, "values.json"), "w") as values_file:
+            json.dump(values, values_file, default=_to_json)
+        os.replace(tmp_dir, entry_dir)
+    except OSError as error:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another process may have written the same entry concurrently
+        if os.path.isdir(entry_dir):
+            return entry_dir
+        print(f"WARNING: Could not write dataset cache: {error}")
+        return None
+    return entry_dir
+
+
+def read_dataset(dataset_id, cache_dir=CACHE_DIR, mmap_mode=None):
+    """Read a prepared dataset from the cache.
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+
+    Keyword Arguments:
+        cache_dir -- The cache directory (default: {CACHE_DIR}).
+        mmap_mode -- If set (e.g. "r"), arrays are memory-mapped instead
+                     of read into memory, see numpy.load() (default: {None}).
+
+    Returns:
+        The dataset, or None if there is no cache entry.
+    """
+    entry_dir = _get_entry_dir(dataset_id, cache_dir)
+    if not os.path.isdir(entry_dir):
+        return None
+
+    with open(os.path.join(entry_dir, "values.json"), "r") as values_file:
+        flat = json.load(values_file)
+    for file in os.listdir(entry_dir):
+        name, ext = os.path.splitext(file)
+        path = os.path.join(entry_dir, file)
+        if ext == ".npy":
+            flat[name] = np.load(path, mmap_mode=mmap_mode)
+        elif ext == ".pkl":
+            flat[name] = pd.read_pickle(path)
+
+    # Restore nested dictionaries
+    dataset = {}
+    for name, value in flat.items():
+        *parents, key = name.split(".")
+        node = dataset
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = value
+    return dataset
+
+
+def _get_alias_path(alias, cache_dir):
+    """Get the path of an alias of a cache entry."""
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}-{alias}.alias")
+
+
+def write_alias(alias, dataset_id, cache_dir=CACHE_DIR):
+    """Point an alias, e.g. the source key of a dataset, to a cache entry.
+
+    Arguments:
+        alias -- The alias.
+        dataset_id -- The content ID of the dataset.
+
+    Keyword Arguments:
+        cache_dir -- The cache directory (default: {CACHE_DIR}).
+    """
+    try:
+        with open(_get_alias_path(alias, cache_dir), "w") as alias_file:
+            alias_file.write(dataset_id)
+    except OSError as error:
+        print(f"WARNING: Could not write dataset cache alias: {error}")
+
+
+def read_alias(alias, cache_dir=CACHE_DIR):
+    """Get the content ID of the dataset an alias points to.
+
+    Arguments:
+        alias -- The alias, see write_alias().
+
+    Keyword Arguments:
+        cache_dir -- The cache directory (default: {CACHE_DIR}).
+
+    Returns:
+        The content ID, or None if there is no such alias.
+    """
+    try:
+        with open(_get_alias_path(alias, cache_dir), "r") as alias_file:
+            return alias_file.read()
+    except OSError:
+        return None
@@ -0,0 +1,151 @@
+import argparse
+import sys
+
+import numpy as np
+
+import engine
+from config import read_config
+from data import prepare_data, read_data
+
+# Columns compared exactly and up to the tolerance
+EXACT_COLUMNS = ["k", "kc", "set", "set_es", "full_set"]
+CLOSE_COLUMNS = ["mean", "lb", "ub", "p", "ci"]
+
+# Absolute tolerance of the summary effects, CI bounds and p-values
+TOLERANCE = 1e-5
+
+
+def compare_specs(specs, reference, factor_keys, tolerance=TOLERANCE):
+    """Compare computed specifications with a reference.
+
+    Specifications are matched by their factor values. Ranks may only
+    differ between specifications with the same summary effect (up to the
+    tolerance), which can be ranked either way.
+
+    Arguments:
+        specs -- The computed specification data, see engine.build_specs().
+        reference -- The reference specification data.
+        factor_keys -- The keys of the which- and how-factors.
+
+    Keyword Arguments:
+        tolerance -- The absolute tolerance of the summary effects
+                     (default: {TOLERANCE}).
+
+    Returns:
+        A list of the differences found, empty if the specifications match.
+    """
+    errors = []
+    merged = specs.merge(reference, on=factor_keys, how="outer",
+                         suffixes=("", "_ref"), indicator=True)
+    for side, name in [("left_only", "computed"), ("right_only", "reference")]:
+        n_unmatched = (merged["_merge"] == side).sum()
+        if n_unmatched > 0:
+            errors.append(f"{n_unmatched} specifications only in the {name} "
+                          f"specifications")
+    merged = merged[merged["_merge"] == "both"]
+
+    for column in EXACT_COLUMNS:
+        n_diff = (merged[column].astype(str)
+                  != merged[f"{column}_ref"].astype(str)).sum()
+        if n_diff > 0:
+            errors.append(f"{column} differs in {n_diff} specifications")
+    for column in CLOSE_COLUMNS:
+        diff = np.abs(merged[column] - merged[f"{column}_ref"])
+        if diff.max() > tolerance:
+            errors.append(f"{column} differs by up to {diff.max():.3g} in "
+                          f"{(diff > tolerance).sum()} specifications")
+
+    ref_means = reference.set_index("rank")["mean"]
+    rank_diff = np.abs(merged["mean"].to_numpy()
+                       - ref_means.reindex(merged["rank"]).to_numpy())
+    n_misranked = (~(rank_diff <= tolerance)).sum()
+    if n_misranked > 0:
+        errors.append(f"rank differs in {n_misranked} specifications")
+    return errors
+
+
+def check_update(raw, config, n_workers=None, tolerance=TOLERANCE):
+    """Check the update of specifications after a row was appended.
+
+    The last row of the data is treated as appended: the specifications
+    of the other rows are updated to all rows (see engine.update_specs())
+    and compared with the specifications of all rows. Only specifications
+    that contain the appended effect, or that had no previous fit, may be
+    refitted.
+
+    Arguments:
+        raw -- The raw meta-analytic data, see data.read_data().
+        config -- The configuration.
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes (default: {None}).
+        tolerance -- The absolute tolerance of the summary effects
+                     (default: {TOLERANCE}).
+
+    Returns:
+        A list of the differences found, empty if the update is correct.
+    """
+    colmap = config["colmap"]
+    factor_keys = list(config["which_lists"]) + list(config["how_lists"])
+    old_data = prepare_data(colmap, data=raw.iloc[:-1].copy())
+    data = prepare_data(colmap, data=raw.copy())
+    old_specs = engine.build_specs(old_data, config, n_workers,
+                                   progress=False)
+    specs = engine.build_specs(data, config, n_workers, progress=False)
+    if old_specs is None or specs is None:
+        return ["specifications could not be computed"]
+    updated, old_ranks = engine.update_specs(old_data, old_specs, data,
+                                             config, n_workers,
+                                             progress=False)
+    errors = [f"update: {error}"
+              for error in compare_specs(updated, specs, factor_keys,
+                                         tolerance)]
+
+    # Specifications with the appended effect or without a previous fit
+    e_id = str(data.loc[raw.index[-1], colmap["key_e_id"]])
+    has_effect = updated["set_es"].astype(str).str.split(",").apply(
+        lambda e_ids: e_id in e_ids)
+    is_new = ~updated[factor_keys].astype(str).apply(tuple, axis=1).isin(
+        old_specs[factor_keys].astype(str).apply(tuple, axis=1))
+    n_expected = (has_effect | is_new).sum()
+    n_refitted = (old_ranks == 0).sum()
+    if n_refitted != n_expected:
+        errors.append(f"update refitted {n_refitted} specifications "
+                      f"instead of {n_expected}")
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that engine.py reproduces a reference specs "
+                    "file.")
+    parser.add_argument("config", help="path of the configuration file")
+    parser.add_argument("data", help="path of the meta-analytic data")
+    parser.add_argument("specs", help="path of the reference specs file or "
+                                      "specs store")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="absolute tolerance of the summary effects")
+    parser.add_argument("--check-update", action="store_true",
+                        help="also check the update of the specifications "
+                             "after the last row of the data was appended")
+    args = parser.parse_args()
+
+    config = read_config(path=args.config)
+    raw = read_data(args.data)
+    data = prepare_data(config["colmap"], data=raw.copy())
+    specs = engine.build_specs(data, config, args.workers, progress=False)
+    if specs is None:
+        sys.exit(1)
+    reference = engine.read_specs(args.specs)
+    factor_keys = list(config["which_lists"]) + list(config["how_lists"])
+    errors = compare_specs(specs, reference, factor_keys, args.tolerance)
+    if args.check_update:
+        errors.extend(check_update(raw, config, args.workers,
+                                   args.tolerance))
+    for error in errors:
+        print(f"ERROR: {error}")
+    if errors:
+        sys.exit(1)
+    print(f"{len(specs)} specifications match {args.specs}")
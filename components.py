@@ -1,6 +1,7 @@
 from dash import html, dcc, dash_table
 import dash_bootstrap_components as dbc
 import numpy as np
+from data import get_table_page, STRIPE_COLUMN
 from plotting import plot_treemap, plot_inferential, plot_p_hist
 
 
@@ -75,7 +76,8 @@ def get_multiverse_tab(data, factor_lists, kc_range, k_range, n_total_specs, col
                 dbc.Col(html.H2("Multiverse Analysis"), width=4),
             ], justify="between"),
             dbc.Row([
-                dcc.Graph(figure={}, id="multiverse")
+                dcc.Graph(figure={}, id="multiverse"),
+                dcc.Store(id="multiverseView", data=None)
             ]),
         ], width=9),
         dbc.Col([
@@ -102,12 +104,48 @@ def get_other_tab(boot_data, specs, title, n_total_specs):
     ])
 
 
-def get_datatable(df, key_c_id):
+# Number of rows per page of the server-side dataset table
+DATATABLE_PAGE_SIZE = 50
+
+
+def get_datatable(df, key_c_id, server_side=True):
+    """Get the dataset table.
+
+    In server-side mode, paging, sorting and filtering are handled by a
+    callback (see dashboard.update_datatable()) and the table only holds
+    the current page. Otherwise, all rows are sent to the browser.
+
+    Arguments:
+        df -- The meta-analytic data.
+        key_c_id -- The column of the cluster IDs.
+
+    Keyword Arguments:
+        server_side -- Whether to page, sort and filter on the server
+                       (default: {True}).
+
+    Returns:
+        The DataTable component.
+    """
+    if server_side:
+        records, page_count = get_table_page(
+            df, key_c_id, page_size=DATATABLE_PAGE_SIZE)
+        actions = dict(
+            page_action="custom",
+            page_current=0,
+            page_size=DATATABLE_PAGE_SIZE,
+            page_count=page_count,
+            sort_action="custom",
+            sort_mode="multi",
+            filter_action="custom"
+        )
+    else:
+        records, _ = get_table_page(df, key_c_id)
+        actions = dict(page_action="none", sort_action="native")
     return dash_table.DataTable(
-        data=df.to_dict("records"),
+        id="datatable",
+        data=records,
         columns=_get_datatable_formatting(df),
-        page_action="none",
-        sort_action="native",
+        **actions,
         # fixed_rows={'headers': True},
         style_header={
             'backgroundColor': "dimgray",
@@ -142,10 +180,10 @@ def get_datatable(df, key_c_id):
         },
         style_data_conditional=[
             {
-                'if': {"filter_query": f"{{c_id}} eq '{c_id}'"},
+                'if': {"filter_query": f"{{{STRIPE_COLUMN}}} eq 1"},
                 'background-color': "lightgray"
             }
-            for c_id in df[df[key_c_id] % 2 != 0][key_c_id]]
+        ]
     )
 
 
@@ -0,0 +1,91 @@
+import gzip
+import os
+
+# Brotli is optional; responses are only gzip-compressed without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_BYTES = int(os.environ.get("MULTIVERSE_COMPRESS_MIN_BYTES", 1024))
+
+# Compression levels: gzip from 1 (fastest) to 9, brotli from 0 to 11
+GZIP_LEVEL = int(os.environ.get("MULTIVERSE_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("MULTIVERSE_BROTLI_QUALITY", 5))
+
+# Media types of responses worth compressing, e.g. callback outputs,
+# the layout and the index page
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain"
+}
+
+
+def get_encoding(accept_encodings):
+    """Choose the content encoding of a response.
+
+    Arguments:
+        accept_encodings -- The parsed Accept-Encoding header of the
+                            request.
+
+    Returns:
+        "br" if brotli is installed and accepted, otherwise "gzip" if
+        accepted, otherwise None.
+    """
+    if brotli is not None and accept_encodings["br"] > 0:
+        return "br"
+    if accept_encodings["gzip"] > 0:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding):
+    """Compress data with a content encoding.
+
+    Arguments:
+        data -- The data as bytes.
+        encoding -- The content encoding ("br" or "gzip").
+
+    Returns:
+        The compressed data.
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings):
+    """Compress the body of a response in place, if worthwhile.
+
+    Only complete, successful responses of a compressible media type with
+    at least MIN_BYTES are compressed, and only if the client accepts an
+    encoding, see get_encoding().
+
+    Arguments:
+        response -- The Flask response.
+        accept_encodings -- The parsed Accept-Encoding header of the
+                            request.
+
+    Returns:
+        A tuple of the encoding and the uncompressed size, or None if the
+        response was not compressed.
+    """
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return None
+    encoding = get_encoding(accept_encodings)
+    if encoding is None:
+        return None
+    data = response.get_data()
+    if len(data) < MIN_BYTES:
+        return None
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return encoding, len(data)
@@ -1,17 +1,27 @@
+from dash import Dash, dcc, Output, Input, State, ALL, Patch, no_update
+from dash.exceptions import PreventUpdate
+from collections import OrderedDict
 import base64
-from dash import Dash, dcc, Output, Input, State, ALL
 import flask
+import hashlib
+import json
+import threading
+import time
 import dash_bootstrap_components as dbc
-import io
-import os
 import numpy as np
+import os
 import pandas as pd
 import plotly.graph_objects as go
+from plotly.io.json import to_json_plotly
 
 from components import get_data_tab, get_multiverse_tab, get_other_tab, get_spec_infos, get_header, get_footer
-from config import read_config
-from data import prepare_data
-from plotting import get_spec_fill_data, get_cluster_fill_data, get_colors, plot_multiverse
+import compression
+import figure_cache
+import metrics
+import profiler
+from data import get_subset_mask, get_table_page, unpack_set_incidence
+from dataset import get_dataset, load_dataset, SHARED_ARRAYS
+from plotting import bin_specs, get_view, get_visible_ranks, plot_multiverse
 
 
 def _get_empty_figure():
@@ -32,13 +42,321 @@ def _get_empty_figure():
     return fig
 
 
+# The specifications are read from a specs file or a specs store, see
+# specs_store.py
 data_files = [
     "static_data/boot_OR.csv",
     "static_data/config_OR.json",
     "static_data/data_OR.csv",
-    "static_data/specs_OR.csv",
+    os.environ.get("MULTIVERSE_SPECS", "static_data/specs_OR.csv"),
 ]
 
+
+def _get_dataset(memory):
+    """Resolve the dataset token held in the session store.
+
+    If the dataset is not registered in this process (e.g. after a server
+    restart), it is rebuilt from the static data files, since uploads are
+    disabled in this build.
+
+    Arguments:
+        memory -- The content of the session store.
+
+    Returns:
+        The dataset, see dataset.build_dataset().
+    """
+    dataset = get_dataset(memory["dataset_id"])
+    if dataset is None:
+        _, dataset = load_dataset(data_files)
+    return dataset
+
+
+def _get_process_memory():
+    """Get the resident and shared memory of the current process.
+
+    Returns:
+        A tuple of resident and shared bytes, or (None, None) if they
+        cannot be read (only Linux is supported).
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            _, resident, shared, *_ = statm.read().split()
+    except OSError:
+        return None, None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    return int(resident) * page_size, int(shared) * page_size
+
+
+def _get_id_set_key(selected, n_total):
+    """Get a compact, order-independent key of a checklist selection.
+
+    Arguments:
+        selected -- The selected IDs.
+        n_total -- The total number of IDs.
+
+    Returns:
+        "all" if everything is selected, otherwise a hash of the IDs.
+    """
+    if len(selected) == n_total:
+        return "all"
+    joined = (",").join(sorted(selected, key=int))
+    return hashlib.sha1(joined.encode("utf-8")).hexdigest()
+
+
+def _get_filter_key(dataset_id, dataset, ci_switch, ci_case,
+                    p_filter_switch, p_value, range_kc, range_k, es_value,
+                    study_list, es_list, factor_keys, factor_values):
+    """Get the canonical figure cache key of a filter state.
+
+    Inputs that do not affect the rendered figure (e.g. the CI case while
+    the CI filter is switched off) are normalized away, such that
+    equivalent filter states share a cache entry. The spec number zoom and
+    the visibility of p-value markers are applied on top of the cached
+    figure, see _set_spec_zoom() and _set_p_markers().
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+        dataset -- The dataset, see dataset.build_dataset().
+        Remaining arguments -- See update_multiverse().
+
+    Returns:
+        A hashable tuple.
+    """
+    factors = tuple(sorted(
+        (f_key, f_val)
+        for f_key, f_val in zip(factor_keys, factor_values)
+        if f_val is not None
+    ))
+    return (
+        dataset_id,
+        ci_case if ci_switch != [] else None,
+        p_filter_switch != [],
+        p_value,
+        tuple(range_kc),
+        tuple(range_k),
+        int(np.sign(es_value)),
+        _get_id_set_key(study_list, dataset["n_clusters"]),
+        _get_id_set_key(es_list, dataset["n_es"]),
+        factors
+    )
+
+
+# Study and effect selections of the filters of a view, with the names of
+# the sorted IDs and of their checklist values in the dataset
+_VIEW_SELECTIONS = {
+    "study_list": ("cluster_ids", "c_ids"),
+    "es_list": ("effect_ids", "e_ids")
+}
+
+
+def _pack_view_filters(dataset, filters):
+    """Get the filters of a rendered multiverse view in a compact form.
+
+    The study and effect selections are packed into base64-encoded
+    bitsets over the sorted IDs, or None if everything is selected, such
+    that the view store stays small and every worker can render other
+    views from it, see _get_view_filters().
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        filters -- The filters, see update_multiverse().
+
+    Returns:
+        The packed filters.
+    """
+    packed = dict(filters)
+    for name, (ids_name, _) in _VIEW_SELECTIONS.items():
+        ids = dataset[ids_name]
+        selected = np.asarray(filters[name], dtype=ids.dtype)
+        if len(selected) == len(ids):
+            packed[name] = None
+            continue
+        bits = np.packbits(np.isin(ids, selected))
+        packed[name] = base64.b64encode(bits.tobytes()).decode("ascii")
+    return packed
+
+
+def _get_view_filters(dataset, view):
+    """Get the filters of a rendered multiverse view.
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        view -- The view, see update_multiverse().
+
+    Returns:
+        The filters, with the selections unpacked, see
+        _pack_view_filters().
+    """
+    filters = dict(view["filters"])
+    for name, (ids_name, values_name) in _VIEW_SELECTIONS.items():
+        values = dataset[values_name]
+        if filters[name] is None:
+            filters[name] = values
+            continue
+        bits = np.frombuffer(base64.b64decode(filters[name]), dtype=np.uint8)
+        selected = np.unpackbits(bits, count=len(dataset[ids_name]))
+        filters[name] = [values[i] for i in np.flatnonzero(selected)]
+    return filters
+
+
+# State of the application warm-up, see warm_up()
+_warm_up = {
+    "dataset_id": None,
+    "seconds": None
+}
+
+
+def warm_up():
+    """Prepare the static dataset once per process.
+
+    This runs when the module is imported. Under gunicorn with preloading
+    (see gunicorn.conf.py) that happens once in the master process, and
+    all workers are forked with the dataset already registered.
+
+    Returns:
+        The content ID of the static dataset.
+    """
+    start = time.perf_counter()
+    dataset_id, _ = load_dataset(data_files)
+    _get_tab_content({"dataset_id": dataset_id}, TAB_IDS[0])
+    _warm_up["dataset_id"] = dataset_id
+    _warm_up["seconds"] = time.perf_counter() - start
+    return dataset_id
+
+
+# IDs of the tabs, in the order of their content outputs
+TAB_IDS = ["tab-data", "tab-mv", "tab-op"]
+
+# Rendered tab contents by dataset and tab ID. The least recently used
+# entries are evicted beyond the limit, see _get_tab_content().
+_MAX_TAB_CONTENTS = 24
+_tab_contents = OrderedDict()
+_tab_lock = threading.Lock()
+
+
+def _render_tab(dataset, tab_id):
+    """Render the content of a tab.
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        tab_id -- The ID of the tab, see TAB_IDS.
+
+    Returns:
+        The content of the tab.
+    """
+    config = dataset["config"]
+    if tab_id == "tab-data":
+        return get_data_tab(config, dataset["data"])
+    if tab_id == "tab-mv":
+        return get_multiverse_tab(
+            dataset["data"],
+            dataset["factor_lists"],
+            dataset["kc_range"],
+            dataset["k_range"],
+            dataset["n_total_specs"],
+            config["colmap"]
+        )
+    return get_other_tab(
+        dataset["boot_data"],
+        dataset["specs"],
+        #dataset["config"]["title"],
+        "",
+        dataset["n_total_specs"]
+    )
+
+
+def _get_tab_content(memory, tab_id):
+    """Get the content of a tab, rendering it once per dataset.
+
+    Arguments:
+        memory -- The content of the session store.
+        tab_id -- The ID of the tab, see TAB_IDS.
+
+    Returns:
+        The content of the tab.
+    """
+    key = (memory["dataset_id"], tab_id)
+    with _tab_lock:
+        content = _tab_contents.get(key)
+    if content is None:
+        content = _render_tab(_get_dataset(memory), tab_id)
+    with _tab_lock:
+        _tab_contents[key] = content
+        _tab_contents.move_to_end(key)
+        while len(_tab_contents) > _MAX_TAB_CONTENTS:
+            _tab_contents.popitem(last=False)
+    return content
+
+
+def _get_spec_mask(dataset, ci_switch, ci_case, p_filter_switch, p_value,
+                   range_kc, range_k, es_value, study_list, es_list,
+                   factor_keys, factor_values):
+    """Get the specifications that match the current filter selection.
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        ci_switch -- The value of the confidence interval switch.
+        ci_case -- The selected confidence interval case.
+        p_filter_switch -- The value of the p-value filter switch.
+        p_value -- The selected p-value threshold.
+        range_kc -- The selected range of cluster sizes.
+        range_k -- The selected range of sample sizes.
+        es_value -- The selected effect size sign (0 for all).
+        study_list -- The selected cluster IDs.
+        es_list -- The selected effect IDs.
+        factor_keys -- The keys of the factor filters.
+        factor_values -- The selected values of the factor filters.
+
+    Returns:
+        A boolean array, True for each matching specification.
+    """
+    spec_arrays = dataset["spec_arrays"]
+    lb = spec_arrays["lb"]
+    ub = spec_arrays["ub"]
+    mean = spec_arrays["mean"]
+    kc = spec_arrays["kc"]
+    k = spec_arrays["k"]
+
+    mask = np.ones(dataset["n_total_specs"], dtype=bool)
+    if ci_switch != []:
+        if ci_case == 0:
+            mask &= ub < 0
+        elif ci_case == 1:
+            mask &= lb > 0
+        elif ci_case == 2:
+            mask &= (ub > 0) & (lb < 0)
+
+    mask &= (kc >= range_kc[0]) & (kc <= range_kc[1])
+    mask &= (k >= range_k[0]) & (k <= range_k[1])
+
+    if p_filter_switch != []:
+        mask &= spec_arrays["p"] < p_value
+
+    if es_value != 0:
+        if es_value < 0:
+            mask &= mean < 0
+        else:
+            mask &= mean >= 0
+
+    # Subset tests against the cluster and effect bitsets, skipped if
+    # everything is selected
+    if len(study_list) != dataset["n_clusters"]:
+        mask &= get_subset_mask(
+            dataset["cluster_bits"], dataset["cluster_ids"], study_list)
+    if len(es_list) != dataset["n_es"]:
+        mask &= get_subset_mask(
+            dataset["effect_bits"], dataset["effect_ids"], es_list)
+
+    factor_lists = dataset["factor_lists"]
+    for f_key, f_val in zip(factor_keys, factor_values):
+        if f_val is not None:
+            f_index = list(factor_lists).index(f_key)
+            f_code = factor_lists[f_key].index(f_val)
+            mask &= dataset["factor_codes"][f_index] == f_code
+
+    return mask
+
+
 external_stylesheets = []
 server = flask.Flask(__name__)
 app = Dash(__name__, external_stylesheets=external_stylesheets,
@@ -48,8 +366,138 @@ app = Dash(__name__, external_stylesheets=external_stylesheets,
 
 app.title = "Multiverse dashboard"
 
+
+def get_status():
+    """Get the warm-up and memory status of this process.
+
+    Returns:
+        Dictionary with the readiness, warm-up time and memory usage.
+    """
+    rss, shared = _get_process_memory()
+    return {
+        "ready": get_dataset(_warm_up["dataset_id"]) is not None,
+        "dataset_id": _warm_up["dataset_id"],
+        "warm_up_seconds": _warm_up["seconds"],
+        "shared_arrays": SHARED_ARRAYS,
+        "pid": os.getpid(),
+        "rss_bytes": rss,
+        "shared_bytes": shared
+    }
+
+
+@server.route("/ready")
+def ready():
+    """Report whether the static dataset has been prepared."""
+    status = get_status()
+    return flask.jsonify(status), 200 if status["ready"] else 503
+
+
+@server.route("/figure-cache")
+def figure_cache_stats():
+    """Report the counters of the multiverse figure cache."""
+    return flask.jsonify(figure_cache.get_stats())
+
+
+@server.route("/metrics")
+def metrics_text():
+    """Report the callback metrics in the Prometheus text format."""
+    return flask.Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+def _get_callback_name():
+    """Get the name of the callback a Dash update request is for."""
+    body = flask.request.get_json(silent=True) or {}
+    callback = app.callback_map.get(body.get("output"), {}).get("callback")
+    return getattr(callback, "__name__", "unknown")
+
+
+# Registered first, so it runs after all other after_request functions
+# and records the response bodies as they are sent
+@server.after_request
+def record_callback_bytes(response):
+    """Record the request and response sizes of Dash callbacks."""
+    if flask.request.path.endswith("/_dash-update-component"):
+        name = _get_callback_name()
+        metrics.observe("multiverse_callback_request_bytes",
+                        len(flask.request.get_data()), callback=name)
+        if not response.direct_passthrough:
+            metrics.observe("multiverse_callback_response_bytes",
+                            len(response.get_data()), callback=name)
+    return response
+
+
+@server.before_request
+def start_profile():
+    """Start profiling a Dash callback request, if requested."""
+    if (flask.request.path.endswith("/_dash-update-component")
+            and profiler.is_requested(flask.request.headers)):
+        flask.g.profile = profiler.start()
+
+
+@server.after_request
+def finish_profile(response):
+    """Finish the profile of a Dash callback request, if any."""
+    running = flask.g.pop("profile", None)
+    if running is not None:
+        profiler.finish(running, _get_callback_name())
+    return response
+
+
+# Registered last, so it runs before the other after_request functions
+@server.after_request
+def compress_response(response):
+    """Compress large responses, see compression.compress_response()."""
+    compressed = compression.compress_response(
+        response, flask.request.accept_encodings)
+    if compressed is not None:
+        encoding, size = compressed
+        rule = flask.request.url_rule
+        labels = dict(route=rule.rule if rule is not None else "other",
+                      encoding=encoding)
+        metrics.increment("multiverse_compressed_bytes_total", size,
+                          **labels)
+        metrics.increment("multiverse_compression_saved_bytes_total",
+                          size - response.content_length, **labels)
+    return response
+
+
+@server.route("/debug/profiles")
+def profiles():
+    """List the kept profiles of the slowest callback requests."""
+    if not profiler.is_enabled():
+        flask.abort(404)
+    return flask.jsonify(profiler.get_profiles())
+
+
+@server.route("/debug/profiles/<int:profile_id>.pstats")
+def profile_pstats(profile_id):
+    """Download a profile as a pstats file."""
+    profile = profiler.get_profile(profile_id)
+    if not profiler.is_enabled() or profile is None:
+        flask.abort(404)
+    return flask.Response(
+        profiler.to_pstats(profile), mimetype="application/octet-stream",
+        headers={"Content-Disposition":
+                 f"attachment; filename=profile-{profile_id}.pstats"})
+
+
+@server.route("/debug/profiles/<int:profile_id>.speedscope.json")
+def profile_speedscope(profile_id):
+    """Download a profile in the speedscope format."""
+    profile = profiler.get_profile(profile_id)
+    if not profiler.is_enabled() or profile is None:
+        flask.abort(404)
+    return flask.Response(
+        json.dumps(profiler.to_speedscope(profile)),
+        mimetype="application/json",
+        headers={"Content-Disposition":
+                 f"attachment; filename=profile-{profile_id}.speedscope.json"})
+
+
 app.layout = dbc.Container([
     dcc.Store(id="memory", storage_type="session"),
+    # The dataset and tabs whose content has been sent to this page
+    dcc.Store(id="renderedTabs", data=None),
     get_header(),
     dbc.Row([
         dbc.Tabs([
@@ -72,7 +520,7 @@ app.layout = dbc.Container([
                 label="Other Plots",
                 tab_id="tab-op"
             )
-        ], active_tab="tab-data")
+        ], id="tabs", active_tab="tab-data")
     ]),
     get_footer(),
 ], fluid=True)
@@ -82,31 +530,32 @@ app.layout = dbc.Container([
     Output("outTabData", "children"),
     Output("outTabMultiverse", "children"),
     Output("outTabOther", "children"),
+    Output("renderedTabs", "data"),
     Input("memory", "data"),
+    Input("tabs", "active_tab"),
+    State("renderedTabs", "data"),
     prevent_initial_call=True
 )
-def get_tab_content(memory):
+@metrics.instrument
+def get_tab_content(memory, active_tab, rendered):
+    """Render the content of the active tab, once per dataset.
+
+    Other tabs are left as they are, or cleared if the dataset changed,
+    so they are rendered when they are opened.
+    """
     if memory is None:
-        return None, None, None
-    config = memory["config"]
-    data = pd.DataFrame(memory["data"])
-    data_tab_content = get_data_tab(config, data)
-    multiverse_tab_content = get_multiverse_tab(
-        data,
-        memory["factor_lists"],
-        memory["kc_range"],
-        memory["k_range"],
-        memory["n_total_specs"],
-        config["colmap"]
-    )
-    other_tab_content = get_other_tab(
-        pd.DataFrame(memory["boot_data"]),
-        pd.DataFrame(memory["specs"]),
-        #memory["config"]["title"],
-        "",
-        memory["n_total_specs"]
-    )
-    return data_tab_content, multiverse_tab_content, other_tab_content
+        return None, None, None, None
+    if rendered is None or rendered["dataset_id"] != memory["dataset_id"]:
+        rendered = {"dataset_id": memory["dataset_id"], "tabs": []}
+        contents = [None] * len(TAB_IDS)
+    elif active_tab in rendered["tabs"]:
+        raise PreventUpdate
+    else:
+        contents = [no_update] * len(TAB_IDS)
+    contents[TAB_IDS.index(active_tab)] = _get_tab_content(memory,
+                                                           active_tab)
+    rendered = dict(rendered, tabs=rendered["tabs"] + [active_tab])
+    return (*contents, rendered)
 
 
 @app.callback(
@@ -119,95 +568,47 @@ def get_tab_content(memory):
     Input("inUpload", "contents"),
     prevent_initial_call=False
 )
+@metrics.instrument
 def upload(memory, filenames, contents):
-    uploads = []
     if contents == None:
-        contents = []
         filenames = data_files
+        dataset_id = _warm_up["dataset_id"]
+        dataset = get_dataset(dataset_id)
+        if dataset is None:
+            dataset_id, dataset = load_dataset(filenames)
+    else:
+        dataset_id, dataset = load_dataset(filenames, contents)
+    uploads = sorted(filenames)
+    config = dataset["config"]
 
-        for f in filenames:
-            file = open(f, "r", encoding="utf-8")
-            contents.append(file.read())
-            file.close()
-
-    for f, c in sorted(zip(filenames, contents)):
-        uploads.append(f)
-        if c.startswith("data:application"):
-            c_type, c_string = c.split(",")
-            c_decoded = base64.b64decode(c_string)
-            c_decoded_str = io.StringIO(c_decoded.decode("ISO-8859-1"))
-        else:
-            c_decoded_str = io.StringIO(c)
-
-        if os.path.basename(f).startswith("boot"):
-            boot_data = pd.read_csv(c_decoded_str, na_values=['NA'], keep_default_na=False)
-
-        if os.path.basename(f).startswith("config"):
-            config = read_config(data=c_decoded_str)
-
-        if os.path.basename(f).startswith("data"):
-            data = prepare_data(config["colmap"], raw=c_decoded_str)
-
-        if os.path.basename(f).startswith("specs"):
-            specs = pd.read_csv(c_decoded_str, na_values=['NA'], keep_default_na=False)
-
-    cluster_fill_data = get_cluster_fill_data(data, specs, config["colmap"])
-    spec_fill_data = get_spec_fill_data(
-        config["n_which"],
-        config["which_lists"],
-        config["n_how"],
-        config["how_lists"],
-        specs
-    )
-    fill_levels = len(np.unique([v for v in spec_fill_data.values()]))
-    colors = get_colors(fill_levels)
-
-    k_min = config["k_min"]
-    k_max = max(specs["k"])
-    k_range = [k_min, k_max]
-
-    kc_min = min(specs["kc"])
-    kc_max = max(specs["kc"])
-    kc_range = [kc_min, kc_max]
-
-    n_es = len(data)
-    n_total_specs = len(specs)
-
-    key_c_id = config["colmap"]["key_c_id"]
-    key_c = config["colmap"]["key_c"]
-    key_e_id = config["colmap"]["key_e_id"]
-
-    n_clusters = len(data[key_c_id].unique())
-
-    level = config["level"]
-
-    factor_lists = dict(config["which_lists"], **config["how_lists"])
-
-    memory = {
-        "config": config,
-        "boot_data": boot_data.to_dict(),
-        "specs": specs.to_dict(),
-        "data": data.to_dict(),
-        "cluster_fill_data": cluster_fill_data,
-        "spec_fill_data": spec_fill_data,
-        "colors": colors,
-        "k_range": k_range,
-        "kc_range": kc_range,
-        "n_es": n_es,
-        "n_total_specs": n_total_specs,
-        "key_c_id": key_c_id,
-        "key_c": key_c,
-        "key_e_id": key_e_id,
-        "n_clusters": n_clusters,
-        "level": level,
-        "factor_lists": factor_lists
-    }
+    # The session store only holds a token, the dataset itself stays
+    # in the process-level registry
+    memory = {"dataset_id": dataset_id}
 
     title = f"# {config['title']}"
-    level_header = f"Level: {level}"
+    level_header = f"Level: {dataset['level']}"
     return memory, title, level_header, ("  \n").join(uploads)
 
 
+@app.callback(
+    Output("datatable", "data"),
+    Output("datatable", "page_count"),
+    State("memory", "data"),
+    Input("datatable", "page_current"),
+    Input("datatable", "page_size"),
+    Input("datatable", "sort_by"),
+    Input("datatable", "filter_query"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def update_datatable(memory, page_current, page_size, sort_by, filter_query):
+    dataset = _get_dataset(memory)
+    records, page_count = get_table_page(
+        dataset["data"], dataset["key_c_id"], page_current or 0, page_size,
+        sort_by, filter_query)
+    return records, page_count
+
+
 @app.callback(
     Output("inRefresh", "n_clicks"),
     Output({"type": "inSelect", "index": ALL}, "value"),
@@ -230,11 +631,10 @@ def upload(memory, filenames, contents):
     State("inRefresh", "n_clicks"),
     Input("inReset", "n_clicks"),
 )
+@metrics.instrument
 def reset_filters(memory, p_options, ci_options, refresh_clicks, _):
-    data = pd.DataFrame(memory["data"])
-    key_c_id = memory["key_c_id"]
-    key_e_id = memory["key_e_id"]
-    factor_lists = memory["factor_lists"]
+    dataset = _get_dataset(memory)
+    factor_lists = dataset["factor_lists"]
 
     for item in [*p_options, *ci_options]:
         item["disabled"] = True
@@ -247,11 +647,11 @@ def reset_filters(memory, p_options, ci_options, refresh_clicks, _):
     p_marker_switch = []
     p_value_options = p_options
     p_value = 0.05
-    kc_range = memory["kc_range"]
-    k_range = memory["k_range"]
+    kc_range = dataset["kc_range"]
+    k_range = dataset["k_range"]
     effect_sizes = 0
-    study_checklist = [str(c_id) for c_id in data[key_c_id].unique()]
-    es_checklist = [str(e_id) for e_id in sorted(data[key_e_id])]
+    study_checklist = dataset["c_ids"]
+    es_checklist = dataset["e_ids"]
     if refresh_clicks is not None:
         refresh_clicks += 1
     return (refresh_clicks, selects, spec_nr, ci_switch, ci_cases_options, ci_cases,
@@ -265,6 +665,7 @@ def reset_filters(memory, p_options, ci_options, refresh_clicks, _):
     Input("inPMarkerSwitch", "value"),
     Input("inPFilterSwitch", "value"),
 )
+@metrics.instrument
 def toggle_p_radio_items(options, p_marker_switch, p_filter_switch):
     disabled = not (p_marker_switch or p_filter_switch)
     for item in options:
@@ -277,6 +678,7 @@ def toggle_p_radio_items(options, p_marker_switch, p_filter_switch):
     State("inCICases", "options"),
     Input("inCISwitch", "value"),
 )
+@metrics.instrument
 def toggle_ci_radio_items(options, value):
     for item in options:
         item["disabled"] = (value == [])
@@ -289,16 +691,16 @@ def toggle_ci_radio_items(options, value):
     State("inStudyChecklist", "value"),
     Input("inToggleAll", "n_clicks"),
 )
+@metrics.instrument
 def select_deselect_c(memory, study_set, n_clicks):
-    data = pd.DataFrame(memory["data"])
-    key_c_id = memory["key_c_id"]
-    n_clusters = memory["n_clusters"]
+    dataset = _get_dataset(memory)
+    n_clusters = dataset["n_clusters"]
     if n_clicks is None:
         return study_set
     if len(study_set) == n_clusters:
         return []
     else:
-        return [str(c_id) for c_id in data[key_c_id].unique()]
+        return dataset["c_ids"]
 
 
 @app.callback(
@@ -307,35 +709,39 @@ def select_deselect_c(memory, study_set, n_clicks):
     State("inESChecklist", "value"),
     Input("inToggleAllES", "n_clicks"),
 )
+@metrics.instrument
 def select_deselect_e(memory, es_set, n_clicks):
-    data = pd.DataFrame(memory["data"])
-    n_es = memory["n_es"]
-    key_e_id = memory["key_e_id"]
+    dataset = _get_dataset(memory)
+    n_es = dataset["n_es"]
     if n_clicks is None:
         return es_set
     if len(es_set) == n_es:
         return []
     else:
-        return [str(e_id) for e_id in sorted(data[key_e_id])]
+        return dataset["e_ids"]
 
 
 @app.callback(
     Output("outSpecInfoSN", "children"),
     [Output(f"outSpecInfo{v}", "children") for _, v in get_spec_infos()],
     State("memory", "data"),
+    State("multiverseView", "data"),
     Input("multiverse", "clickData")
 )
-def display_click_data(memory, clickData):
-    data = pd.DataFrame(memory["data"])
-    specs = pd.DataFrame(memory["specs"])
-    cluster_fill_data = memory["cluster_fill_data"]
-    key_c_id = memory["key_c_id"]
-    key_e_id = memory["key_e_id"]
-    key_c = memory["key_c"]
-    level = memory["level"]
-    factor_lists = memory["factor_lists"]
-
-    if clickData is None:
+@metrics.instrument
+def display_click_data(memory, view, clickData):
+    dataset = _get_dataset(memory)
+    data = dataset["data"]
+    specs = dataset["specs"]
+    cluster_fill_data = dataset["cluster_fill_data"]
+    key_c_id = dataset["key_c_id"]
+    key_e_id = dataset["key_e_id"]
+    key_c = dataset["key_c"]
+    level = dataset["level"]
+    factor_lists = dataset["factor_lists"]
+
+    # Aggregated bins do not belong to a single specification
+    if clickData is None or (view is not None and view["step"] > 1):
         return ("Specification Nr.: -", *(["-"] * len(get_spec_infos())))
 
     points = clickData["points"][0]
@@ -353,17 +759,20 @@ def display_click_data(memory, clickData):
     kc = spec_data["kc"].item()
     k = spec_data["k"].item()
     f = [f"**{k}**: {spec_data[k].item()}" for k in factor_lists.keys()]
-    set = spec_data["set"].item()
-    set_es = spec_data["set_es"].item()
-    set_c_ids = np.array(set.split(",")).astype(int)
-    set_e_ids = np.array(set_es.split(",")).astype(int)
+    # Clusters and effects of the specification, from its bitsets
+    c_rows, _ = unpack_set_incidence(
+        dataset["cluster_bits"][spec_nr-1:spec_nr], len(dataset["cluster_ids"]))
+    e_rows, _ = unpack_set_incidence(
+        dataset["effect_bits"][spec_nr-1:spec_nr], len(dataset["effect_ids"]))
+    set_c_ids = dataset["cluster_ids"][c_rows]
+    set_e_ids = dataset["effect_ids"][e_rows]
     set_data = data[data[key_c_id].isin(set_c_ids)]
     clusters = {cluster: [f"*{e_id}*" for e_id in group[key_e_id]
                           if e_id in set_e_ids] for cluster, group in set_data.groupby(key_c)}
     cluster_infos = []
     for c, e_ids in clusters.items():
         c_index = np.where(np.array(cluster_fill_data["labels"]) == c)[0][0]
-        c_fill = cluster_fill_data[f"{spec_nr}"][-(c_index+1)]
+        c_fill = cluster_fill_data["fills"][c_index, spec_nr-1]
         str_e_ids = (", ").join(e_ids)
         info = f"**{c}**, Effect ID{'s' if len(e_ids) > 1 else ''}: {str_e_ids}, {c_fill:.2f}%"
         cluster_infos.append(info)
@@ -382,6 +791,7 @@ def display_click_data(memory, clickData):
 
 @app.callback(
     Output("multiverse", "figure"),
+    Output("multiverseView", "data"),
     Output("outSpecPercent", "children"),
     Output("outSpecPercentP", "children"),
     Output("outSpecPercentESA", "children"),
@@ -403,76 +813,382 @@ def display_click_data(memory, clickData):
     State({"type": "inSelect", "index": ALL}, "value"),
     prevent_initial_call=True
 )
+@metrics.instrument
 def update_multiverse(n_clicks, memory, spec_nr, ci_switch, ci_case, p_filter_switch,
                       p_marker_switch, p_value, range_kc, range_k, es_value,
                       study_list, es_list, factor_keys, factor_values):
-    specs = pd.DataFrame(memory["specs"])
-    cluster_fill_data = memory["cluster_fill_data"]
-    spec_fill_data = memory["spec_fill_data"]
-    fill_levels = len(np.unique([v for v in spec_fill_data.values()]))
-    colors = memory["colors"]
-    k_range = memory["k_range"]
-    n_total_specs = memory["n_total_specs"]
-    level = memory["level"]
-    labels = memory["config"]["labels"]
-    # title = memory["config"]["title"]
-    title = ""
-
-    y_l_limit = min(specs["lb"])
-    y_u_limit = max(specs["ub"])
-    y_range_diff = y_u_limit - y_l_limit
-    y_limits = [y_l_limit - (y_range_diff * 0.1),
-                y_u_limit + (y_range_diff * 0.1)]
-    y_ticks = np.arange(
-        round(y_limits[0], 1),
-        round(y_limits[1], 1),
-        round((y_limits[1] - y_limits[0]) / 5, 1)
-    ).round(1)
-
-    specs_f = specs.copy()
-    if ci_switch != []:
-        if ci_case == 0:
-            specs_f = specs_f[specs_f["ub"] < 0]
-        elif ci_case == 1:
-            specs_f = specs_f[specs_f["lb"] > 0]
-        elif ci_case == 2:
-            specs_f = specs_f[(specs_f["ub"] > 0) & (specs_f["lb"] < 0)]
+    dataset = _get_dataset(memory)
+    filters = {
+        "ci_switch": ci_switch,
+        "ci_case": ci_case,
+        "p_filter_switch": p_filter_switch,
+        "p_value": p_value,
+        "range_kc": range_kc,
+        "range_k": range_k,
+        "es_value": es_value,
+        "study_list": study_list,
+        "es_list": es_list,
+        "factor_keys": factor_keys,
+        "factor_values": factor_values
+    }
+    key = _get_filter_key(memory["dataset_id"], dataset, **filters)
+    cached = figure_cache.get(key)
+    if cached is None:
+        fig, rendered, *infos = _render_multiverse(dataset, **filters)
+        fig_json = to_json_plotly(fig)
+        size = len(fig_json) + sum(len(info) for info in infos)
+        figure_cache.put(key, (fig_json, rendered, infos), size)
+    else:
+        fig_json, rendered, infos = cached
+        fig = json.loads(fig_json)
+
+    # The view of the rendered figure, with the filters to render other
+    # views from, see load_visible_specs()
+    view = None
+    if rendered:
+        view = dict(get_view(dataset["n_total_specs"]),
+                    filters=_pack_view_filters(dataset, filters),
+                    p_markers=p_value)
+        view = _update_view(fig, dataset, view, _get_spec_range(spec_nr))
+        _set_spec_zoom(fig, dataset, spec_nr)
+        view = _set_p_markers(fig, dataset, view, p_marker_switch != [],
+                              p_value)
+    return (fig, view, *infos)
 
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["kc"] >= range_kc[0]]
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["kc"] <= range_kc[1]]
 
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["k"] >= range_k[0]]
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["k"] <= range_k[1]]
+@app.callback(
+    Output("multiverse", "figure", allow_duplicate=True),
+    Output("multiverseView", "data", allow_duplicate=True),
+    State("memory", "data"),
+    State("multiverseView", "data"),
+    State("inPMarkerSwitch", "value"),
+    State("inPValues", "value"),
+    Input("inSpecNr", "value"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def zoom_to_spec(memory, view, p_marker_switch, p_value, spec_nr):
+    if view is None:
+        raise PreventUpdate
+    dataset = _get_dataset(memory)
+    patched = Patch()
+    view = _update_view(patched, dataset, view, _get_spec_range(spec_nr))
+    _set_spec_zoom(patched, dataset, spec_nr)
+    view = _set_p_markers(patched, dataset, view, p_marker_switch != [],
+                          p_value)
+    return patched, view
 
-    if p_filter_switch != []:
-        if len(specs_f) != 0:
-            specs_f = specs_f[specs_f["p"] < p_value]
 
-    if es_value != 0:
-        # cutoff_rank = specs_f[specs_f["mean"] >= 0].iloc[0]["rank"]
-        if len(specs_f) != 0:
-            if es_value < 0:
-                specs_f = specs_f[specs_f["mean"] < 0]
-            else:
-                specs_f = specs_f[specs_f["mean"] >= 0]
-
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["set"].apply(lambda set: all(
-            c_id in study_list for c_id in set.split(",")))]
-    if len(specs_f) != 0:
-        specs_f = specs_f[specs_f["set_es"].apply(
-            lambda set_es: all(e_id in es_list for e_id in set_es.split(",")))]
-
-    factors = zip(factor_keys, factor_values)
-
-    for f_key, f_val in factors:
-        if f_val is not None:
-            if len(specs_f) != 0:
-                specs_f = specs_f[specs_f[f_key] == f_val]
+@app.callback(
+    Output("multiverse", "figure", allow_duplicate=True),
+    Output("multiverseView", "data", allow_duplicate=True),
+    State("memory", "data"),
+    State("multiverseView", "data"),
+    State("inPValues", "value"),
+    Input("inPMarkerSwitch", "value"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def toggle_p_markers(memory, view, p_value, p_marker_switch):
+    if view is None:
+        raise PreventUpdate
+    patched = Patch()
+    view = _set_p_markers(patched, _get_dataset(memory), view,
+                          p_marker_switch != [], p_value)
+    return patched, view
+
+
+@app.callback(
+    Output("multiverse", "figure", allow_duplicate=True),
+    Output("multiverseView", "data", allow_duplicate=True),
+    State("memory", "data"),
+    State("multiverseView", "data"),
+    State("inPMarkerSwitch", "value"),
+    State("inPValues", "value"),
+    Input("multiverse", "relayoutData"),
+    prevent_initial_call=True
+)
+@metrics.instrument
+def load_visible_specs(memory, view, p_marker_switch, p_value,
+                       relayout_data):
+    if view is None or relayout_data is None:
+        raise PreventUpdate
+    changed, x_range = _get_relayout_range(relayout_data)
+    if not changed:
+        raise PreventUpdate
+    dataset = _get_dataset(memory)
+    patched = Patch()
+    new_view = _update_view(patched, dataset, view, x_range)
+    if new_view is view:
+        raise PreventUpdate
+    _set_x_range(patched, dataset, x_range)
+    new_view = _set_p_markers(patched, dataset, new_view,
+                              p_marker_switch != [], p_value)
+    return patched, new_view
+
+
+def _get_n_rows(dataset):
+    """Get the number of panels of the multiverse figure."""
+    return 5 if dataset["level"] == 3 else 3
+
+
+def _get_spec_range(spec_nr):
+    """Get the x-axis range around a specification.
+
+    Arguments:
+        spec_nr -- The specification number, or None.
+
+    Returns:
+        The x-axis range, or None for all specifications.
+    """
+    if spec_nr is None:
+        return None
+    return [spec_nr-10, spec_nr+10]
+
+
+def _get_relayout_range(relayout_data):
+    """Get the x-axis range of a relayout event of the multiverse figure.
+
+    The x-axes of all panels are shared, so the first one found is used.
+
+    Arguments:
+        relayout_data -- The relayoutData of the figure.
+
+    Returns:
+        A tuple of whether the x-axis range changed and the new range,
+        which is None if the axis was reset to all specifications.
+    """
+    for key, value in relayout_data.items():
+        axis, _, attribute = key.partition(".")
+        if not axis.startswith("xaxis"):
+            continue
+        if attribute == "autorange" and value:
+            return True, None
+        if attribute == "range":
+            return True, value
+        if attribute == "range[0]" and f"{axis}.range[1]" in relayout_data:
+            return True, [value, relayout_data[f"{axis}.range[1]"]]
+    return False, None
+
+
+def _update_view(fig, dataset, view, x_range):
+    """Render the traces of the multiverse figure for an x-axis range.
+
+    Large multiverses are rendered as an overview of aggregated bins (see
+    plotting.get_view()). If the current view does not cover the visible
+    ranks at the resolution they need, e.g. after zooming in, all traces
+    are replaced by those of a new view, rendered from the filters of the
+    view (see _get_view_filters()). The p-value markers are hidden
+    afterwards, see _set_p_markers(). Works on figure dictionaries as well
+    as on partial updates (dash.Patch).
+
+    Arguments:
+        fig -- The figure dictionary or partial update.
+        dataset -- The dataset, see dataset.build_dataset().
+        view -- The current view and its filters.
+        x_range -- The x-axis range, or None for all specifications.
+
+    Returns:
+        The new view, or the current one if it covers the range.
+    """
+    n_total_specs = dataset["n_total_specs"]
+    first, last = get_visible_ranks(n_total_specs, x_range)
+    new_view = get_view(n_total_specs, x_range)
+    if (new_view["step"] == view["step"] and view["first"] <= first
+            and last <= view["last"]):
+        return view
+
+    filters = _get_view_filters(dataset, view)
+    specs_f = _get_filtered_specs(dataset, **filters)
+    traces = _plot_multiverse(dataset, specs_f, filters["p_value"],
+                              new_view).data
+    for i, trace in enumerate(traces):
+        fig["data"][i] = trace.to_plotly_json()
+    return dict(new_view, filters=view["filters"],
+                p_markers=filters["p_value"])
+
+
+def _set_x_range(fig, dataset, x_range):
+    """Set the x-axis ranges of all panels of the multiverse figure.
+
+    Arguments:
+        fig -- The figure dictionary or partial update.
+        dataset -- The dataset, see dataset.build_dataset().
+        x_range -- The x-axis range, or None for all specifications.
+    """
+    if x_range is None:
+        x_range = [1 - 0.5, dataset["n_total_specs"] + 0.5]
+    for row in range(1, _get_n_rows(dataset) + 1):
+        axis = "xaxis" if row == 1 else f"xaxis{row}"
+        fig["layout"][axis]["range"] = x_range
+
+
+def _set_spec_zoom(fig, dataset, spec_nr):
+    """Zoom the multiverse figure to a specification.
+
+    Sets the x-axis ranges and the position and visibility of the lines
+    around the specification, which are the first shapes of the figure
+    (see _plot_multiverse()). Works on figure dictionaries as well as on
+    partial updates (dash.Patch).
+
+    Arguments:
+        fig -- The figure dictionary or partial update.
+        dataset -- The dataset, see dataset.build_dataset().
+        spec_nr -- The specification number, or None to reset the zoom.
+    """
+    n_rows = _get_n_rows(dataset)
+    _set_x_range(fig, dataset, _get_spec_range(spec_nr))
+    tickvals = None if spec_nr is None else [spec_nr]
+    x = 0 if spec_nr is None else spec_nr
+    for row in range(1, n_rows + 1):
+        axis = "xaxis" if row == 1 else f"xaxis{row}"
+        fig["layout"][axis]["tickvals"] = tickvals
+
+    # The lines are ordered by side first, then by panel
+    for i, offset in enumerate([-0.5] * n_rows + [0.5] * n_rows):
+        fig["layout"]["shapes"][i]["x0"] = x + offset
+        fig["layout"]["shapes"][i]["x1"] = x + offset
+        fig["layout"]["shapes"][i]["visible"] = spec_nr is not None
+
+
+def _set_p_markers(fig, dataset, view, visible, p_value):
+    """Show or hide the p-value markers of the multiverse figure.
+
+    The markers are the last trace of the figure (see
+    _plot_multiverse()). If they are shown for another threshold than the
+    one they were rendered for, e.g. after the threshold was changed
+    without applying the filters, they are rendered again. Works on
+    figure dictionaries as well as on partial updates (dash.Patch).
+
+    Arguments:
+        fig -- The figure dictionary or partial update.
+        dataset -- The dataset, see dataset.build_dataset().
+        view -- The current view, see _update_view().
+        visible -- Whether to show the markers.
+        p_value -- The selected p-value threshold.
+
+    Returns:
+        The view with the threshold of the rendered markers.
+    """
+    marker_trace = 6 if dataset["level"] == 3 else 4
+    if visible and p_value is not None and p_value != view["p_markers"]:
+        filters = _get_view_filters(dataset, view)
+        specs_f = _get_filtered_specs(dataset, **filters)
+        trace = _get_p_marker_trace(dataset, specs_f, p_value, view)
+        fig["data"][marker_trace] = dict(trace.to_plotly_json(),
+                                         visible=True)
+        return dict(view, p_markers=p_value)
+    fig["data"][marker_trace]["visible"] = visible
+    return view
+
+
+def _get_filtered_specs(dataset, ci_switch, ci_case, p_filter_switch,
+                        p_value, range_kc, range_k, es_value, study_list,
+                        es_list, factor_keys, factor_values):
+    """Get the specifications that match the current filter selection.
+
+    See _get_spec_mask() for the arguments.
+
+    Returns:
+        The specification data of the matching specifications.
+    """
+    mask = _get_spec_mask(dataset, ci_switch, ci_case, p_filter_switch,
+                          p_value, range_kc, range_k, es_value, study_list,
+                          es_list, factor_keys, factor_values)
+    return pd.DataFrame({
+        col: values[mask] for col, values in dataset["spec_arrays"].items()
+    })
+
+
+def _plot_multiverse(dataset, specs_f, p_value, view):
+    """Plot the multiverse figure of the filtered specifications.
+
+    The figure always contains lines to mark a specification and p-value
+    markers, both hidden, which are shown by _set_spec_zoom() and
+    _set_p_markers().
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        specs_f -- The filtered specification data.
+        p_value -- The p-value threshold of the markers.
+        view -- The ranks and resolution to show, see plotting.get_view().
+
+    Returns:
+        Plotly figure.
+    """
+    level = dataset["level"]
+    fig = plot_multiverse(
+        specs_f,
+        dataset["n_total_specs"],
+        dataset["k_range"],
+        dataset["cluster_fill_data"],
+        dataset["spec_fill_data"],
+        dataset["config"]["labels"],
+        dataset["colors"],
+        level,
+        # dataset["config"]["title"]
+        "",
+        dataset["fill_levels"],
+        dataset["y_ticks"],
+        dataset["y_limits"],
+        view
+    )
+
+    # Hidden lines around a specification, moved to the front of the
+    # shapes such that they can be addressed by index
+    n_shapes = len(fig.layout.shapes)
+    fig.add_vline(x=0, line_color="red", visible=False)
+    fig.add_vline(x=0, line_color="red", visible=False)
+    shapes = fig.layout.shapes
+    fig.layout.shapes = shapes[n_shapes:] + shapes[:n_shapes]
+
+    # Hidden p-value markers as the last trace
+    fig.add_trace(_get_p_marker_trace(dataset, specs_f, p_value, view))
+    return fig
+
+
+def _get_p_marker_trace(dataset, specs_f, p_value, view):
+    """Get the hidden p-value markers of the multiverse figure.
+
+    Arguments:
+        dataset -- The dataset, see dataset.build_dataset().
+        specs_f -- The filtered specification data.
+        p_value -- The p-value threshold of the markers.
+        view -- The ranks and resolution to show, see plotting.get_view().
+
+    Returns:
+        The markers as a scatter trace on the panel of the summary effects.
+    """
+    specs_p = bin_specs(specs_f[specs_f["p"] < p_value], view)
+    axis = "" if dataset["level"] == 2 else "2"
+    return go.Scatter(
+        x=specs_p["rank"],
+        y=specs_p["mean"],
+        marker=dict(color="blue", symbol="diamond", size=10),
+        mode="markers", hovertemplate="p-Value: %{customdata:.4f}<extra></extra>", customdata=specs_p["p"],
+        visible=False, xaxis=f"x{axis}", yaxis=f"y{axis}"
+    )
+
+
+def _render_multiverse(dataset, ci_switch, ci_case, p_filter_switch, p_value,
+                       range_kc, range_k, es_value, study_list, es_list,
+                       factor_keys, factor_values):
+    """Render the multiverse figure and filter summary.
+
+    The figure shows all specifications, as an overview of aggregated bins
+    for large multiverses, see _update_view().
+
+    See update_multiverse() and _get_spec_mask() for the arguments.
+
+    Returns:
+        A tuple of the figure as a dictionary, whether it shows any
+        specifications, and the four filter summary strings.
+    """
+    n_total_specs = dataset["n_total_specs"]
+    specs_f = _get_filtered_specs(dataset, ci_switch, ci_case,
+                                  p_filter_switch, p_value, range_kc, range_k,
+                                  es_value, study_list, es_list, factor_keys,
+                                  factor_values)
 
     n_specs_f = len(specs_f)
     sfp = n_specs_f * 100 / n_total_specs
@@ -493,53 +1209,16 @@ def update_multiverse(n_clicks, memory, spec_nr, ci_switch, ci_case, p_filter_sw
     sfpesb_info = f"**{sfpesb:5.2f}%** of shown effect sizes are **< 0** ({n_specs_esb} / {n_specs_f})"
 
     if n_specs_f == 0:
-        return _get_empty_figure(), sfp_info, sfpp_info, sfpesa_info, sfpesb_info
-
-    fig = plot_multiverse(
-        specs_f,
-        n_total_specs,
-        k_range,
-        cluster_fill_data,
-        spec_fill_data,
-        labels,
-        colors,
-        level,
-        title,
-        fill_levels,
-        y_ticks,
-        y_limits
-    )
-
-    if spec_nr is not None:
-        fig.update_xaxes(
-            range=[spec_nr-10, spec_nr+10],
-            tickvals=[spec_nr]
-        )
-        fig.add_vline(x=spec_nr-0.5, line_color="red")
-        fig.add_vline(x=spec_nr+0.5, line_color="red")
-
-    customdata = specs_f[specs_f["p"] < p_value]["p"]
-    if p_marker_switch != []:
-        fig.add_trace(
-            go.Scatter(
-                x=specs_f[specs_f["p"] < p_value]["rank"],
-                y=specs_f[specs_f["p"] < p_value]["mean"],
-                marker=dict(color="blue", symbol="diamond", size=10),
-                mode="markers", hovertemplate="p-Value: %{customdata:.4f}<extra></extra>", customdata=customdata
-            ), row=1 if level == 2 else 2, col=1
-        )
+        return (_get_empty_figure().to_plotly_json(), False,
+                sfp_info, sfpp_info, sfpesa_info, sfpesb_info)
 
-    # if es_value != 0:
-    #     if es_value > 0:
-    #         limits = [cutoff_rank, n_total_specs]
-    #     else:
-    #         limits = [1, cutoff_rank-1]
-    #     fig.update_xaxes(
-    #         range=limits
-    #     )
+    fig = _plot_multiverse(dataset, specs_f, p_value,
+                           get_view(n_total_specs))
+    return (fig.to_plotly_json(), True,
+            sfp_info, sfpp_info, sfpesa_info, sfpesb_info)
 
-    return fig, sfp_info, sfpp_info, sfpesa_info, sfpesb_info
 
+warm_up()
 
 if __name__ == '__main__':
     app.run_server(host='0.0.0.0', port=8050)
@@ -1,4 +1,28 @@
+import numpy as np
 import pandas as pd
+import re
+
+# Hidden column of the dataset table, 1 for rows of odd clusters
+STRIPE_COLUMN = "_stripe"
+
+# Operators of DataTable filter queries, see filter_table()
+_FILTER_PART = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s*(?P<case>[si]?)"
+    r"(?P<operator>>=|<=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith)"
+    r"\s*(?P<value>.*)$"
+)
+
+
+def read_data(raw):
+    """Read the raw meta-analytic data.
+
+    Arguments:
+        raw -- The path or text stream of the data file.
+
+    Returns:
+        The data as a pandas DataFrame.
+    """
+    return pd.read_csv(raw, sep=",", header=0, escapechar='\\', na_values=['NA'], keep_default_na=False)
 
 
 def prepare_data(colmap, raw=None, data=None):
@@ -15,12 +39,14 @@ def prepare_data(colmap, raw=None, data=None):
                 (default: {None}).
 
     Returns:
-        Prepared data as a pandas DataFrame.
+        Prepared data as a pandas DataFrame. Its attrs["generated"] lists
+        the ID columns that were created from the row positions.
     """
     # Read raw input into pandas DataFrame, if data
     # is not provided as such
     if data is None:
-        data = pd.read_csv(raw, sep=",", header=0, escapechar='\\', na_values=['NA'], keep_default_na=False)
+        data = read_data(raw)
+    generated = []
 
     # Get relevant keys from colmap
     key_c = colmap["key_c"]
@@ -41,13 +67,15 @@ def prepare_data(colmap, raw=None, data=None):
 
         # Add cluster ID column into DataFrame
         data[key_c_id] = data[key_c].map(cluster_ids)
+        generated.append(key_c_id)
 
     # Sort meta-analytic data by cluster ID
-    data.sort_values(by=key_c_id, inplace=True)
+    data.sort_values(by=key_c_id, inplace=True, kind="stable")
 
     # If an effect ID does not exist, create it
     if key_e_id not in data:
         data[key_e_id] = [e_id for e_id in range(1, len(data) + 1)]
+        generated.append(key_e_id)
 
     # Reorder columns such that cluster ID, cluster name
     # and effect ID are the first three columns
@@ -58,5 +86,218 @@ def prepare_data(colmap, raw=None, data=None):
     # Reindex DataFrame and set type of sample size to integer
     data = data.reindex(columns=cols)
     data = data.astype({colmap["key_n"]: "int64"})
+    data.attrs["generated"] = generated
 
     return data
+
+
+def get_set_incidence(sets, ids):
+    """Get the incidence of IDs in comma-separated ID sets.
+
+    The incidence matrix has one row per ID and one column per set. Only
+    its non-zero entries are returned, in coordinate form, so that large
+    multiverses do not require a dense matrix.
+
+    Arguments:
+        sets -- The comma-separated ID sets as a pandas Series
+                (e.g. the "set_es" column of the specification data).
+        ids -- The sorted array of all IDs.
+
+    Returns:
+        A tuple of row indices (into ids) and column indices (into sets)
+        of all non-zero entries.
+    """
+    sets = sets.astype(str)
+
+    # Number of IDs in each set, and a flat array of all IDs
+    lengths = sets.str.count(",").to_numpy() + 1
+    members = np.array((",").join(sets).split(","), dtype=np.int64)
+
+    rows = np.searchsorted(ids, members)
+    cols = np.repeat(np.arange(len(sets)), lengths)
+    return rows, cols
+
+
+def pack_set_incidence(rows, cols, n_ids, n_sets):
+    """Pack the incidence of IDs in sets into one bitset per set.
+
+    Bit i of a bitset (in the bit order of numpy.packbits) is set if the
+    i-th ID belongs to the set.
+
+    Arguments:
+        rows -- The ID indices of the incidence, see get_set_incidence().
+        cols -- The set indices of the incidence, see get_set_incidence().
+        n_ids -- The total number of IDs.
+        n_sets -- The total number of sets.
+
+    Returns:
+        The bitsets as a uint8 array of shape (n_sets, ceil(n_ids / 8)).
+    """
+    n_bytes = (n_ids + 7) // 8
+    bits = np.zeros((n_sets, n_bytes), dtype=np.uint8)
+    masks = (128 >> (rows & 7)).astype(np.uint8)
+    np.bitwise_or.at(bits, (cols, rows >> 3), masks)
+    return bits
+
+
+def unpack_set_incidence(bits, n_ids, chunk_sets=4096):
+    """Unpack bitsets into the incidence of IDs in sets.
+
+    The bitsets are unpacked chunk_sets at a time, so that only the
+    non-zero entries of the incidence are held for all sets.
+
+    Arguments:
+        bits -- The packed bitsets, see pack_set_incidence().
+        n_ids -- The total number of IDs.
+
+    Keyword Arguments:
+        chunk_sets -- The number of sets unpacked at once (default: {4096}).
+
+    Returns:
+        A tuple of row indices (into the IDs) and column indices (into the
+        sets) of all non-zero entries, see get_set_incidence().
+    """
+    rows = [np.empty(0, dtype=np.int64)]
+    cols = [np.empty(0, dtype=np.int64)]
+    for start in range(0, len(bits), chunk_sets):
+        chunk = np.unpackbits(bits[start:start + chunk_sets], axis=1,
+                              count=n_ids)
+        chunk_cols, chunk_rows = np.nonzero(chunk)
+        rows.append(chunk_rows)
+        cols.append(chunk_cols + start)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def get_subset_mask(bits, ids, selected):
+    """Test which sets contain only selected IDs.
+
+    A set passes if its bitset has no bits outside of the selection,
+    i.e. (set bits AND NOT selected bits) == 0.
+
+    Arguments:
+        bits -- The packed bitsets, see pack_set_incidence().
+        ids -- The sorted array of all IDs.
+        selected -- The selected IDs (e.g. checklist values).
+
+    Returns:
+        A boolean array, True for each set that is a subset of the
+        selection.
+    """
+    selected = np.asarray(selected, dtype=ids.dtype)
+    selected_bits = np.packbits(np.isin(ids, selected))
+    return ~np.any(bits & ~selected_bits, axis=1)
+
+
+def _parse_filter_value(value):
+    """Strip the quotes of a filter query value."""
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+        return value[1:-1]
+    return value
+
+
+def filter_table(df, filter_query):
+    """Filter a table by a DataTable filter query.
+
+    Supports the queries written by the DataTable filter row, i.e. parts
+    of the form "{column} operator value" joined by "&&". Parts that cannot
+    be parsed are ignored.
+
+    Arguments:
+        df -- The table as a pandas DataFrame.
+        filter_query -- The filter query.
+
+    Returns:
+        The matching rows.
+    """
+    if not filter_query:
+        return df
+
+    mask = np.ones(len(df), dtype=bool)
+    for part in filter_query.split(" && "):
+        match = _FILTER_PART.match(part.strip())
+        if match is None or match["column"] not in df:
+            print(f"WARNING: Ignoring filter query '{part}'")
+            continue
+        column = df[match["column"]]
+        operator = match["operator"]
+        value = _parse_filter_value(match["value"])
+
+        # Missing values never match, as in the DataTable itself
+        if operator in ("contains", "datestartswith"):
+            strings = column.astype("string")
+            if operator == "datestartswith":
+                matches = strings.str.startswith(value, na=False)
+            else:
+                matches = strings.str.contains(
+                    value, case=match["case"] != "i", regex=False, na=False)
+            mask &= matches.to_numpy(dtype=bool)
+            continue
+
+        if pd.api.types.is_numeric_dtype(column):
+            value = pd.to_numeric(value, errors="coerce")
+            if np.isnan(value):
+                print(f"WARNING: Ignoring filter query '{part}'")
+                continue
+        else:
+            column = column.astype("string")
+            if match["case"] == "i":
+                column = column.str.lower()
+                value = value.lower()
+        if operator in ("=", "eq"):
+            matches = column == value
+        elif operator in ("!=", "ne"):
+            matches = column != value
+        elif operator in ("<", "lt"):
+            matches = column < value
+        elif operator in ("<=", "le"):
+            matches = column <= value
+        elif operator in (">", "gt"):
+            matches = column > value
+        else:
+            matches = column >= value
+        mask &= (matches & column.notna()).fillna(False).to_numpy(dtype=bool)
+    return df[mask]
+
+
+def get_table_page(df, key_c_id, page_current=0, page_size=None,
+                   sort_by=None, filter_query=""):
+    """Get one page of the dataset table.
+
+    Rows are filtered and sorted on the server, and only the requested page
+    is returned, such that the size of the table in the browser does not
+    grow with the dataset. Each row holds a STRIPE_COLUMN value to color
+    the rows of alternating clusters with a single style rule.
+
+    Arguments:
+        df -- The meta-analytic data.
+        key_c_id -- The column of the cluster IDs.
+
+    Keyword Arguments:
+        page_current -- The index of the page (default: {0}).
+        page_size -- The number of rows per page (default: {None}, all).
+        sort_by -- The sort_by property of the DataTable (default: {None}).
+        filter_query -- The filter_query property of the DataTable
+                        (default: {""}).
+
+    Returns:
+        A tuple of the rows of the page as records and the number of pages.
+    """
+    df = filter_table(df, filter_query)
+    if sort_by:
+        df = df.sort_values(
+            by=[col["column_id"] for col in sort_by],
+            ascending=[col["direction"] == "asc" for col in sort_by],
+            kind="mergesort"
+        )
+
+    if page_size is None:
+        page_count = 1
+    else:
+        page_count = max(1, -(-len(df) // page_size))
+        df = df.iloc[page_current * page_size:(page_current + 1) * page_size]
+
+    records = df.assign(
+        **{STRIPE_COLUMN: (df[key_c_id] % 2 != 0).astype(int)}
+    ).to_dict("records")
+    return records, page_count
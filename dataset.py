@@ -0,0 +1,435 @@
+import base64
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import cache
+import specs_store
+from config import read_config
+from data import prepare_data, get_set_incidence, pack_set_incidence
+from plotting import get_spec_fill_data, get_cluster_fill_data, get_colors, \
+    patch_cluster_fill_data, patch_spec_fill_data, _get_y_limits, _get_y_ticks
+
+# If enabled, the numeric arrays of cached datasets are memory-mapped
+# read-only from the cache instead of being loaded into each process, so
+# all workers share a single copy.
+SHARED_ARRAYS = os.environ.get("MULTIVERSE_SHARED_ARRAYS", "0") == "1"
+
+# Numeric specification columns kept as arrays
+SPEC_COLUMNS = ["rank", "mean", "lb", "ub", "ci", "p", "k", "kc"]
+
+# Process-level registry of prepared datasets, keyed by content ID.
+# Only a handful of datasets are kept; the least recently used one is
+# evicted once the limit is reached.
+_MAX_DATASETS = 8
+_datasets = OrderedDict()
+
+
+def read_files(filenames):
+    """Read the raw contents of the dataset files from disk.
+
+    The content of a specs store is its manifest, which includes a
+    checksum of all columns, see specs_store.write_specs().
+
+    Arguments:
+        filenames -- The paths to the dataset files.
+
+    Returns:
+        A list with the raw contents of each file.
+    """
+    return [specs_store.read_text(f) for f in filenames]
+
+
+def get_content_id(filenames, contents):
+    """Get the content ID of a set of dataset files.
+
+    The ID is a hash over the file names and contents, so identical
+    uploads always resolve to the same registry entry.
+
+    Arguments:
+        filenames -- The names of the dataset files.
+        contents -- The raw contents of the dataset files.
+
+    Returns:
+        The content ID as a hex string.
+    """
+    content_hash = hashlib.sha256()
+    for f, c in sorted(zip(filenames, contents)):
+        content_hash.update(os.path.basename(f).encode("utf-8"))
+        content_hash.update(b"\0")
+        content_hash.update(c.encode("utf-8"))
+        content_hash.update(b"\0")
+    return content_hash.hexdigest()[:16]
+
+
+def _decode(content):
+    """Decode raw or base64-encoded (uploaded) file contents.
+
+    Arguments:
+        content -- The raw file content.
+
+    Returns:
+        The decoded content as a text stream.
+    """
+    if content.startswith("data:application"):
+        c_type, c_string = content.split(",")
+        c_decoded = base64.b64decode(c_string)
+        return io.StringIO(c_decoded.decode("ISO-8859-1"))
+    return io.StringIO(content)
+
+
+def build_dataset(filenames, contents):
+    """Parse the dataset files and compute all derived structures.
+
+    The specifications may also be read from a specs store on disk, see
+    specs_store.py, whose factor codes and bitsets are then used as they
+    are. The clusters and effects of each specification are only read as
+    bitsets, not as ID strings. If the store was written by an update
+    (see engine.update_specs()) and the dataset it was updated from is
+    registered or cached, that dataset is patched, see update_dataset().
+
+    Arguments:
+        filenames -- The names of the dataset files.
+        contents -- The raw contents of the dataset files.
+
+    Returns:
+        Dataset dictionary containing the prepared DataFrames, fill data
+        and summary values needed by the dashboard.
+    """
+    store = None
+    contents_by_kind = {}
+    for f, c in sorted(zip(filenames, contents)):
+        c_decoded_str = _decode(c)
+
+        if os.path.basename(f).startswith("boot"):
+            boot_data = pd.read_csv(c_decoded_str, na_values=['NA'], keep_default_na=False)
+
+        if os.path.basename(f).startswith("config"):
+            config = read_config(data=c_decoded_str)
+
+        if os.path.basename(f).startswith("data"):
+            contents_by_kind["data"] = c_decoded_str.getvalue()
+            data = prepare_data(config["colmap"], raw=c_decoded_str)
+
+        if os.path.basename(f).startswith("specs"):
+            contents_by_kind["specs"] = c_decoded_str.getvalue()
+            if specs_store.is_store(f):
+                store = f
+                columns = [
+                    column["name"]
+                    for column in specs_store.read_meta(store)["columns"]
+                    if column["kind"] != "strings"
+                ]
+                specs = specs_store.read_specs(store, columns)
+            else:
+                specs = pd.read_csv(c_decoded_str, na_values=['NA'], keep_default_na=False)
+    source_key = specs_store.get_source_key(contents_by_kind["data"],
+                                            contents_by_kind["specs"])
+
+    if store is not None:
+        old_ranks = specs_store.read_old_ranks(store)
+        previous = None
+        if old_ranks is not None:
+            previous = _find_previous(specs_store.read_meta(store)["previous"])
+        if (previous is not None and previous["config"] == config
+                and old_ranks.max(initial=0) <= previous["n_total_specs"]):
+            return update_dataset(previous, boot_data, data, specs,
+                                  old_ranks, source_key, store)
+    return _derive_dataset(config, boot_data, data, specs, source_key, store)
+
+
+def _find_previous(source_key):
+    """Find the dataset with a source key in the registry or the cache.
+
+    Arguments:
+        source_key -- The source key, see specs_store.get_source_key().
+
+    Returns:
+        The dataset, or None if it is neither registered nor cached.
+    """
+    for dataset in list(_datasets.values()):
+        if dataset.get("source_key") == source_key:
+            return dataset
+    dataset_id = cache.read_alias(source_key)
+    if dataset_id is None:
+        return None
+    return cache.read_dataset(dataset_id)
+
+
+def update_dataset(dataset, boot_data, data, specs, old_ranks, source_key,
+                   store=None):
+    """Update a dataset to changed data and specifications.
+
+    The cluster and spec fill data are patched instead of being computed
+    from scratch, see plotting.patch_cluster_fill_data() and
+    plotting.patch_spec_fill_data().
+
+    Arguments:
+        dataset -- The previous dataset, see build_dataset().
+        boot_data -- The bootstrap data.
+        data -- The updated meta-analytic data.
+        specs -- The updated specification data, ordered by rank.
+        old_ranks -- The previous rank of each specification, 0 if it was
+                     refitted, see engine.update_specs().
+        source_key -- The source key of the updated data and
+                      specifications, see specs_store.get_source_key().
+
+    Keyword Arguments:
+        store -- The path of the specs store the specifications were read
+                 from (default: {None}).
+
+    Returns:
+        The updated dataset.
+    """
+    return _derive_dataset(dataset["config"], boot_data, data, specs,
+                           source_key, store, previous=dataset,
+                           old_ranks=old_ranks)
+
+
+def _derive_dataset(config, boot_data, data, specs, source_key, store=None,
+                    previous=None, old_ranks=None):
+    """Compute the derived structures of a dataset, see build_dataset().
+
+    Arguments:
+        config -- The configuration.
+        boot_data -- The bootstrap data.
+        data -- The prepared meta-analytic data.
+        specs -- The specification data.
+        source_key -- The source key of the data and specifications, see
+                      specs_store.get_source_key().
+
+    Keyword Arguments:
+        store -- The path of the specs store the specifications were read
+                 from (default: {None}).
+        previous -- The dataset whose fill data is patched, see
+                    update_dataset() (default: {None}, computed).
+        old_ranks -- The previous rank of each specification, if previous
+                     is given (default: {None}).
+
+    Returns:
+        The dataset.
+    """
+    # Order specifications by rank, such that row i holds rank i + 1
+    specs = specs.sort_values(by="rank").reset_index(drop=True)
+
+    if previous is None:
+        spec_fill_data = get_spec_fill_data(
+            config["which_lists"],
+            config["how_lists"],
+            specs
+        )
+    else:
+        spec_fill_data = patch_spec_fill_data(
+            previous["spec_fill_data"], old_ranks, config["which_lists"],
+            config["how_lists"], specs)
+    fill_levels = len(np.unique(spec_fill_data))
+    colors = get_colors(fill_levels)
+
+    k_min = config["k_min"]
+    k_max = max(specs["k"])
+    k_range = [k_min, k_max]
+
+    kc_min = min(specs["kc"])
+    kc_max = max(specs["kc"])
+    kc_range = [kc_min, kc_max]
+
+    key_c_id = config["colmap"]["key_c_id"]
+    key_c = config["colmap"]["key_c"]
+    key_e_id = config["colmap"]["key_e_id"]
+
+    y_limits = _get_y_limits(specs)
+    y_ticks = _get_y_ticks(y_limits)
+
+    factor_lists = dict(config["which_lists"], **config["how_lists"])
+    cluster_ids = np.sort(data[key_c_id].unique())
+    effect_ids = np.sort(data[key_e_id].to_numpy())
+    stored = _read_store_columns(store, factor_lists, cluster_ids,
+                                 effect_ids)
+
+    # Categorical codes of the factor values of each specification
+    if "factor_codes" in stored:
+        factor_codes = stored["factor_codes"]
+    else:
+        factor_codes = np.array([
+            pd.Categorical(specs[key], categories=vals).codes
+            for key, vals in factor_lists.items()
+        ], dtype=np.int16)
+
+    # Bitsets of the clusters and effects of each specification, used to
+    # filter specifications by the study and effect size checklists
+    if "cluster_bits" in stored:
+        cluster_bits = stored["cluster_bits"]
+    else:
+        cluster_bits = pack_set_incidence(
+            *get_set_incidence(specs["set"], cluster_ids),
+            len(cluster_ids),
+            len(specs)
+        )
+    if "effect_bits" in stored:
+        effect_bits = stored["effect_bits"]
+    else:
+        effect_bits = pack_set_incidence(
+            *get_set_incidence(specs["set_es"], effect_ids),
+            len(effect_ids),
+            len(specs)
+        )
+    if previous is None:
+        cluster_fill_data = get_cluster_fill_data(
+            data, specs, config["colmap"], effect_bits=effect_bits)
+    else:
+        cluster_fill_data = patch_cluster_fill_data(
+            previous["cluster_fill_data"], old_ranks, previous["data"],
+            data, specs, config["colmap"], effect_bits=effect_bits)
+
+    dataset = {
+        "config": config,
+        "boot_data": boot_data,
+        "specs": specs,
+        "spec_arrays": {col: specs[col].to_numpy() for col in SPEC_COLUMNS},
+        "factor_codes": factor_codes,
+        "data": data,
+        "cluster_fill_data": cluster_fill_data,
+        "spec_fill_data": spec_fill_data,
+        "fill_levels": fill_levels,
+        "colors": colors,
+        "k_range": k_range,
+        "kc_range": kc_range,
+        "y_limits": y_limits,
+        "y_ticks": y_ticks,
+        "n_es": len(data),
+        "n_total_specs": len(specs),
+        "key_c_id": key_c_id,
+        "key_c": key_c,
+        "key_e_id": key_e_id,
+        "c_ids": [str(c_id) for c_id in cluster_ids],
+        "e_ids": [str(e_id) for e_id in effect_ids],
+        "cluster_ids": cluster_ids,
+        "effect_ids": effect_ids,
+        "cluster_bits": cluster_bits,
+        "effect_bits": effect_bits,
+        "n_clusters": len(data[key_c_id].unique()),
+        "level": config["level"],
+        "factor_lists": factor_lists,
+        "source_key": source_key
+    }
+    return dataset
+
+
+def _read_store_columns(store, factor_lists, cluster_ids, effect_ids):
+    """Read the factor codes and bitsets of a specs store.
+
+    Factor codes are only used if the store has the same factor values as
+    the configuration; otherwise they are computed from the
+    specifications. Bitsets are used as they are if the store has the same
+    IDs as the data, and otherwise packed from its ID strings.
+
+    Arguments:
+        store -- The path of the specs store, or None.
+        factor_lists -- The which- and how-factors with their values.
+        cluster_ids -- The sorted cluster IDs of the data.
+        effect_ids -- The sorted effect IDs of the data.
+
+    Returns:
+        A dictionary with the factor codes ("factor_codes"), see
+        build_dataset(), if they could be used, and the bitsets
+        ("cluster_bits", "effect_bits").
+    """
+    if store is None:
+        return {}
+    meta = specs_store.read_meta(store)
+    values = {column["name"]: column.get("values")
+              for column in meta["columns"]}
+    columns = []
+    if all(values.get(key) == list(vals)
+           for key, vals in factor_lists.items()):
+        columns.extend(factor_lists)
+    set_ids = {"set": cluster_ids, "set_es": effect_ids}
+    stored_ids = {"set": meta["cluster_ids"], "set_es": meta["effect_ids"]}
+    for name, bits_name in specs_store.SET_COLUMNS.items():
+        if np.array_equal(stored_ids[name], set_ids[name]):
+            columns.append(bits_name)
+        else:
+            columns.append(name)
+    arrays = specs_store.read_columns(store, columns, mmap_mode=None)
+
+    stored = {}
+    for name, bits_name in specs_store.SET_COLUMNS.items():
+        if bits_name in arrays:
+            stored[bits_name] = arrays[bits_name]
+        else:
+            stored[bits_name] = pack_set_incidence(
+                *get_set_incidence(pd.Series(arrays[name]), set_ids[name]),
+                len(set_ids[name]),
+                meta["n_specs"]
+            )
+    if all(key in arrays for key in factor_lists):
+        stored["factor_codes"] = np.array(
+            [arrays[key] for key in factor_lists], dtype=np.int16)
+    return stored
+
+
+def register_dataset(dataset_id, dataset):
+    """Add a prepared dataset to the process-level registry.
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+        dataset -- The dataset, see build_dataset().
+    """
+    _datasets[dataset_id] = dataset
+    _datasets.move_to_end(dataset_id)
+    while len(_datasets) > _MAX_DATASETS:
+        _datasets.popitem(last=False)
+
+
+def get_dataset(dataset_id):
+    """Get a prepared dataset from the process-level registry.
+
+    Arguments:
+        dataset_id -- The content ID of the dataset.
+
+    Returns:
+        The dataset, or None if it is not registered in this process.
+    """
+    dataset = _datasets.get(dataset_id)
+    if dataset is not None:
+        _datasets.move_to_end(dataset_id)
+    return dataset
+
+
+def load_dataset(filenames, contents=None):
+    """Get a dataset from the registry, building it if necessary.
+
+    Arguments:
+        filenames -- The names of the dataset files.
+
+    Keyword Arguments:
+        contents -- The raw contents of the dataset files. If None,
+                    the files are read from disk, and the prepared
+                    dataset is read from or written to the on-disk
+                    cache (default: {None}). With SHARED_ARRAYS, the
+                    arrays of such datasets are memory-mapped from the
+                    cache.
+
+    Returns:
+        A tuple of the content ID and the dataset.
+    """
+    use_cache = contents is None
+    if use_cache:
+        contents = read_files(filenames)
+    dataset_id = get_content_id(filenames, contents)
+    mmap_mode = "r" if SHARED_ARRAYS else None
+    dataset = get_dataset(dataset_id)
+    if dataset is None and use_cache:
+        dataset = cache.read_dataset(dataset_id, mmap_mode=mmap_mode)
+    if dataset is None:
+        dataset = build_dataset(filenames, contents)
+        if use_cache and cache.write_dataset(dataset_id, dataset) is not None:
+            cache.write_alias(dataset["source_key"], dataset_id)
+            if SHARED_ARRAYS:
+                dataset = cache.read_dataset(dataset_id, mmap_mode=mmap_mode)
+    register_dataset(dataset_id, dataset)
+    return dataset_id, dataset
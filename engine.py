@@ -0,0 +1,1327 @@
+import argparse
+import hashlib
+import itertools
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+import specs_store
+from config import read_config
+from data import get_set_incidence, prepare_data
+
+# Two-sided 95% quantile of the standard normal distribution
+Z_CRIT = 1.959963984540054
+
+# Methods of the variance component estimators, selected by this how-factor
+METHOD_KEY = "ma_method"
+METHODS = ["REML", "ML"]
+
+# Number of effects per chunk of specifications fitted by one worker
+CHUNK_EFFECTS = 200000
+
+# Number of specifications per chunk of rows built and written at once
+CHUNK_SPECS = 100000
+
+# Upper bound of the memory of the memoized fits, in bytes, see
+# _get_memo_bytes(). About 600 bytes are needed per effect subset and
+# two methods.
+MEMO_BYTES = int(os.environ.get("MULTIVERSE_MEMO_BYTES", 256 * 2**20))
+
+# Memory of a memo entry not seen by sys.getsizeof(), i.e. its slot in the
+# ordered dictionary
+_MEMO_SLOT_BYTES = 64
+
+# Columns of the fitted models of each level
+FIT_COLUMNS = {
+    2: ["mean", "se", "tau2"],
+    3: ["mean", "se", "sigma2_b", "sigma2_w"]
+}
+
+# Fixed-effect sufficient statistics of an effect subset, with weights 1/v
+STAT_COLUMNS = ["k", "sw", "swy", "swy2", "sw2", "sw3"]
+
+# Elementwise complementary error function, for two-sided p-values
+_erfc = np.vectorize(math.erfc, otypes=[float])
+
+# Effect sizes, variances and cluster IDs of the data, set once per worker
+_worker_data = {}
+
+# Fits and estimated size in bytes of effect subsets by content key,
+# least recently used entries are at the front
+_memo = OrderedDict()
+_memo_stats = {
+    "combinations": 0,
+    "subsets": 0,
+    "hits": 0,
+    "fitted": 0,
+    "evictions": 0,
+    "bytes": 0,
+    "fit_seconds": 0.0,
+    "saved_seconds": 0.0
+}
+
+
+def _is_all_value(key, value):
+    """Check whether a which-factor value selects all values of its key."""
+    return value == f"all_{key}"
+
+
+def get_effect_subsets(data, which_lists, k_min):
+    """Get the effect subsets of all which-factor combinations.
+
+    Each combination selects the effects that match all of its values,
+    where an all-value (e.g. "all_sex") matches every effect. The
+    combinations are enumerated as a tree, narrowing the subset by one
+    factor per level. Subsets only shrink towards the leaves, so branches
+    with fewer than k_min effects are pruned without enumerating them.
+    Several combinations may select the same effects, see
+    get_unique_subsets().
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        which_lists -- The which-factors.
+        k_min -- The minimum number of effects of a subset.
+
+    Returns:
+        A tuple of the which-factor values of the combinations with at
+        least k_min effects as a DataFrame, in the order of their cartesian
+        product, and their effect subsets as sorted arrays of row positions
+        in data.
+    """
+    keys = list(which_lists)
+    levels = []
+    for key in keys:
+        # Row positions of the effects of each value, None for all-values
+        values = [v for v in which_lists[key] if not _is_all_value(key, v)]
+        codes = pd.Categorical(data[key], categories=values).codes
+        levels.append([
+            (value, None if _is_all_value(key, value)
+             else np.flatnonzero(codes == values.index(value)))
+            for value in which_lists[key]
+        ])
+
+    combinations = []
+    subsets = []
+
+    def walk(depth, combination, effects):
+        if len(effects) < k_min:
+            return
+        if depth == len(keys):
+            combinations.append(combination)
+            subsets.append(effects)
+            return
+        for value, positions in levels[depth]:
+            if positions is not None:
+                narrowed = np.intersect1d(effects, positions,
+                                          assume_unique=True)
+            else:
+                narrowed = effects
+            walk(depth + 1, combination + (value,), narrowed)
+
+    walk(0, (), np.arange(len(data)))
+    return pd.DataFrame(combinations, columns=keys), subsets
+
+
+def get_unique_subsets(subsets):
+    """Get the first combination of each distinct effect subset.
+
+    Subsets are compared by a hash of their row positions, so no copy of
+    them is held.
+
+    Arguments:
+        subsets -- The effect subsets, see get_effect_subsets().
+
+    Returns:
+        The positions of the first subset of each distinct set of effects,
+        in order.
+    """
+    first = {}
+    for i, subset in enumerate(subsets):
+        key = hashlib.blake2b(subset.tobytes(), digest_size=16).digest()
+        first.setdefault(key, i)
+    return np.fromiter(first.values(), dtype=np.int64, count=len(first))
+
+
+def get_subset_key(arrays, subset, level):
+    """Get the content key of an effect subset.
+
+    The key is a hash of the effect IDs of the subset in sorted order, with
+    their effect sizes, variances and (for three-level models) the
+    partition into clusters. It does not depend on the row positions, so
+    fits stay valid if rows are added, removed or reordered, and change if
+    any effect of the subset changes.
+
+    Arguments:
+        arrays -- Dictionary with the effect IDs ("e_ids"), effect sizes
+                  ("y"), variances ("v") and cluster IDs ("c_ids") of all
+                  effects, see get_arrays().
+        subset -- The row positions of the effects.
+        level -- The level of the meta-analysis (2 or 3).
+
+    Returns:
+        The key as bytes.
+    """
+    e_ids = arrays["e_ids"][subset]
+    order = np.argsort(e_ids, kind="stable")
+    subset = subset[order]
+    key = hashlib.blake2b(digest_size=16)
+    key.update(bytes([level]))
+    key.update(e_ids[order].tobytes())
+    key.update(arrays["y"][subset].tobytes())
+    key.update(arrays["v"][subset].tobytes())
+    if level == 3:
+        key.update(pd.factorize(arrays["c_ids"][subset])[0].tobytes())
+    return key.digest()
+
+
+def get_blocks(segments, c_ids):
+    """Get the clusters within each specification as blocks of effects.
+
+    Arguments:
+        segments -- The specification index of each effect size.
+        c_ids -- The cluster ID of each effect size.
+
+    Returns:
+        A tuple of the block index of each effect size, the specification
+        index of each block, and a mask of the first effect of each block.
+    """
+    first_of_cluster = np.ones(len(segments), dtype=bool)
+    order = np.lexsort((c_ids, segments))
+    first_of_cluster[order[1:]] = (
+        (segments[order][1:] != segments[order][:-1])
+        | (c_ids[order][1:] != c_ids[order][:-1])
+    )
+    blocks = np.empty(len(segments), dtype=np.int64)
+    blocks[order] = np.cumsum(first_of_cluster[order]) - 1
+    block_segments = segments[first_of_cluster][
+        np.argsort(blocks[first_of_cluster])]
+    return blocks, block_segments, first_of_cluster
+
+
+def _init_worker(y, v, c_ids):
+    """Set the data of a worker process, see fit_subsets()."""
+    _worker_data.update(y=y, v=v, c_ids=c_ids)
+
+
+def fit_subsets(subsets, level, methods, data=None):
+    """Fit the random-effects models of a chunk of effect subsets.
+
+    The sufficient statistics of each subset are computed once, and shared
+    by the fits of all methods.
+
+    Arguments:
+        subsets -- The effect subsets as arrays of row positions.
+        level -- The level of the meta-analysis (2 or 3).
+        methods -- The estimation methods.
+
+    Keyword Arguments:
+        data -- Dictionary with the effect sizes ("y"), variances ("v") and
+                cluster IDs ("c_ids") of all effects (default: {None}, the
+                data of the worker process).
+
+    Returns:
+        A tuple of the sufficient statistics of the subsets, see
+        get_subset_stats(), and a dictionary with the fit of each method,
+        with the columns of FIT_COLUMNS as arrays of the subsets.
+    """
+    if data is None:
+        data = _worker_data
+    n_subsets = len(subsets)
+    effects = np.concatenate(subsets)
+    segments = np.repeat(np.arange(n_subsets),
+                         [len(subset) for subset in subsets])
+    y = data["y"][effects]
+    v = data["v"][effects]
+
+    stats = get_subset_stats(y, v, segments, n_subsets)
+    fits = {}
+    if level == 3:
+        blocks, block_segments, _ = get_blocks(
+            segments, data["c_ids"][effects])
+    for method in methods:
+        if level == 3:
+            fit = fit_three_level(y, v, blocks, block_segments, segments,
+                                  n_subsets, method, stats=stats)
+        else:
+            fit = fit_random_effects(y, v, segments, n_subsets, method,
+                                     stats=stats)
+        fits[method] = {col: fit[col] for col in FIT_COLUMNS[level]}
+    return stats, fits
+
+
+def _get_chunks(subsets, chunk_effects):
+    """Split effect subsets into chunks of about chunk_effects effects."""
+    sizes = np.cumsum([len(subset) for subset in subsets])
+    bounds = np.searchsorted(
+        sizes, np.arange(chunk_effects, sizes[-1], chunk_effects),
+        side="right")
+    bounds = np.unique(np.concatenate([[0], bounds, [len(subsets)]]))
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+
+
+def print_progress(done, total, start, action="Fitted", unit="subsets"):
+    """Print the number of finished work items and the remaining time."""
+    elapsed = time.perf_counter() - start
+    eta = elapsed * (total - done) / done
+    print(f"{action} {done}/{total} {unit} ({done * 100 / total:.0f}%), "
+          f"{elapsed:.1f}s elapsed, ETA {eta:.1f}s")
+
+
+def fit_all_subsets(data, colmap, subsets, level, methods, n_workers=None,
+                    chunk_effects=CHUNK_EFFECTS, progress=True):
+    """Fit the random-effects models of all effect subsets.
+
+    The subsets are split into chunks, which are fitted in parallel by a
+    pool of worker processes. Results are stored by chunk position, so
+    they do not depend on the order in which chunks finish.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        colmap -- The column-map from the configuration.
+        subsets -- The effect subsets, see get_effect_subsets().
+        level -- The level of the meta-analysis (2 or 3).
+        methods -- The estimation methods.
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes (default: {None}, the
+                     number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        A tuple of the sufficient statistics and the fits of all subsets,
+        see fit_subsets().
+    """
+    arrays = get_arrays(data, colmap)
+    stats = {col: np.empty(len(subsets)) for col in STAT_COLUMNS}
+    fits = {
+        method: {col: np.empty(len(subsets)) for col in FIT_COLUMNS[level]}
+        for method in methods
+    }
+    chunks = _get_chunks(subsets, chunk_effects)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, len(chunks))
+
+    def store(chunk, result):
+        first, last = chunk
+        chunk_stats, chunk_fits = result
+        for col in STAT_COLUMNS:
+            stats[col][first:last] = chunk_stats[col]
+        for method, fit in chunk_fits.items():
+            for col in FIT_COLUMNS[level]:
+                fits[method][col][first:last] = fit[col]
+
+    start = time.perf_counter()
+    done = 0
+    if n_workers <= 1:
+        for chunk in chunks:
+            first, last = chunk
+            store(chunk, fit_subsets(subsets[first:last], level, methods,
+                                     arrays))
+            done += last - first
+            if progress and len(chunks) > 1:
+                print_progress(done, len(subsets), start)
+        return stats, fits
+
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             initializer=_init_worker,
+                             initargs=(arrays["y"], arrays["v"],
+                                       arrays["c_ids"])) as executor:
+        futures = {
+            executor.submit(fit_subsets, subsets[first:last], level,
+                            methods): (first, last)
+            for first, last in chunks
+        }
+        for future in as_completed(futures):
+            first, last = futures[future]
+            store((first, last), future.result())
+            done += last - first
+            if progress:
+                print_progress(done, len(subsets), start)
+    return stats, fits
+
+
+def get_arrays(data, colmap):
+    """Get the columns of the data needed to fit models as arrays."""
+    return {
+        "e_ids": data[colmap["key_e_id"]].to_numpy(dtype=np.int64),
+        "y": data[colmap["key_logOR"]].to_numpy(dtype=float),
+        "v": data[colmap["key_logOR_var"]].to_numpy(dtype=float),
+        "c_ids": data[colmap["key_c_id"]].to_numpy()
+    }
+
+
+def _get_memo_bytes(key, entry):
+    """Estimate the memory of a memo entry in bytes."""
+    return (_MEMO_SLOT_BYTES + sys.getsizeof(key) + sys.getsizeof(entry)
+            + sum(sys.getsizeof(fit) + sum(map(sys.getsizeof, fit))
+                  for fit in entry.values()))
+
+
+def fit_memoized(data, colmap, subsets, level, methods, n_workers=None,
+                 chunk_effects=CHUNK_EFFECTS, progress=True):
+    """Fit the random-effects models of effect subsets, reusing earlier fits.
+
+    Subsets are looked up in a memo by their content key, see
+    get_subset_key(). Only subsets that are missing a method are fitted,
+    see fit_all_subsets(), and their fits are added to the memo. The least
+    recently used entries are evicted once the memo exceeds MEMO_BYTES.
+    Subsets selected by several combinations should be removed before, see
+    get_unique_subsets(); they are counted as combinations in the memo
+    counters.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        colmap -- The column-map from the configuration.
+        subsets -- The distinct effect subsets.
+        level -- The level of the meta-analysis (2 or 3).
+        methods -- The estimation methods.
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes (default: {None}, the
+                     number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The fits of all subsets, see fit_subsets().
+    """
+    arrays = get_arrays(data, colmap)
+    keys = [get_subset_key(arrays, subset, level) for subset in subsets]
+    missing = [
+        i for i, key in enumerate(keys)
+        if key not in _memo or any(m not in _memo[key][0] for m in methods)
+    ]
+    new_fits = {}
+    if missing:
+        start = time.perf_counter()
+        _, fits = fit_all_subsets(
+            data, colmap, [subsets[i] for i in missing], level, methods,
+            n_workers, chunk_effects, progress)
+        _memo_stats["fit_seconds"] += time.perf_counter() - start
+        _memo_stats["fitted"] += len(missing)
+        for j, i in enumerate(missing):
+            entry = new_fits.setdefault(keys[i], {})
+            for method, fit in fits.items():
+                entry[method] = tuple(fit[col][j]
+                                      for col in FIT_COLUMNS[level])
+    _memo_stats["subsets"] += len(subsets)
+    _memo_stats["hits"] += len(subsets) - len(missing)
+
+    # Gathered before updating the memo, as the entries of this call may
+    # not all fit into it
+    entries = [new_fits[key] if key in new_fits else _memo[key][0]
+               for key in keys]
+    result = {}
+    for method in methods:
+        values = np.array([entry[method] for entry in entries])
+        result[method] = dict(zip(FIT_COLUMNS[level],
+                                  values.reshape(len(keys), -1).T))
+
+    for key in keys:
+        if key in _memo and key not in new_fits:
+            _memo.move_to_end(key)
+    for key, entry in new_fits.items():
+        if key in _memo:
+            old_entry, size = _memo.pop(key)
+            _memo_stats["bytes"] -= size
+            entry = dict(old_entry, **entry)
+        size = _get_memo_bytes(key, entry)
+        _memo[key] = (entry, size)
+        _memo_stats["bytes"] += size
+    while _memo_stats["bytes"] > MEMO_BYTES and _memo:
+        _, (_, size) = _memo.popitem(last=False)
+        _memo_stats["bytes"] -= size
+        _memo_stats["evictions"] += 1
+    return result
+
+
+def get_memo_stats():
+    """Get the memo counters.
+
+    The time saved is estimated from the mean time of fitting a subset,
+    for every combination that was not fitted.
+
+    Returns:
+        Dictionary with the numbers of combinations, distinct subsets,
+        memo hits, fitted subsets and evicted entries, the deduplication
+        ratio, the fitting time and the estimated time saved in seconds,
+        and the number of memo entries and their estimated size in bytes.
+    """
+    stats = dict(_memo_stats, entries=len(_memo))
+    stats["dedup_ratio"] = (stats["combinations"] / stats["subsets"]
+                            if stats["subsets"] else 1.0)
+    return stats
+
+
+def clear_memo():
+    """Remove all entries of the memo and reset its counters."""
+    _memo.clear()
+    for key in _memo_stats:
+        _memo_stats[key] = type(_memo_stats[key])(0)
+
+
+def _print_memo_report(n_combinations, n_subsets, n_fitted, seconds):
+    """Print the deduplication and reuse of one run of build_specs()."""
+    stats = get_memo_stats()
+    saved = 0.0
+    if stats["fitted"]:
+        saved = ((n_combinations - n_fitted) * stats["fit_seconds"]
+                 / stats["fitted"])
+    _memo_stats["saved_seconds"] += saved
+    print(f"{n_combinations} combinations, {n_subsets} distinct subsets "
+          f"(dedup ratio {n_combinations / n_subsets:.2f}), "
+          f"{n_subsets - n_fitted} memoized, {n_fitted} fitted in "
+          f"{seconds:.2f}s, ~{saved:.2f}s saved")
+
+
+def _segment_sum(values, segments, n_segments):
+    """Sum values per segment."""
+    return np.bincount(segments, weights=values, minlength=n_segments)
+
+
+def _shrink(active, specs, segments, *arrays):
+    """Keep the active specifications of a working set and their effects.
+
+    Arguments:
+        active -- Mask of the specifications to keep, within the set.
+        specs -- The specification indices of the set.
+        segments -- The position within the set of each effect.
+        arrays -- Further arrays of the effects.
+
+    Returns:
+        A tuple of the kept specification indices, the new positions of
+        their effects and the kept elements of the arrays.
+    """
+    keep = active[segments]
+    positions = np.cumsum(active) - 1
+    return (specs[active], positions[segments[keep]],
+            *[array[keep] for array in arrays])
+
+
+def get_subset_stats(y, v, segments, n_specs):
+    """Get the fixed-effect sufficient statistics of many subsets at once.
+
+    Arguments:
+        y -- The effect sizes, concatenated over all subsets.
+        v -- The sampling variances of the effect sizes.
+        segments -- The subset index of each effect size.
+        n_specs -- The number of subsets.
+
+    Returns:
+        A dictionary with the number of effects ("k"), and the sums of the
+        weights w = 1/v ("sw"), w * y ("swy"), w * y^2 ("swy2"), w^2
+        ("sw2") and w^3 ("sw3") of each subset.
+    """
+    w = 1 / v
+    return {
+        "k": np.bincount(segments, minlength=n_specs).astype(float),
+        "sw": _segment_sum(w, segments, n_specs),
+        "swy": _segment_sum(w * y, segments, n_specs),
+        "swy2": _segment_sum(w * y ** 2, segments, n_specs),
+        "sw2": _segment_sum(w ** 2, segments, n_specs),
+        "sw3": _segment_sum(w ** 3, segments, n_specs)
+    }
+
+
+def get_dl_tau2(stats):
+    """Get DerSimonian-Laird estimates of tau^2 from sufficient statistics.
+
+    Arguments:
+        stats -- The sufficient statistics, see get_subset_stats().
+
+    Returns:
+        The estimates, truncated at zero.
+    """
+    sw = stats["sw"]
+    q = stats["swy2"] - stats["swy"] ** 2 / sw
+    c = sw - stats["sw2"] / sw
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(c > 0, np.maximum(0, (q - (stats["k"] - 1)) / c), 0)
+
+
+def fit_random_effects(y, v, segments, n_specs, method="REML", tol=1e-10,
+                       max_iter=100, stats=None):
+    """Fit two-level random-effects models for many specifications at once.
+
+    The effects of all specifications are concatenated, and the
+    between-effect variance tau^2 of every specification is estimated
+    simultaneously by Fisher scoring, using sums per segment. Estimates
+    are truncated at zero, starting from the DerSimonian-Laird estimate.
+    Specifications are no longer summed once they have converged.
+
+    Arguments:
+        y -- The effect sizes, concatenated over all specifications.
+        v -- The sampling variances of the effect sizes.
+        segments -- The specification index of each effect size.
+        n_specs -- The number of specifications.
+
+    Keyword Arguments:
+        method -- "REML" or "ML" (default: {"REML"}).
+        tol -- The convergence tolerance of tau^2 (default: {1e-10}).
+        max_iter -- The maximum number of iterations (default: {100}).
+        stats -- The sufficient statistics of the specifications, see
+                 get_subset_stats() (default: {None}, computed).
+
+    Returns:
+        A dictionary with the summary effect ("mean"), its standard error
+        ("se"), the variance component ("tau2") and the number of
+        iterations ("iterations") of each specification.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown estimation method {method}")
+    if stats is None:
+        stats = get_subset_stats(y, v, segments, n_specs)
+    tau2 = get_dl_tau2(stats)
+
+    # Specifications that have not converged yet and their effects, which
+    # shrink as specifications converge
+    work = np.arange(n_specs)
+    work_y, work_v, work_segments = y, v, segments
+    scale = np.ones(n_specs)
+    last_score = np.zeros(n_specs)
+    iterations = 0
+    while iterations < max_iter and len(work):
+        iterations += 1
+        n_work = len(work)
+        work_tau2 = tau2[work]
+        w = 1 / (work_v + work_tau2[work_segments])
+        sw = _segment_sum(w, work_segments, n_work)
+        sw2 = _segment_sum(w ** 2, work_segments, n_work)
+        mean = _segment_sum(w * work_y, work_segments, n_work) / sw
+        r2 = _segment_sum((w * (work_y - mean[work_segments])) ** 2,
+                          work_segments, n_work)
+        if method == "ML":
+            score = 0.5 * (r2 - sw)
+            info = 0.5 * sw2
+        else:
+            sw3 = _segment_sum(w ** 3, work_segments, n_work)
+            score = 0.5 * (r2 - (sw - sw2 / sw))
+            info = 0.5 * (sw2 - 2 * sw3 / sw + (sw2 / sw) ** 2)
+        # Halve the steps of a specification whenever its score changes
+        # sign, so steps that overshoot the maximum (e.g. back and forth
+        # across zero) cannot oscillate
+        scale[work] = np.where(score * last_score[work] < 0,
+                               scale[work] / 2, scale[work])
+        last_score[work] = score
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(info > 0, scale[work] * score / info, 0)
+        new_tau2 = np.maximum(0, work_tau2 + step)
+        tau2[work] = new_tau2
+        active = np.abs(new_tau2 - work_tau2) > tol
+        if not active.all():
+            work, work_segments, work_y, work_v = _shrink(
+                active, work, work_segments, work_y, work_v)
+
+    w = 1 / (v + tau2[segments])
+    sw = _segment_sum(w, segments, n_specs)
+    return {
+        "mean": _segment_sum(w * y, segments, n_specs) / sw,
+        "se": np.sqrt(1 / sw),
+        "tau2": tau2,
+        "iterations": iterations
+    }
+
+
+def fit_three_level(y, v, blocks, block_segments, segments, n_specs,
+                    method="REML", tol=1e-10, max_iter=100, stats=None):
+    """Fit three-level random-effects models for many specifications at once.
+
+    Effects are nested in clusters, with a between-cluster variance
+    sigma_b^2 and a within-cluster variance sigma_w^2. The covariance
+    matrix of a specification is block-diagonal with one block
+    D + sigma_b^2 J per cluster, where D is the diagonal of v + sigma_w^2.
+    Each block is inverted with the Sherman-Morrison formula, so the score
+    and Fisher information of both components only need sums per block,
+    and the cost grows with the number of effects, not with its square.
+    Specifications are no longer summed once they have converged.
+
+    If a specification has a single cluster, or a single effect per
+    cluster, the components cannot be told apart and sigma_b^2 is fixed to
+    zero, which gives the two-level model.
+
+    Arguments:
+        y -- The effect sizes, concatenated over all specifications.
+        v -- The sampling variances of the effect sizes.
+        blocks -- The block (cluster within specification) of each effect
+                  size.
+        block_segments -- The specification index of each block.
+        segments -- The specification index of each effect size.
+        n_specs -- The number of specifications.
+
+    Keyword Arguments:
+        method -- "REML" or "ML" (default: {"REML"}).
+        tol -- The convergence tolerance of the variance components
+               (default: {1e-10}).
+        max_iter -- The maximum number of iterations (default: {100}).
+        stats -- The sufficient statistics of the specifications, see
+                 get_subset_stats() (default: {None}, computed).
+
+    Returns:
+        A dictionary with the summary effect ("mean"), its standard error
+        ("se"), the variance components ("sigma2_b", "sigma2_w") and the
+        number of iterations ("iterations") of each specification.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown estimation method {method}")
+    k = np.bincount(segments, minlength=n_specs)
+    kc = np.bincount(block_segments, minlength=n_specs)
+    estimate_b = (kc > 1) & (kc < k)
+
+    # Start from the two-level fit, split evenly between both components
+    tau2 = fit_random_effects(y, v, segments, n_specs, method, tol,
+                              max_iter, stats)["tau2"]
+    sigma2_b = np.where(estimate_b, tau2 / 2, 0)
+    sigma2_w = tau2 - sigma2_b
+
+    # Specifications that have not converged yet with their effects and
+    # blocks, which shrink as specifications converge
+    work = np.arange(n_specs)
+    work_y, work_v, work_segments = y, v, segments
+    work_blocks, work_block_segments = blocks, block_segments
+
+    def block_sum(values):
+        return np.bincount(work_blocks, weights=values,
+                           minlength=len(work_block_segments))
+
+    def spec_sum(values):
+        return np.bincount(work_block_segments, weights=values,
+                           minlength=len(work))
+
+    def moments(sigma2_b, sigma2_w):
+        # Sherman-Morrison terms of each block, V^-1 = D^-1 - g d d^T
+        d = 1 / (work_v + sigma2_w[work_segments])
+        a = block_sum(d)
+        e = block_sum(d ** 2)
+        sb = sigma2_b[work_block_segments]
+        s = 1 / (1 + sb * a)
+        g = sb * s
+        # Generalized least squares estimate of the summary effect
+        total = spec_sum(s * a)
+        mean = spec_sum(s * block_sum(d * work_y)) / total
+        return d, a, e, s, g, total, mean
+
+    iterations = 0
+    while iterations < max_iter and len(work):
+        iterations += 1
+        work_b = sigma2_b[work]
+        work_w = sigma2_w[work]
+        d, a, e, s, g, total, mean = moments(work_b, work_w)
+        f = block_sum(d ** 3)
+
+        # q = V^-1 (y - mean)
+        r = work_y - mean[work_segments]
+        beta = block_sum(d * r)
+        q = d * (r - g[work_blocks] * beta[work_blocks])
+        q_w = spec_sum(block_sum(q ** 2))
+        q_b = spec_sum(block_sum(q) ** 2)
+
+        # Traces of V^-1 A and V^-1 A V^-1 A, for A = I (w) and A = J (b)
+        sa = s * a
+        tr_w = spec_sum(a - g * e)
+        tr_b = total
+        tr_ww = spec_sum(e - 2 * g * f + (g * e) ** 2)
+        tr_bb = spec_sum(sa ** 2)
+        tr_wb = spec_sum(s ** 2 * e)
+        if method == "REML":
+            # Project out the summary effect, P = V^-1 - h h^T / total
+            # with h = V^-1 1
+            h_w = spec_sum(s ** 2 * e)
+            h_b = spec_sum(sa ** 2)
+            h_ww = spec_sum(s ** 2 * (f - g * e ** 2))
+            h_bb = spec_sum(sa ** 3)
+            h_wb = spec_sum(sa * s ** 2 * e)
+            tr_ww = tr_ww - 2 * h_ww / total + (h_w / total) ** 2
+            tr_bb = tr_bb - 2 * h_bb / total + (h_b / total) ** 2
+            tr_wb = tr_wb - 2 * h_wb / total + h_w * h_b / total ** 2
+            tr_w = tr_w - h_w / total
+            tr_b = tr_b - h_b / total
+
+        score_w = 0.5 * (q_w - tr_w)
+        score_b = 0.5 * (q_b - tr_b)
+        info_ww = 0.5 * tr_ww
+        info_bb = 0.5 * tr_bb
+        info_wb = 0.5 * tr_wb
+
+        # Solve the 2x2 scoring equations. A component at zero whose score
+        # points below zero stays fixed, and the other one is solved alone,
+        # as is sigma_w^2 if sigma_b^2 is not estimated.
+        free_w = (work_w > 0) | (score_w > 0)
+        free_b = estimate_b[work] & ((work_b > 0) | (score_b > 0))
+        det = info_ww * info_bb - info_wb ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step_w = np.where(
+                free_b,
+                (info_bb * score_w - info_wb * score_b) / det,
+                score_w / info_ww
+            )
+            step_b = np.where(
+                free_w,
+                (info_ww * score_b - info_wb * score_w) / det,
+                score_b / info_bb
+            )
+        step_w = np.where(free_w, step_w, 0)
+        step_b = np.where(free_b, step_b, 0)
+        valid = np.isfinite(step_w) & np.isfinite(step_b)
+        new_w = np.maximum(0, work_w + np.where(valid, step_w, 0))
+        new_b = np.maximum(0, work_b + np.where(valid, step_b, 0))
+        sigma2_w[work] = new_w
+        sigma2_b[work] = new_b
+        active = valid & ((np.abs(new_w - work_w) > tol)
+                          | (np.abs(new_b - work_b) > tol))
+        if not active.all():
+            keep_blocks = active[work_block_segments]
+            work_block_segments = (np.cumsum(active) - 1)[
+                work_block_segments[keep_blocks]]
+            work, work_segments, work_y, work_v, work_blocks = _shrink(
+                active, work, work_segments, work_y, work_v, work_blocks)
+            work_blocks = (np.cumsum(keep_blocks) - 1)[work_blocks]
+
+    work = np.arange(n_specs)
+    work_y, work_v, work_segments = y, v, segments
+    work_blocks, work_block_segments = blocks, block_segments
+    *_, total, mean = moments(sigma2_b, sigma2_w)
+    return {
+        "mean": mean,
+        "se": np.sqrt(1 / total),
+        "sigma2_b": sigma2_b,
+        "sigma2_w": sigma2_w,
+        "iterations": iterations
+    }
+
+
+def get_summary(mean, se):
+    """Get the confidence intervals and p-values of z-tests.
+
+    Arguments:
+        mean -- The summary effects.
+        se -- Their standard errors.
+
+    Returns:
+        A dictionary with lower and upper bounds of 95% confidence
+        intervals ("lb", "ub") and two-sided p-values ("p").
+    """
+    return {
+        "lb": mean - Z_CRIT * se,
+        "ub": mean + Z_CRIT * se,
+        "p": _erfc(np.abs(mean / se) / math.sqrt(2))
+    }
+
+
+def _join_ids(ids, segments, n_specs):
+    """Join the sorted IDs of each specification with commas."""
+    order = np.lexsort((ids, segments))
+    strings = ids[order].astype(str)
+    bounds = np.searchsorted(segments[order], np.arange(n_specs + 1))
+    return [
+        (",").join(strings[bounds[i]:bounds[i + 1]]) for i in range(n_specs)
+    ]
+
+
+def get_combinations(data, config):
+    """Get the which-factor combinations of all specifications.
+
+    If several which-factor combinations select the same effects, only the
+    first one is kept.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+
+    Returns:
+        A tuple of the which-factor values of the kept combinations, their
+        effect subsets and the number of combinations before removing
+        duplicates, or None if the configuration is not supported or no
+        subset has enough effects.
+    """
+    for key, values in config["how_lists"].items():
+        if key == METHOD_KEY and not set(values) <= set(METHODS):
+            print(f"ERROR: Unsupported estimation methods {values}.")
+            return None
+    level = config["level"]
+    if level not in (2, 3):
+        print(f"ERROR: Unsupported level {level}.")
+        return None
+
+    combinations, subsets = get_effect_subsets(
+        data, config["which_lists"], config["k_min"])
+    n_combinations = len(combinations)
+    if n_combinations == 0:
+        print(f"ERROR: No subset has at least {config['k_min']} effects.")
+        return None
+
+    unique = get_unique_subsets(subsets)
+    combinations = combinations.iloc[unique].reset_index(drop=True)
+    subsets = [subsets[i] for i in unique]
+    _memo_stats["combinations"] += n_combinations
+    return combinations, subsets, n_combinations
+
+
+def _get_spec_methods(how_lists):
+    """Get the how-factor combinations and their estimation methods."""
+    how_values = list(itertools.product(*how_lists.values()))
+    spec_methods = [dict(zip(how_lists, values)).get(METHOD_KEY, "REML")
+                    for values in how_values]
+    return how_values, spec_methods
+
+
+def _fit_spec_columns(data, config, subsets, n_combinations, n_workers,
+                      chunk_effects, progress):
+    """Fit effect subsets for all how-factor combinations, see fit_specs().
+
+    Returns:
+        The summary effects, bounds and p-values ("mean", "lb", "ub", "p")
+        as arrays of shape (subsets, how-factor combinations).
+    """
+    _, spec_methods = _get_spec_methods(config["how_lists"])
+    methods = config["how_lists"].get(METHOD_KEY, ["REML"])
+    fitted = _memo_stats["fitted"]
+    start = time.perf_counter()
+    fits = fit_memoized(data, config["colmap"], subsets, config["level"],
+                        methods, n_workers, chunk_effects, progress)
+    if progress:
+        _print_memo_report(n_combinations, len(subsets),
+                           _memo_stats["fitted"] - fitted,
+                           time.perf_counter() - start)
+    for method, fit in fits.items():
+        fit.update(get_summary(fit["mean"], fit["se"]))
+    return {
+        col: np.stack([fits[method][col] for method in spec_methods], axis=1)
+        for col in ["mean", "lb", "ub", "p"]
+    }
+
+
+def _rank_specs(combinations, subsets, how_lists, spec_fits):
+    """Rank fitted specifications by their summary effects, see fit_specs().
+
+    The specifications are taken in the order of the cartesian product of
+    all factors, i.e. with the how-factors varying fastest, and ties keep
+    this order.
+    """
+    how_values, _ = _get_spec_methods(how_lists)
+    return {
+        "combinations": combinations,
+        "subsets": subsets,
+        "how_values": how_values,
+        "fits": spec_fits,
+        "order": np.argsort(spec_fits["mean"].ravel(), kind="stable")
+    }
+
+
+def fit_specs(data, config, n_workers=None, chunk_effects=CHUNK_EFFECTS,
+              progress=True):
+    """Fit the models of all specifications of a multiverse analysis.
+
+    Every combination of which- and how-factor values is a specification.
+    If several which-factor combinations select the same effects, only the
+    first one is kept. Depending on the level of the configuration, two- or
+    three-level random-effects models are fitted, with effects nested in
+    the clusters of key_c_id. The estimation method is given by the
+    ma_method how-factor (REML if there is none); other how-factors only
+    label the specifications. Fits are memoized by effect subset, so
+    repeated runs in the same process only fit subsets whose effects
+    changed, see fit_memoized().
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes, see fit_all_subsets()
+                     (default: {None}, the number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        A dictionary with the which-factor values ("combinations") and
+        effect subsets ("subsets") of the kept combinations, the how-factor
+        values of each column of the fits ("how_values"), the fits as
+        arrays of shape (subsets, how-factor combinations) ("fits"), and
+        the specifications in rank order as flat indices into these arrays
+        ("order"), or None if the configuration is not supported or no
+        subset has enough effects.
+    """
+    found = get_combinations(data, config)
+    if found is None:
+        return None
+    combinations, subsets, n_combinations = found
+    spec_fits = _fit_spec_columns(data, config, subsets, n_combinations,
+                                  n_workers, chunk_effects, progress)
+    return _rank_specs(combinations, subsets, config["how_lists"], spec_fits)
+
+
+def _get_sets(data, colmap, subsets):
+    """Get the clusters and effects of effect subsets, counted and joined."""
+    n_subsets = len(subsets)
+    effects = np.concatenate(subsets)
+    segments = np.repeat(np.arange(n_subsets),
+                         [len(subset) for subset in subsets])
+    e_ids = data[colmap["key_e_id"]].to_numpy()[effects]
+    c_ids = data[colmap["key_c_id"]].to_numpy()[effects]
+    _, _, first_of_cluster = get_blocks(segments, c_ids)
+    sets = pd.DataFrame({
+        "k": np.bincount(segments, minlength=n_subsets),
+        "kc": np.bincount(segments[first_of_cluster], minlength=n_subsets),
+        "set": _join_ids(c_ids[first_of_cluster],
+                         segments[first_of_cluster], n_subsets),
+        "set_es": _join_ids(e_ids, segments, n_subsets),
+    })
+    sets["full_set"] = (sets["k"] == len(data)).astype(int)
+    return sets
+
+
+def iter_specs(data, config, fitted, chunk_specs=CHUNK_SPECS):
+    """Get the specifications of a multiverse analysis in chunks.
+
+    The rows of each chunk, including the joined clusters and effects of
+    their subsets, are only built when the chunk is requested, so the
+    specifications never need to be held in memory at once.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+        fitted -- The fitted specifications, see fit_specs().
+
+    Keyword Arguments:
+        chunk_specs -- The number of specifications per chunk
+                       (default: {CHUNK_SPECS}).
+
+    Yields:
+        The specification data of consecutive ranks with the columns of a
+        specs file.
+    """
+    how_lists = config["how_lists"]
+    how_values = np.array(fitted["how_values"], dtype=object).reshape(
+        len(fitted["how_values"]), len(how_lists))
+    n_how = len(how_values)
+    order = fitted["order"]
+    for first in range(0, len(order), chunk_specs):
+        chunk = order[first:first + chunk_specs]
+        subset_index, how_index = np.divmod(chunk, n_how)
+        unique, inverse = np.unique(subset_index, return_inverse=True)
+        sets = _get_sets(data, config["colmap"],
+                         [fitted["subsets"][i] for i in unique])
+        specs = fitted["combinations"].iloc[subset_index].reset_index(
+            drop=True)
+        for i, key in enumerate(how_lists):
+            specs[key] = how_values[how_index, i]
+        for col, values in fitted["fits"].items():
+            specs[col] = values[subset_index, how_index]
+        specs = pd.concat(
+            [specs, sets.iloc[inverse].reset_index(drop=True)], axis=1)
+        specs["rank"] = np.arange(first + 1, first + len(chunk) + 1)
+        specs["ci"] = specs["ub"] - specs["lb"]
+        yield specs
+
+
+def build_specs(data, config, n_workers=None, chunk_effects=CHUNK_EFFECTS,
+                progress=True):
+    """Compute the specifications of a multiverse analysis.
+
+    See fit_specs() for the specifications and their models.
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes, see fit_all_subsets()
+                     (default: {None}, the number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The specification data with the columns of a specs file, ordered by
+        rank, or None if the configuration is not supported or no subset
+        has enough effects.
+    """
+    fitted = fit_specs(data, config, n_workers, chunk_effects, progress)
+    if fitted is None:
+        return None
+    return pd.concat(list(iter_specs(data, config, fitted)),
+                     ignore_index=True)
+
+
+def _get_effect_keys(values):
+    """Get keys of effects that identify them by their values.
+
+    Effects with the same values are told apart by their occurrence.
+
+    Arguments:
+        values -- The compared values of the effects, one row per effect.
+
+    Returns:
+        The keys as a pandas MultiIndex.
+    """
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    occurrences = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+    return pd.MultiIndex.from_arrays([hashes, occurrences])
+
+
+def get_changed_effects(old_data, data, config):
+    """Get the effects that differ between two versions of the data.
+
+    Effects are matched by key_e_id. An effect has changed if it was added
+    or removed, or if its effect size, variance, cluster name or value of
+    a which-factor differs. If key_e_id was created from the row positions
+    (see data.prepare_data()), adding or removing a row changes the IDs of
+    the following effects, so effects are matched by these values instead.
+
+    Arguments:
+        old_data -- The previous meta-analytic data, see
+                    data.prepare_data().
+        data -- The current meta-analytic data.
+        config -- The configuration, see config.read_config().
+
+    Returns:
+        A tuple of the sorted IDs of the changed effects in the previous
+        and in the current data.
+    """
+    colmap = config["colmap"]
+    key_e_id = colmap["key_e_id"]
+    columns = [colmap["key_c"], colmap["key_logOR"], colmap["key_logOR_var"],
+               *config["which_lists"]]
+    if any(key_e_id in d.attrs.get("generated", []) for d in [old_data, data]):
+        old_keys = _get_effect_keys(old_data[columns])
+        new_keys = _get_effect_keys(data[columns])
+        return (
+            np.sort(old_data[key_e_id].to_numpy()[~old_keys.isin(new_keys)]),
+            np.sort(data[key_e_id].to_numpy()[~new_keys.isin(old_keys)])
+        )
+
+    old = old_data.set_index(key_e_id)[columns]
+    new = data.set_index(key_e_id)[columns]
+    common = old.index.intersection(new.index)
+    old_common = old.loc[common]
+    new_common = new.loc[common]
+    same = (old_common == new_common) | (old_common.isna()
+                                         & new_common.isna())
+    changed = common[~same.all(axis=1)].to_numpy()
+    return (
+        np.sort(np.concatenate([old.index.difference(new.index).to_numpy(),
+                                changed])),
+        np.sort(np.concatenate([new.index.difference(old.index).to_numpy(),
+                                changed]))
+    )
+
+
+def update_specs(old_data, old_specs, data, config, n_workers=None,
+                 chunk_effects=CHUNK_EFFECTS, progress=True):
+    """Update the specifications of a multiverse analysis to changed data.
+
+    Only specifications affected by changed effects (see
+    get_changed_effects()) are refitted: those whose effect subset
+    contains a changed effect in the current data, those whose set_es
+    contained one in the previous specifications, and combinations that
+    had no specification before. All others keep their previous fits.
+    The specifications are then ranked again.
+
+    Arguments:
+        old_data -- The previous meta-analytic data, see
+                    data.prepare_data().
+        old_specs -- The previous specification data, see build_specs().
+        data -- The current meta-analytic data.
+        config -- The configuration, see config.read_config().
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes, see fit_all_subsets()
+                     (default: {None}, the number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        A tuple of the specification data with the columns of a specs file,
+        ordered by rank, and the previous rank of each specification (0 if
+        it was refitted), or None if the configuration is not supported or
+        no subset has enough effects.
+    """
+    key_e_id = config["colmap"]["key_e_id"]
+    factor_keys = [*config["which_lists"], *config["how_lists"]]
+    found = get_combinations(data, config)
+    if found is None:
+        return None
+    combinations, subsets, _ = found
+    how_values, _ = _get_spec_methods(config["how_lists"])
+    old_changed, changed = get_changed_effects(old_data, data, config)
+
+    # Previous specifications whose effects include a changed effect
+    old_e_ids = np.sort(old_data[key_e_id].to_numpy())
+    rows, cols = get_set_incidence(old_specs["set_es"], old_e_ids)
+    old_affected = np.zeros(len(old_specs), dtype=bool)
+    old_affected[cols[np.isin(old_e_ids[rows], old_changed)]] = True
+
+    # Previous specification of each combination of the current data
+    old_index = pd.MultiIndex.from_frame(old_specs[factor_keys].astype(str))
+    new_index = pd.MultiIndex.from_tuples(
+        [(*which, *how) for which in combinations.astype(str).itertuples(
+            index=False) for how in how_values],
+        names=factor_keys)
+    positions = old_index.get_indexer(new_index).reshape(len(subsets), -1)
+
+    # Subsets with a changed effect, or without a previous fit
+    effects = np.concatenate(subsets)
+    segments = np.repeat(np.arange(len(subsets)),
+                         [len(subset) for subset in subsets])
+    is_changed = np.isin(data[key_e_id].to_numpy()[effects], changed)
+    new_affected = np.bincount(segments, weights=is_changed,
+                               minlength=len(subsets)) > 0
+    refit = (new_affected | (positions < 0).any(axis=1)
+             | old_affected[positions].any(axis=1))
+
+    spec_fits = {}
+    for col in ["mean", "lb", "ub", "p"]:
+        spec_fits[col] = old_specs[col].to_numpy(dtype=float)[positions]
+    affected = np.flatnonzero(refit)
+    if len(affected):
+        fits = _fit_spec_columns(data, config,
+                                 [subsets[i] for i in affected],
+                                 len(affected), n_workers, chunk_effects,
+                                 progress)
+        for col, values in fits.items():
+            spec_fits[col][affected] = values
+    if progress:
+        print(f"{len(old_changed)} previous and {len(changed)} current "
+              f"effects changed, {len(affected)} of {len(subsets)} subsets "
+              f"refitted")
+
+    fitted = _rank_specs(combinations, subsets, config["how_lists"],
+                         spec_fits)
+    specs = pd.concat(list(iter_specs(data, config, fitted)),
+                      ignore_index=True)
+    old_ranks = old_specs["rank"].to_numpy()[positions.ravel()[
+        fitted["order"]]]
+    old_ranks[refit[fitted["order"] // len(how_values)]] = 0
+    return specs, old_ranks
+
+
+def write_specs(data, config, path, n_workers=None,
+                chunk_effects=CHUNK_EFFECTS, chunk_specs=CHUNK_SPECS,
+                progress=True):
+    """Compute the specifications of a multiverse analysis and write them.
+
+    The specifications are written chunk by chunk in rank order, as a
+    specs file if path ends with ".csv" and as a specs store otherwise,
+    see specs_store.write_specs().
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+        path -- The path of the specs file or store.
+
+    Keyword Arguments:
+        n_workers -- The number of worker processes, see fit_all_subsets()
+                     (default: {None}, the number of CPUs).
+        chunk_effects -- The number of effects per chunk
+                         (default: {CHUNK_EFFECTS}).
+        chunk_specs -- The number of specifications per chunk
+                       (default: {CHUNK_SPECS}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The number of specifications, or None if they could not be
+        computed, see fit_specs().
+    """
+    fitted = fit_specs(data, config, n_workers, chunk_effects, progress)
+    if fitted is None:
+        return None
+    write_chunks(data, config, path,
+                 iter_specs(data, config, fitted, chunk_specs))
+    return len(fitted["order"])
+
+
+def write_chunks(data, config, path, chunks, previous=None):
+    """Write specifications chunk by chunk, see write_specs().
+
+    Arguments:
+        data -- The meta-analytic data, see data.prepare_data().
+        config -- The configuration, see config.read_config().
+        path -- The path of the specs file (.csv) or store.
+        chunks -- The specification data as an iterable of DataFrames, in
+                  rank order.
+
+    Keyword Arguments:
+        previous -- The source key and previous ranks of updated
+                    specifications, which are only written to stores, see
+                    specs_store.write_specs() (default: {None}).
+    """
+    if path.endswith(".csv"):
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(path, mode="a" if i else "w", header=not i,
+                         index=False)
+    else:
+        colmap = config["colmap"]
+        specs_store.write_specs(
+            path, chunks, dict(config["which_lists"], **config["how_lists"]),
+            np.sort(data[colmap["key_c_id"]].unique()),
+            np.sort(data[colmap["key_e_id"]].to_numpy()), previous)
+
+
+def read_specs(path):
+    """Read the specification data of a specs file or store.
+
+    Arguments:
+        path -- The path of the specs file (.csv) or store.
+
+    Returns:
+        The specification data, ordered by rank.
+    """
+    if specs_store.is_store(path):
+        return specs_store.read_specs(path)
+    specs = pd.read_csv(path, na_values=["NA"], keep_default_na=False,
+                        float_precision="round_trip")
+    return specs.sort_values(by="rank").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compute the specifications of a multiverse analysis.")
+    parser.add_argument("config", help="path of the configuration file")
+    parser.add_argument("data", help="path of the meta-analytic data")
+    parser.add_argument("output", help="path of the specs file (.csv) or "
+                                       "specs store (directory) to write")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument("--chunk-effects", type=int, default=CHUNK_EFFECTS,
+                        help="number of effects per chunk of work")
+    parser.add_argument("--chunk-specs", type=int, default=CHUNK_SPECS,
+                        help="number of specifications written at once")
+    parser.add_argument("--update", nargs=2, metavar=("OLD_DATA", "OLD_SPECS"),
+                        help="only refit the specifications affected by "
+                             "changes since OLD_DATA and its OLD_SPECS")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    config = read_config(path=args.config)
+    data = prepare_data(config["colmap"], raw=args.data)
+    if args.update:
+        old_data = prepare_data(config["colmap"], raw=args.update[0])
+        updated = update_specs(old_data, read_specs(args.update[1]), data,
+                               config, args.workers, args.chunk_effects)
+        n_specs = None
+        if updated is not None:
+            specs, old_ranks = updated
+            source_key = specs_store.get_source_key(
+                *[specs_store.read_text(path) for path in args.update])
+            write_chunks(data, config, args.output, (
+                specs.iloc[first:first + args.chunk_specs]
+                for first in range(0, len(specs), args.chunk_specs)),
+                (source_key, old_ranks))
+            n_specs = len(specs)
+    else:
+        n_specs = write_specs(data, config, args.output, args.workers,
+                              args.chunk_effects, args.chunk_specs)
+    if n_specs is not None:
+        print(f"{n_specs} specifications written to {args.output} "
+              f"in {time.perf_counter() - start:.2f}s")
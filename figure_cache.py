@@ -0,0 +1,76 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Upper bound of the summed size of all cached entries, in bytes
+MAX_BYTES = int(os.environ.get("MULTIVERSE_FIGURE_CACHE_BYTES", 64 * 2**20))
+
+# Least recently used entries are at the front
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "bytes": 0
+}
+
+
+def get(key):
+    """Get a cached entry and mark it as recently used.
+
+    Arguments:
+        key -- The hashable cache key.
+
+    Returns:
+        The cached value, or None on a cache miss.
+    """
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[0]
+
+
+def put(key, value, size):
+    """Add an entry, evicting least recently used entries if needed.
+
+    Entries larger than the whole cache are not stored.
+
+    Arguments:
+        key -- The hashable cache key.
+        value -- The value to cache.
+        size -- The size of the value in bytes.
+    """
+    if size > MAX_BYTES:
+        return
+    with _lock:
+        if key in _entries:
+            _stats["bytes"] -= _entries.pop(key)[1]
+        _entries[key] = (value, size)
+        _stats["bytes"] += size
+        while _stats["bytes"] > MAX_BYTES:
+            _, (_, evicted_size) = _entries.popitem(last=False)
+            _stats["bytes"] -= evicted_size
+            _stats["evictions"] += 1
+
+
+def clear():
+    """Remove all entries, keeping the counters."""
+    with _lock:
+        _entries.clear()
+        _stats["bytes"] = 0
+
+
+def get_stats():
+    """Get the cache counters.
+
+    Returns:
+        Dictionary with hits, misses, evictions, number of entries and
+        their size in bytes.
+    """
+    with _lock:
+        return dict(_stats, entries=len(_entries), max_bytes=MAX_BYTES)
@@ -0,0 +1,30 @@
+# Gunicorn configuration for the multiverse dashboard
+bind = ":8050"
+
+# Import the application once in the master process before forking the
+# workers. Importing dashboard prepares the static dataset (see
+# dashboard.warm_up()), so workers start with it already in memory and
+# never recompute it per session. Set MULTIVERSE_SHARED_ARRAYS=1 to also
+# share its numeric arrays as read-only memory maps of the cache.
+preload_app = True
+
+
+def _log_status(log, prefix):
+    import dashboard
+    status = dashboard.get_status()
+    rss = (status["rss_bytes"] or 0) / 2**20
+    shared = (status["shared_bytes"] or 0) / 2**20
+    log.info(
+        f"{prefix} (pid {status['pid']}): dataset {status['dataset_id']} "
+        f"prepared in {status['warm_up_seconds']:.3f}s, "
+        f"RSS {rss:.1f} MiB ({shared:.1f} MiB shared), "
+        f"shared arrays: {status['shared_arrays']}"
+    )
+
+
+def when_ready(server):
+    _log_status(server.log, "Master")
+
+
+def post_worker_init(worker):
+    _log_status(worker.log, "Worker")
@@ -0,0 +1,148 @@
+import functools
+import threading
+import time
+
+from dash.exceptions import PreventUpdate
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the histogram buckets, in seconds and bytes
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30]
+BYTES_BUCKETS = [2**10 * 4**i for i in range(10)]
+
+# Type, help text and buckets of each metric
+METRICS = {
+    "multiverse_callback_seconds": (
+        "histogram", "Wall time of Dash callbacks.", SECONDS_BUCKETS),
+    "multiverse_callback_cpu_seconds": (
+        "histogram", "CPU time of Dash callbacks.", SECONDS_BUCKETS),
+    "multiverse_callback_request_bytes": (
+        "histogram", "Size of Dash callback request bodies.", BYTES_BUCKETS),
+    "multiverse_callback_response_bytes": (
+        "histogram", "Size of Dash callback response bodies as sent.",
+        BYTES_BUCKETS),
+    "multiverse_callback_errors_total": (
+        "counter", "Dash callbacks that raised an exception.", None),
+    "multiverse_compressed_bytes_total": (
+        "counter", "Size of compressed response bodies before compression.",
+        None),
+    "multiverse_compression_saved_bytes_total": (
+        "counter", "Bytes saved by compressing response bodies.", None)
+}
+
+# Values by metric name and label values. Histograms hold the count of
+# each bucket, the sum and the total count; counters hold their value.
+_values = {name: {} for name in METRICS}
+_lock = threading.Lock()
+
+
+def observe(name, value, **labels):
+    """Add an observation to a histogram.
+
+    Arguments:
+        name -- The name of the histogram, see METRICS.
+        value -- The observed value.
+        **labels -- The label values.
+    """
+    buckets = METRICS[name][2]
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        counts = _values[name].get(key)
+        if counts is None:
+            counts = _values[name][key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+
+def increment(name, amount=1, **labels):
+    """Increment a counter.
+
+    Arguments:
+        name -- The name of the counter, see METRICS.
+
+    Keyword Arguments:
+        amount -- The increment (default: {1}).
+        **labels -- The label values.
+    """
+    key = tuple(sorted(labels.items()))
+    with _lock:
+        _values[name][key] = _values[name].get(key, 0) + amount
+
+
+def instrument(func):
+    """Record the wall time, CPU time and errors of a Dash callback.
+
+    Apply below @app.callback. Callbacks that prevent their update are
+    not counted as errors.
+
+    Arguments:
+        func -- The callback function.
+
+    Returns:
+        The instrumented function.
+    """
+    name = func.__name__
+    increment("multiverse_callback_errors_total", 0, callback=name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        except PreventUpdate:
+            raise
+        except Exception:
+            increment("multiverse_callback_errors_total", callback=name)
+            raise
+        finally:
+            observe("multiverse_callback_seconds",
+                    time.perf_counter() - start, callback=name)
+            observe("multiverse_callback_cpu_seconds",
+                    time.thread_time() - start_cpu, callback=name)
+    return wrapper
+
+
+def _format_labels(labels):
+    """Format label pairs as {name="value",...}."""
+    if not labels:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\").replace("\"", "\\\"")
+         .replace("\n", "\\n"))
+        for name, value in labels
+    ]
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) \
+        + "}"
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format.
+
+    The metrics are those of the current process; under gunicorn, every
+    worker reports its own.
+
+    Returns:
+        The metrics as a string.
+    """
+    lines = []
+    with _lock:
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(_values[name].items()):
+                if kind == "counter":
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+                    continue
+                for bound, count in zip(buckets + ["+Inf"],
+                                        value[:len(buckets)] + [value[-1]]):
+                    labels = _format_labels(key + (("le", bound),))
+                    lines.append(f"{name}_bucket{labels} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {value[-2]}")
+                lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+    return "\n".join(lines) + "\n"
@@ -1,107 +1,216 @@
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+from data import get_set_incidence, unpack_set_incidence
 
-def get_spec_fill_data(n_which, which_lists, n_how, how_lists, specs):
+# Width of the plotting area of the multiverse figure in pixels (figure
+# width minus margins). More columns than this cannot be told apart.
+N_COLUMNS = 1500 - 30 - 20
+
+
+def get_spec_fill_data(which_lists, how_lists, specs):
     """Get spec fill data for each specification.
 
-    The spec fill data is a vector that indicate the which- and how-
+    The spec fill data is a matrix that indicates the which- and how-
     factors that comprise a specification. The size of the number corresponds
     to the number of samples that contribute (i.e. the value of k).
 
     Arguments:
-        n_which -- The number of which-factors.
         which_lists -- The which-factors.
-        n_how -- The number of how-factors.
         how_lists -- The how-factors.
         specs -- The specification data.
 
     Returns:
-        A dictionary containing the spec fill data for each specification.
+        The spec fill matrix of shape (factor values, specifications), with
+        rows in reversed order of the factor values and columns ordered by
+        rank.
     """
     # Combine which- and how- factors into a single dictionary
     group_factors = dict(which_lists, **how_lists)
-
-    # Get complete list of values
-    group_factor_values = [v for vals in group_factors.values() for v in vals]
-    group_factor_values.reverse()
-    n_factors = n_which + n_how
-
-    spec_fill_data = {}
-
-    # Get fill data for each specification
-    for rank in specs["rank"]:
-        spec = specs[specs["rank"] == rank]
-
-        # The first columns in the specification data are factors
-        spec_id = [
-            int(l in spec.iloc[:, 0:n_factors].values)
-            for l in group_factor_values
-        ]
-
-        # Key should be string, not number, for interoperability with R
-        # Multiply binary vector with k
-        spec_fill_data[f"{rank}"] = np.array(spec_id) * spec["k"].item()
+    n_values = sum(len(vals) for vals in group_factors.values())
+    n_specs = len(specs)
+
+    # Use a compact unsigned type that still holds the largest k
+    k = specs["k"].to_numpy()
+    dtype = np.promote_types(np.uint16, np.min_scalar_type(k.max()))
+    spec_fill_data = np.zeros((n_values, n_specs), dtype=dtype)
+    ranks = specs["rank"].to_numpy() - 1
+
+    # Set the row of each factor value from its categorical code,
+    # with rows reversed for correct plotting
+    offset = 0
+    for key, vals in group_factors.items():
+        codes = pd.Categorical(specs[key], categories=vals).codes
+        matched = codes >= 0
+        rows = n_values - 1 - (offset + codes[matched])
+        spec_fill_data[rows, ranks[matched]] = k[matched]
+        offset += len(vals)
 
     return spec_fill_data
 
 
-def get_cluster_fill_data(data, specs, colmap):
+def get_cluster_fill_data(data, specs, colmap, effect_bits=None):
     """Get cluster fill data for each specification.
 
-    The cluster fill data is a vector that indicate the percentage of 
+    The cluster fill data is a matrix that indicates the percentage of
     available samples from each cluster that belongs to the specification.
+    It is computed in a single pass from the effect-specification incidence
+    and the number of effects per cluster.
 
     Arguments:
         data -- The meta-analytic dataset.
         specs -- The specification data.
         colmap -- The column-map from the configuration.
 
+    Keyword Arguments:
+        effect_bits -- The effects of each specification as bitsets over
+                       the sorted effect IDs, in the order of specs, see
+                       data.pack_set_incidence() (default: {None}, parsed
+                       from the "set_es" column).
+
     Returns:
-        A dictionary containing the cluster fill data for each specification.
+        A dictionary containing the cluster fill matrix ("fills") of shape
+        (clusters, specifications) as float32, with rows ordered by cluster
+        ID and columns ordered by rank, and the cluster names ("labels").
     """
     # Get relevant keys from colmap
     key_c_id = colmap["key_c_id"]
     key_e_id = colmap["key_e_id"]
     key_c = colmap["key_c"]
 
-    cluster_fill_data = {}
-
-    # Get fill data for each specification
-    for rank in specs["rank"]:
-        spec = specs[specs["rank"] == rank]
-        # Get the sets of cluster- and effect- IDs that contribute
-        set_c_ids = [int(c_id) for c_id in spec["set"].item().split(",")]
-        set_e_ids = [int(e_id) for e_id in spec["set_es"].item().split(",")]
-
-        # For each cluster ID in the set, compute the percentage and set
-        # the value at the corresponding index of the vector
-        fills = np.zeros(len(data[key_c_id].unique()))
-        for c_id in set_c_ids:
-            # Get all effect IDs in cluster
-            c_data = data[data[key_c_id] == c_id]
-            c_e_ids = c_data[key_e_id].tolist()
-
-            # Filter for effect IDs that are in the specification
-            spec_c_e_ids = [e_id for e_id in c_e_ids if e_id in set_e_ids]
-
-            # Compute percentage and set value at corresponding index
-            c_fill = len(spec_c_e_ids) * 100 / len(c_e_ids)
-            fills[c_id-1] = c_fill
-
-        # Key should be string, not number, for interoperability with R
-        # Reverse the vector for correct plotting
-        cluster_fill_data[f"{rank}"] = np.flip(fills)
-
-    # Prepare list of cluster names as labels
-    c_ids = sorted(data[key_c_id].unique())
-    cluster_fill_data["labels"] = [
-        data[data[key_c_id] == c_id].iloc[0][key_c]
-        for c_id in c_ids
-    ]
+    # Map each effect to the index of its cluster
+    clusters = data.drop_duplicates(subset=key_c_id).sort_values(by=key_c_id)
+    c_ids = clusters[key_c_id].to_numpy()
+    effects = data.sort_values(by=key_e_id)
+    e_ids = effects[key_e_id].to_numpy()
+    e_clusters = np.searchsorted(c_ids, effects[key_c_id].to_numpy())
+    n_clusters = len(c_ids)
+    n_specs = len(specs)
+
+    # Count the effects of each cluster that belong to each specification
+    if effect_bits is None:
+        e_rows, spec_cols = get_set_incidence(specs["set_es"], e_ids)
+    else:
+        e_rows, spec_cols = unpack_set_incidence(effect_bits, len(e_ids))
+    rank_cols = specs["rank"].to_numpy()[spec_cols] - 1
+    counts = np.bincount(
+        e_clusters[e_rows] * n_specs + rank_cols,
+        minlength=n_clusters * n_specs
+    ).reshape(n_clusters, n_specs)
+
+    # Compute percentages with respect to the size of each cluster
+    c_sizes = np.bincount(e_clusters, minlength=n_clusters)
+    fills = (counts * 100 / c_sizes[:, np.newaxis]).astype(np.float32)
+
+    return {
+        "fills": fills,
+        "labels": clusters[key_c].tolist()
+    }
+
+
+def _get_refitted(specs, old_ranks):
+    """Get the refitted specifications, ranked among themselves."""
+    refitted = specs[old_ranks == 0].copy()
+    refitted["rank"] = np.arange(1, len(refitted) + 1)
+    return refitted
+
+
+def patch_spec_fill_data(spec_fill_data, old_ranks, which_lists, how_lists,
+                         specs):
+    """Patch the spec fill data after specifications were updated.
+
+    Columns of specifications that kept their fits are moved to their new
+    ranks; only the columns of refitted specifications are computed.
+
+    Arguments:
+        spec_fill_data -- The previous spec fill data, see
+                          get_spec_fill_data().
+        old_ranks -- The previous rank of each specification, 0 if it was
+                     refitted, see engine.update_specs().
+        which_lists -- The which-factors.
+        how_lists -- The how-factors.
+        specs -- The updated specification data, ordered by rank.
+
+    Returns:
+        The spec fill matrix of the updated specifications.
+    """
+    kept = old_ranks > 0
+    if kept.all():
+        return spec_fill_data[:, old_ranks - 1]
+    refitted = get_spec_fill_data(which_lists, how_lists,
+                                  _get_refitted(specs, old_ranks))
+    dtype = np.promote_types(spec_fill_data.dtype, refitted.dtype)
+    fill_data = np.empty((spec_fill_data.shape[0], len(specs)), dtype=dtype)
+    fill_data[:, kept] = spec_fill_data[:, old_ranks[kept] - 1]
+    fill_data[:, ~kept] = refitted
+    return fill_data
+
+
+def patch_cluster_fill_data(cluster_fill_data, old_ranks, old_data, data,
+                            specs, colmap, effect_bits=None):
+    """Patch the cluster fill data after specifications were updated.
+
+    Columns of specifications that kept their fits are moved to their new
+    ranks, and only the columns of refitted specifications are computed.
+    Kept specifications contain no changed effects, so their counts per
+    cluster are unchanged, and their percentages are only rescaled in the
+    rows of clusters whose size changed. If clusters were added, removed
+    or renumbered, the cluster fill data is computed from scratch.
+
+    Arguments:
+        cluster_fill_data -- The previous cluster fill data, see
+                             get_cluster_fill_data().
+        old_ranks -- The previous rank of each specification, 0 if it was
+                     refitted, see engine.update_specs().
+        old_data -- The previous meta-analytic dataset.
+        data -- The updated meta-analytic dataset.
+        specs -- The updated specification data, ordered by rank.
+        colmap -- The column-map from the configuration.
+
+    Keyword Arguments:
+        effect_bits -- The effects of the updated specifications as
+                       bitsets, see get_cluster_fill_data()
+                       (default: {None}, parsed from the "set_es" column).
 
-    return cluster_fill_data
+    Returns:
+        The cluster fill data of the updated specifications.
+    """
+    key_c_id = colmap["key_c_id"]
+    key_c = colmap["key_c"]
+    old_clusters = old_data.drop_duplicates(subset=key_c_id).sort_values(
+        by=key_c_id)
+    clusters = data.drop_duplicates(subset=key_c_id).sort_values(
+        by=key_c_id)
+    if not (np.array_equal(old_clusters[key_c_id], clusters[key_c_id])
+            and np.array_equal(old_clusters[key_c], clusters[key_c])):
+        return get_cluster_fill_data(data, specs, colmap, effect_bits)
+
+    c_ids = clusters[key_c_id].to_numpy()
+    old_sizes = np.bincount(
+        np.searchsorted(c_ids, old_data[key_c_id].to_numpy()),
+        minlength=len(c_ids))
+    sizes = np.bincount(np.searchsorted(c_ids, data[key_c_id].to_numpy()),
+                        minlength=len(c_ids))
+
+    kept = old_ranks > 0
+    fills = np.empty((len(c_ids), len(specs)), dtype=np.float32)
+    fills[:, kept] = cluster_fill_data["fills"][:, old_ranks[kept] - 1]
+    resized = np.flatnonzero(old_sizes != sizes)
+    if len(resized):
+        counts = np.rint(fills[np.ix_(resized, kept)]
+                         * old_sizes[resized, np.newaxis] / 100)
+        fills[np.ix_(resized, kept)] = (
+            counts * 100 / sizes[resized, np.newaxis]).astype(np.float32)
+    if not kept.all():
+        fills[:, ~kept] = get_cluster_fill_data(
+            data, _get_refitted(specs, old_ranks), colmap,
+            None if effect_bits is None else effect_bits[~kept])["fills"]
+    return {
+        "fills": fills,
+        "labels": clusters[key_c].tolist()
+    }
 
 
 def get_colors(fill_levels):
@@ -191,8 +300,129 @@ def _get_common_args(n_total_specs, title):
     return common_args
 
 
+def get_visible_ranks(n_total_specs, x_range=None):
+    """Get the first and last rank within an x-axis range.
+
+    Arguments:
+        n_total_specs -- The total number of specifications.
+
+    Keyword Arguments:
+        x_range -- The x-axis range, or None for all specifications
+                   (default: {None}).
+
+    Returns:
+        A tuple of the first and last visible rank.
+    """
+    if x_range is None:
+        return 1, n_total_specs
+    first = min(max(1, int(np.floor(x_range[0] + 0.5))), n_total_specs)
+    last = max(min(n_total_specs, int(np.ceil(x_range[1] - 0.5))), first)
+    return first, last
+
+
+def get_view(n_total_specs, x_range=None, n_columns=N_COLUMNS):
+    """Get the ranks and resolution to render for an x-axis range.
+
+    If more specifications are visible than there are columns, the
+    specifications are aggregated into bins of equal width (see
+    bin_specs()), so the amount of rendered data is bounded by the width of
+    the figure. A zoomed-in view also covers one range width to either side
+    of the visible ranks, such that small pans do not need new data.
+
+    Arguments:
+        n_total_specs -- The total number of specifications.
+
+    Keyword Arguments:
+        x_range -- The x-axis range, or None for all specifications
+                   (default: {None}).
+        n_columns -- The maximum number of columns in the visible range
+                     (default: {N_COLUMNS}).
+
+    Returns:
+        A dictionary with the first and last rank ("first", "last") and the
+        number of specifications per bin ("step").
+    """
+    first, last = get_visible_ranks(n_total_specs, x_range)
+    width = last - first + 1
+    return {
+        "first": max(1, first - width),
+        "last": min(n_total_specs, last + width),
+        "step": -(-width // n_columns)
+    }
+
+
+def bin_specs(specs, view):
+    """Aggregate the specifications of a view into bins.
+
+    Each bin holds the median effect size, the minimum lower and maximum
+    upper bound, the maximum sample and cluster size and the minimum
+    p-value of its specifications. Its rank is the center of the bin, and
+    the ranks of its first and last specification are kept as "first" and
+    "last". Empty bins are left out.
+
+    Arguments:
+        specs -- The specification data.
+        view -- See get_view().
+
+    Returns:
+        The specifications within the view, aggregated if the view has more
+        than one specification per bin.
+    """
+    first, last, step = view["first"], view["last"], view["step"]
+    ranks = specs["rank"].to_numpy()
+    specs = specs[(ranks >= first) & (ranks <= last)]
+    if step == 1:
+        return specs
+
+    bins = (specs["rank"].to_numpy() - first) // step
+    binned = specs.groupby(bins).agg(
+        mean=("mean", "median"),
+        lb=("lb", "min"),
+        ub=("ub", "max"),
+        k=("k", "max"),
+        kc=("kc", "max"),
+        p=("p", "min"),
+        first=("rank", "min"),
+        last=("rank", "max")
+    )
+    binned.insert(0, "rank", first + binned.index * step + (step - 1) / 2)
+    binned["ci"] = binned["ub"] - binned["lb"]
+    return binned.reset_index(drop=True)
+
+
+def _get_tiles(fill_data, specs, view):
+    """Get the tiles of a view from fill data.
+
+    The tile of a bin is the maximum fill of its specifications.
+
+    Arguments:
+        fill_data -- The fill matrix with one column per rank, see
+                     get_cluster_fill_data() and get_spec_fill_data().
+        specs -- The specification data.
+        view -- See get_view().
+
+    Returns:
+        A tuple of the x positions of the columns and the tile matrix.
+    """
+    first, last, step = view["first"], view["last"], view["step"]
+    n_columns = (last - first) // step + 1
+    x = first + np.arange(n_columns) * step
+    if step > 1:
+        x = x + (step - 1) / 2
+
+    tiles = np.zeros((fill_data.shape[0], n_columns))
+    ranks = np.sort(specs["rank"].to_numpy())
+    ranks = ranks[(ranks >= first) & (ranks <= last)]
+    if len(ranks) > 0:
+        bins = (ranks - first) // step
+        starts = np.flatnonzero(np.diff(bins, prepend=-1))
+        tiles[:, bins[starts]] = np.maximum.reduceat(
+            fill_data[:, ranks - 1], starts, axis=1)
+    return x, tiles
+
+
 def _caterpillar(specs, n_total_specs, color_scale, k_range, y_ticks,
-                 y_limits):
+                 y_limits, width=1, lines=None):
     """Get caterpillar figure data.
 
     Arguments:
@@ -203,17 +433,33 @@ def _caterpillar(specs, n_total_specs, color_scale, k_range, y_ticks,
         y_ticks -- The ticks for y-axis.
         y_limits -- The limits for y-axis.
 
+    Keyword Arguments:
+        width -- The number of specifications per bar, see bin_specs()
+                 (default: {1}).
+        lines -- Whether to draw the effect sizes as a line instead of
+                 markers (default: {None}, if all specifications are shown).
+
     Returns:
         A dictionary with caterpillar figure data.
     """
+    if lines is None:
+        lines = len(specs) == n_total_specs
+
     # Line of effect sizes
     go_line = go.Scatter(
         x=specs["rank"],
         y=specs["mean"],
         marker=dict(color="black"),
-        mode="lines" if len(specs) == n_total_specs else "markers",
+        mode="lines" if lines else "markers",
         hovertemplate="Effect Size: %{y:.4f}<extra></extra>"
     )
+    if width > 1:
+        go_line.update(
+            customdata=specs["first"].astype(str) + "–" +
+            specs["last"].astype(str),
+            hovertemplate="Specifications %{customdata}<br>"
+            "Median Effect Size: %{y:.4f}<extra></extra>"
+        )
     # CI error bars
     go_ci = go.Bar(
         x=specs["rank"],
@@ -226,7 +472,7 @@ def _caterpillar(specs, n_total_specs, color_scale, k_range, y_ticks,
             cmin=k_range[0],
             cmax=k_range[1]
         ),
-        width=1,
+        width=width,
         hovertemplate="95%-CI: [%{base:.4f}, %{y:.4f}]<extra></extra>"
     )
     yaxes_args = {
@@ -330,7 +576,39 @@ def plot_caterpillar(specs, n_total_specs, colors, k_range, title, fill_levels):
     return fig
 
 
-def _cluster_tiles(specs, cluster_fill_data, n_total_specs):
+def _get_hlines(fig, hline_args, row=None, col=None):
+    """Get horizontal lines across a plot as shapes.
+
+    The shapes are those fig.add_hline() adds for each line. Adding them
+    all at once with fig.update_layout() is much faster; add_hline() takes
+    quadratic time in the number of shapes.
+
+    Arguments:
+        fig -- The figure.
+        hline_args -- The arguments of fig.add_hline() of each line, i.e.
+                      the y position ("y") and the line properties.
+
+    Keyword Arguments:
+        row -- The row of the subplot (default: {None}, no subplots).
+        col -- The column of the subplot (default: {None}, no subplots).
+
+    Returns:
+        A list of shape dictionaries.
+    """
+    x_ref, y_ref = "x", "y"
+    if row is not None:
+        subplot = fig.get_subplot(row, col)
+        x_ref = subplot.xaxis.plotly_name.replace("axis", "")
+        y_ref = subplot.yaxis.plotly_name.replace("axis", "")
+    return [
+        dict(type="line", xref=f"{x_ref} domain", x0=0, x1=1, yref=y_ref,
+             y0=args["y"], y1=args["y"],
+             **{k: v for k, v in args.items() if k != "y"})
+        for args in hline_args
+    ]
+
+
+def _cluster_tiles(specs, cluster_fill_data, n_total_specs, view=None):
     """Get cluster tilemap figure data.
 
     Arguments:
@@ -338,33 +616,28 @@ def _cluster_tiles(specs, cluster_fill_data, n_total_specs):
         cluster_fill_data -- See get_cluster_fill_data().
         n_total_specs -- The total number of specifications.
 
+    Keyword Arguments:
+        view -- The ranks and resolution to show, see get_view()
+                (default: {None}, all specifications).
+
     Returns:
         A dictionary with cluster tilemap figure data.
     """
-    # Construct tilemap
+    if view is None:
+        view = {"first": 1, "last": n_total_specs, "step": 1}
+
+    # Construct tilemap, reverse the clusters for correct plotting
     n_clusters = len(cluster_fill_data["labels"])
-    c_tiles = np.zeros((n_clusters, n_total_specs))
-    for rank in specs["rank"]:
-        fill = cluster_fill_data[f"{rank}"]
-        c_tiles[:, rank-1] = fill
+    x, c_tiles = _get_tiles(cluster_fill_data["fills"][::-1], specs, view)
 
     # Reverse labels for correct plotting
-    cluster_fill_data["labels"].reverse()
+    c_labels = cluster_fill_data["labels"][::-1]
 
-    # Construct hover information
-    c_labels = cluster_fill_data["labels"]
-    tiles_bool = (c_tiles != 0)
-    spec_infos = []
-    for spec_nr in range(tiles_bool.shape[1]):
-        spec_info = []
-        for cluster in range(tiles_bool.shape[0]):
-            if tiles_bool[cluster, spec_nr]:
-                c_fill = c_tiles[cluster, spec_nr]
-                spec_info.append(f"<b>{c_labels[cluster]}</b>: {c_fill:.2f}%")
-        spec_info.reverse()
-        spec_infos.append(("<br>").join(spec_info))
-
-    customdata = np.tile(spec_infos, (n_clusters, 1))
+    # Construct hover information: each tile shows its cluster and fill.
+    # Empty tiles are gaps without hover information.
+    c_tiles[c_tiles == 0] = np.nan
+    customdata = np.broadcast_to(
+        np.asarray(c_labels, dtype=object)[:, None], c_tiles.shape)
 
     # Colorscale is single color with different opacity levels
     color_scale = [
@@ -374,12 +647,13 @@ def _cluster_tiles(specs, cluster_fill_data, n_total_specs):
 
     # Tilemap
     graph_object = go.Heatmap(
-        x=[rank for rank in range(1, n_total_specs + 1)],
+        x=x,
         z=c_tiles,
         showscale=False,
         colorscale=color_scale,
         customdata=customdata,
-        hovertemplate=("%{customdata}<extra></extra>"),
+        hovertemplate=("<b>%{customdata}</b>: %{z:.2f}%<extra></extra>"),
+        hoverongaps=False,
         hoverlabel=dict(
             bgcolor="white",
             font_size=16
@@ -426,8 +700,7 @@ def plot_cluster_tiles(specs, cluster_fill_data, n_total_specs, title):
     # Plot figure
     fig = go.Figure()
     fig.add_trace(cluster_tiles["go"])
-    for hline_args in cluster_tiles["hline_args"]:
-        fig.add_hline(**hline_args)
+    fig.update_layout(shapes=_get_hlines(fig, cluster_tiles["hline_args"]))
     fig.update_yaxes(**cluster_tiles["yaxes_args"])
 
     # Update layout with common values
@@ -465,7 +738,7 @@ def _get_y_intercepts(y_labels):
 
 
 def _spec_tiles(specs, spec_fill_data, labels, n_total_specs,
-                color_scale, k_range):
+                color_scale, k_range, view=None):
     """Get specification tilemap figure data.
 
     Arguments:
@@ -476,19 +749,23 @@ def _spec_tiles(specs, spec_fill_data, labels, n_total_specs,
         color_scale -- The color scale.
         k_range -- The range of sample sizes.
 
+    Keyword Arguments:
+        view -- The ranks and resolution to show, see get_view()
+                (default: {None}, all specifications).
+
     Returns:
         A dictionary with specification tilemap figure data.
     """
+    if view is None:
+        view = {"first": 1, "last": n_total_specs, "step": 1}
+
     # Reverse labels for correct plotting
     y_labels = labels.copy()
     y_labels.reverse()
     n_factors = len(y_labels)
 
     # Construct tilemap
-    tiles = np.zeros((n_factors, n_total_specs))
-    for rank in specs["rank"]:
-        fill = spec_fill_data[f"{rank}"]
-        tiles[:, rank-1] = fill
+    x, tiles = _get_tiles(spec_fill_data, specs, view)
 
     # Construct hover information
     tiles_bool = (tiles != 0)
@@ -508,7 +785,7 @@ def _spec_tiles(specs, spec_fill_data, labels, n_total_specs,
 
     # Tilemap
     graph_object = go.Heatmap(
-        x=[rank for rank in range(1, n_total_specs + 1)],
+        x=x,
         z=tiles,
         showscale=False,
         colorscale=color_scale,
@@ -573,8 +850,7 @@ def plot_spec_tiles(specs, n_total_specs, spec_fill_data, labels, colors,
     # Plot Figure
     fig = go.Figure()
     fig.add_trace(spec_tiles["go"])
-    for hline_args in spec_tiles["hline_args"]:
-        fig.add_hline(**hline_args)
+    fig.update_layout(shapes=_get_hlines(fig, spec_tiles["hline_args"]))
     fig.update_yaxes(**spec_tiles["yaxes_args"])
 
     # Update layout with common values
@@ -586,13 +862,17 @@ def plot_spec_tiles(specs, n_total_specs, spec_fill_data, labels, colors,
     return fig
 
 
-def _cluster_size(specs, k_range):
+def _cluster_size(specs, k_range, width=1):
     """Get cluster size barplot figure data.
 
     Arguments:
         specs -- The specification data.
         k_range -- The range of sample sizes.
 
+    Keyword Arguments:
+        width -- The number of specifications per bar, see bin_specs()
+                 (default: {1}).
+
     Returns:
         A dictionary with cluster size barplot figure data.
     """
@@ -601,7 +881,7 @@ def _cluster_size(specs, k_range):
         x=specs["rank"],
         y=specs["kc"],
         marker=dict(color="slategray", line_width=0),
-        width=1,
+        width=width,
         hovertemplate="Cluster Size: %{y}<extra></extra>"
     )
 
@@ -648,13 +928,17 @@ def plot_cluster_size(specs, k_range, n_total_specs, title):
     return fig
 
 
-def _sample_size(specs, k_range):
+def _sample_size(specs, k_range, width=1):
     """Get sample size barplot figure data.
 
     Arguments:
         specs -- The specification data.
         k_range -- The range of sample sizes.
 
+    Keyword Arguments:
+        width -- The number of specifications per bar, see bin_specs()
+                 (default: {1}).
+
     Returns:
         A dictionary with sample size barplot figure data.
     """
@@ -663,7 +947,7 @@ def _sample_size(specs, k_range):
         x=specs["rank"],
         y=specs["k"],
         marker=dict(color="grey", line_width=0),
-        width=1,
+        width=width,
         hovertemplate="Sample Size: %{y}<extra></extra>"
     )
 
@@ -712,9 +996,13 @@ def plot_sample_size(specs, k_range, n_total_specs, title):
 
 def plot_multiverse(specs, n_total_specs, k_range, cluster_fill_data,
                     spec_fill_data, labels, colors, level, title, fill_levels,
-                    y_ticks=None, y_limits=None):
+                    y_ticks=None, y_limits=None, view=None):
     """Plot the multiverse summary figure.
 
+    With a view (see get_view()), only the specifications within its ranks
+    are plotted, aggregated into bins if the view has more than one
+    specification per bin (see bin_specs()).
+
     Arguments:
         specs -- The specification data.
         n_total_specs -- The total number of specifications.
@@ -730,6 +1018,8 @@ def plot_multiverse(specs, n_total_specs, k_range, cluster_fill_data,
     Keyword Arguments:
         y_ticks -- y-axis ticks (default: {None})
         y_limits -- y-axis limits (default: {None})
+        view -- The ranks and resolution to show
+                (default: {None}, all specifications).
 
     Returns:
         Plotly figure.
@@ -761,43 +1051,57 @@ def plot_multiverse(specs, n_total_specs, k_range, cluster_fill_data,
     if y_ticks is None:
         y_ticks = _get_y_ticks(y_limits)
 
+    # Bars and markers of the specifications within the view
+    if view is None:
+        view = {"first": 1, "last": n_total_specs, "step": 1}
+    lines = len(specs) == n_total_specs
+    binned = bin_specs(specs, view)
+    width = view["step"]
+
+    # Horizontal lines of all panels, added at once, see _get_hlines()
+    hlines = []
+
     if level == 3:
         # Cluster tilemap
         cluster_tiles = _cluster_tiles(
             specs,
             cluster_fill_data,
-            n_total_specs
+            n_total_specs,
+            view
         )
         fig.add_trace(cluster_tiles["go"], row=row_counter, col=1)
-        for hline_args in cluster_tiles["hline_args"]:
-            fig.add_hline(**hline_args, row=row_counter, col=1)
+        hlines += _get_hlines(fig, cluster_tiles["hline_args"],
+                              row=row_counter, col=1)
         fig.update_yaxes(**cluster_tiles["yaxes_args"], row=row_counter, col=1)
         row_counter += 1
 
     # Caterpillar
     caterpillar = _caterpillar(
-        specs,
+        binned,
         n_total_specs,
         color_scale,
         k_range,
         y_ticks,
-        y_limits
+        y_limits,
+        width,
+        lines
     )
     for g_obj in caterpillar["go"]:
         fig.add_trace(g_obj, row=row_counter, col=1)
-    fig.add_hline(**caterpillar["hline_args"], row=row_counter, col=1)
+    hlines += _get_hlines(fig, [caterpillar["hline_args"]], row=row_counter,
+                          col=1)
     fig.update_yaxes(**caterpillar["yaxes_args"], row=row_counter, col=1)
     row_counter += 1
 
     if level == 3:
         # Cluster sample Size
-        cluster_size = _cluster_size(specs, k_range)
+        cluster_size = _cluster_size(binned, k_range, width)
         fig.add_trace(cluster_size["go"], row=row_counter, col=1)
         fig.update_yaxes(**cluster_size["yaxes_args"], row=row_counter, col=1)
         row_counter += 1
 
     # Sample size
-    sample_size = _sample_size(specs, k_range)
+    sample_size = _sample_size(binned, k_range, width)
     fig.add_trace(sample_size["go"], row=row_counter, col=1)
     fig.update_yaxes(**sample_size["yaxes_args"], row=row_counter, col=1)
     row_counter += 1
@@ -809,11 +1113,13 @@ def plot_multiverse(specs, n_total_specs, k_range, cluster_fill_data,
         labels,
         n_total_specs,
         color_scale,
-        k_range
+        k_range,
+        view
     )
     fig.add_trace(spec_tiles["go"], row=row_counter, col=1)
-    for hline_args in spec_tiles["hline_args"]:
-        fig.add_hline(**hline_args, row=row_counter, col=1)
+    hlines += _get_hlines(fig, spec_tiles["hline_args"], row=row_counter,
+                          col=1)
+    fig.update_layout(shapes=hlines)
     fig.update_yaxes(**spec_tiles["yaxes_args"], row=row_counter, col=1)
     fig.update_xaxes(**spec_tiles["xaxes_args"], row=row_counter, col=1)
 
@@ -0,0 +1,197 @@
+import cProfile
+import heapq
+import itertools
+import marshal
+import os
+import threading
+import time
+
+# Profiling mode: "all" profiles every callback request, "header" only
+# requests with the PROFILE_HEADER header. Profiling is off otherwise.
+MODE = os.environ.get("MULTIVERSE_PROFILE", "")
+PROFILE_HEADER = "X-Profile"
+
+# Number of profiles kept; the slowest requests are kept
+MAX_PROFILES = int(os.environ.get("MULTIVERSE_PROFILE_KEEP", 20))
+
+# Calls below this fraction of the total time are merged into their
+# caller in speedscope profiles, see to_speedscope()
+MIN_FRACTION = 0.001
+
+# Min-heap of (seconds, ID, profile) of the kept profiles
+_profiles = []
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+
+def is_enabled():
+    """Check whether any requests are profiled."""
+    return MODE in ("all", "header")
+
+
+def is_requested(headers):
+    """Check whether a request is to be profiled.
+
+    Arguments:
+        headers -- The request headers.
+
+    Returns:
+        True if all requests are profiled, or if profiling by header is
+        enabled and the request has a PROFILE_HEADER other than "0".
+    """
+    if MODE == "all":
+        return True
+    return MODE == "header" and headers.get(PROFILE_HEADER, "0") != "0"
+
+
+def start():
+    """Start profiling the current thread.
+
+    Returns:
+        The running profile, to be passed to finish().
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile, time.perf_counter(), time.time()
+
+
+def finish(running, name):
+    """Stop a profile and keep it if it is among the slowest.
+
+    Arguments:
+        running -- The running profile, see start().
+        name -- The name of the profiled callback.
+    """
+    profile, start_time, created = running
+    profile.disable()
+    seconds = time.perf_counter() - start_time
+    profile.create_stats()
+    entry = {
+        "id": next(_ids),
+        "callback": name,
+        "seconds": seconds,
+        "created": created,
+        "stats": profile.stats
+    }
+    with _lock:
+        item = (seconds, entry["id"], entry)
+        if len(_profiles) < MAX_PROFILES:
+            heapq.heappush(_profiles, item)
+        elif seconds > _profiles[0][0]:
+            heapq.heapreplace(_profiles, item)
+
+
+def get_profiles():
+    """Get the kept profiles, slowest first.
+
+    Returns:
+        A list of dictionaries with the ID, callback name, duration in
+        seconds and creation time of each profile.
+    """
+    with _lock:
+        entries = [entry for _, _, entry in sorted(_profiles, reverse=True)]
+    return [{key: value for key, value in entry.items() if key != "stats"}
+            for entry in entries]
+
+
+def get_profile(profile_id):
+    """Get a kept profile.
+
+    Arguments:
+        profile_id -- The ID of the profile.
+
+    Returns:
+        The profile as a dictionary with its statistics ("stats") in the
+        format of pstats, or None if it is not kept.
+    """
+    with _lock:
+        for _, _, entry in _profiles:
+            if entry["id"] == profile_id:
+                return entry
+    return None
+
+
+def to_pstats(profile):
+    """Serialize a profile as a pstats file.
+
+    Arguments:
+        profile -- The profile, see get_profile().
+
+    Returns:
+        The content of the file, as written by pstats.Stats.dump_stats().
+    """
+    return marshal.dumps(profile["stats"])
+
+
+def to_speedscope(profile):
+    """Convert a profile into the speedscope file format.
+
+    cProfile only records the time of each caller-callee pair, not of
+    complete call stacks. The call tree is therefore estimated by dividing
+    the time of every function among its callees in proportion to their
+    time when called from it, as in gprof. Recursive calls are merged
+    into the outermost call.
+
+    Arguments:
+        profile -- The profile, see get_profile().
+
+    Returns:
+        A dictionary with a speedscope profile of type "sampled", with one
+        weighted sample in seconds per estimated call stack.
+    """
+    stats = profile["stats"]
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, edge_time) in callers.items():
+            callees.setdefault(caller, []).append((func, edge_time))
+    roots = [func for func, (_, _, _, _, callers) in stats.items()
+             if not any(caller in stats for caller in callers)]
+    total = sum(stats[func][3] for func in roots)
+    min_seconds = total * MIN_FRACTION
+
+    frames = []
+    frame_index = {}
+    samples = []
+    weights = []
+    stack = []
+
+    def walk(func, seconds):
+        if func not in frame_index:
+            file_name, line, name = func
+            frame_index[func] = len(frames)
+            frames.append({"name": name, "file": file_name, "line": line})
+        stack.append(func)
+        func_time = stats[func][3]
+        scale = seconds / func_time if func_time > 0 else 0
+        self_seconds = seconds
+        for callee, edge_time in callees.get(func, []):
+            callee_seconds = min(edge_time * scale, self_seconds)
+            if callee in stack or callee_seconds < min_seconds:
+                continue
+            walk(callee, callee_seconds)
+            self_seconds -= callee_seconds
+        if self_seconds > 0:
+            samples.append([frame_index[f] for f in stack])
+            weights.append(self_seconds)
+        stack.pop()
+
+    for func in roots:
+        if stats[func][3] >= min_seconds:
+            walk(func, stats[func][3])
+
+    name = f"{profile['callback']} #{profile['id']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "multiverse-dashboard",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }]
+    }
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data import get_set_incidence, pack_set_incidence
+
+# Layout of a specs store. Bump the version if it changes.
+#
+# A store is a directory with one binary file per column, written chunk by
+# chunk in rank order, and a manifest (meta.json) with the number of
+# specifications and the name, file and type of each column:
+# - "numeric": a fixed-size array (<file>.bin)
+# - "factor": int16 codes into the values of the factor (<file>.bin)
+# - "strings": UTF-8 strings (<file>.bin) with their end offsets
+#   (<file>.offsets)
+# Additionally, the clusters ("set") and effects ("set_es") of each
+# specification are stored as packed bitsets over the sorted cluster and
+# effect IDs of the manifest, see data.pack_set_incidence().
+# A store written by an update (see engine.update_specs()) also holds the
+# previous rank of each specification (old_ranks.bin, 0 if it was refitted)
+# and the source key of the previous data and specifications ("previous"),
+# see get_source_key().
+STORE_VERSION = 1
+META_FILE = "meta.json"
+OLD_RANKS_FILE = "old_ranks.bin"
+
+# Types of the numeric columns of a specs file
+NUMERIC_TYPES = {
+    "mean": "float64",
+    "lb": "float64",
+    "ub": "float64",
+    "p": "float64",
+    "ci": "float64",
+    "rank": "int64",
+    "k": "int64",
+    "kc": "int64",
+    "full_set": "int64"
+}
+
+# Columns with comma-separated ID sets, and the bitset columns derived
+# from them
+SET_COLUMNS = {"set": "cluster_bits", "set_es": "effect_bits"}
+
+
+def is_store(path):
+    """Check whether a path is a specs store."""
+    return os.path.isfile(os.path.join(path, META_FILE))
+
+
+def read_text(path):
+    """Read the text of a file, or the manifest of a specs store.
+
+    Arguments:
+        path -- The path of the file or store.
+
+    Returns:
+        The text.
+    """
+    if is_store(path):
+        path = os.path.join(path, META_FILE)
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read()
+
+
+def get_source_key(data_content, specs_content):
+    """Get the source key of the data and specifications of a dataset.
+
+    An updated store records the key of the data and specifications it
+    was updated from, so that a dataset built from them can be patched
+    instead of being rebuilt, see dataset.build_dataset().
+
+    Arguments:
+        data_content -- The text of the data file.
+        specs_content -- The text of the specs file, or the manifest of
+                         the specs store, see read_text().
+
+    Returns:
+        The source key as a hex string.
+    """
+    source_hash = hashlib.sha256()
+    for content in [data_content, specs_content]:
+        source_hash.update(content.encode("utf-8"))
+        source_hash.update(b"\0")
+    return source_hash.hexdigest()[:32]
+
+
+def _get_kind(name, factor_lists):
+    """Get the kind of a column of a specs file."""
+    if name in factor_lists:
+        return "factor"
+    if name in NUMERIC_TYPES:
+        return "numeric"
+    return "strings"
+
+
+def write_specs(path, chunks, factor_lists, cluster_ids, effect_ids,
+                previous=None):
+    """Write specifications to a store, one chunk at a time.
+
+    Only one chunk is held in memory at a time. The store is written to a
+    temporary directory next to path first and then moved into place,
+    replacing an existing store.
+
+    Arguments:
+        path -- The path of the store directory.
+        chunks -- The specifications as an iterable of DataFrames with the
+                  columns of a specs file, in rank order.
+        factor_lists -- The which- and how-factors with their values.
+        cluster_ids -- The sorted cluster IDs of the data.
+        effect_ids -- The sorted effect IDs of the data.
+
+    Keyword Arguments:
+        previous -- A tuple of the source key of the data and
+                    specifications the specifications were updated from,
+                    see get_source_key(), and the previous rank of each
+                    specification (default: {None}, not an update).
+
+    Returns:
+        The manifest of the store.
+    """
+    if os.path.exists(path) and not is_store(path):
+        raise ValueError(f"{path} exists and is not a specs store")
+    parent = os.path.dirname(os.path.abspath(path))
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    ids = {"set": np.asarray(cluster_ids), "set_es": np.asarray(effect_ids)}
+    checksum = hashlib.blake2b(digest_size=16)
+    files = {}
+    columns = None
+    n_specs = 0
+
+    def write(name, values):
+        if name not in files:
+            files[name] = open(os.path.join(tmp_dir, name), "wb")
+        data = np.ascontiguousarray(values).tobytes()
+        checksum.update(data)
+        files[name].write(data)
+
+    try:
+        for chunk in chunks:
+            if columns is None:
+                columns = [{
+                    "name": name,
+                    "file": f"column{i}",
+                    "kind": _get_kind(name, factor_lists)
+                } for i, name in enumerate(chunk.columns)]
+            for column in columns:
+                name, file, kind = (column["name"], column["file"],
+                                    column["kind"])
+                values = chunk[name]
+                if kind == "factor":
+                    write(f"{file}.bin", pd.Categorical(
+                        values, categories=factor_lists[name]).codes.astype(
+                            np.int16))
+                elif kind == "numeric":
+                    write(f"{file}.bin",
+                          values.to_numpy(dtype=NUMERIC_TYPES[name]))
+                else:
+                    encoded = [str(value).encode("utf-8") for value in values]
+                    offsets = np.cumsum([len(value) for value in encoded],
+                                        dtype=np.int64)
+                    start = files[f"{file}.bin"].tell() if (
+                        f"{file}.bin" in files) else 0
+                    write(f"{file}.offsets", offsets + start)
+                    write(f"{file}.bin", np.frombuffer(b"".join(encoded),
+                                                       dtype=np.uint8))
+                if name in SET_COLUMNS:
+                    write(f"{SET_COLUMNS[name]}.bin", pack_set_incidence(
+                        *get_set_incidence(values, ids[name]),
+                        len(ids[name]), len(chunk)))
+            n_specs += len(chunk)
+        if previous is not None:
+            write(OLD_RANKS_FILE, np.asarray(previous[1], dtype=np.int64))
+        for file in files.values():
+            file.close()
+
+        meta = {
+            "version": STORE_VERSION,
+            "n_specs": n_specs,
+            "columns": [
+                dict(column, values=factor_lists[column["name"]])
+                if column["kind"] == "factor" else column
+                for column in columns or []
+            ],
+            "cluster_ids": ids["set"].tolist(),
+            "effect_ids": ids["set_es"].tolist(),
+            "checksum": checksum.hexdigest()
+        }
+        if previous is not None:
+            meta["previous"] = previous[0]
+        with open(os.path.join(tmp_dir, META_FILE), "w") as meta_file:
+            json.dump(meta, meta_file)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_dir, path)
+    except BaseException:
+        for file in files.values():
+            file.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return meta
+
+
+def read_meta(path):
+    """Read the manifest of a store.
+
+    Arguments:
+        path -- The path of the store directory.
+
+    Returns:
+        The manifest, see write_specs().
+    """
+    with open(os.path.join(path, META_FILE), "r") as meta_file:
+        meta = json.load(meta_file)
+    if meta["version"] != STORE_VERSION:
+        raise ValueError(f"Unsupported specs store version {meta['version']}")
+    return meta
+
+
+def _read_array(path, dtype, shape, mmap_mode):
+    """Read a binary array, memory-mapped if mmap_mode is set."""
+    if shape[0] == 0:
+        return np.empty(shape, dtype=dtype)
+    if mmap_mode is not None:
+        return np.memmap(path, dtype=dtype, mode=mmap_mode, shape=shape)
+    return np.fromfile(path, dtype=dtype).reshape(shape)
+
+
+def read_columns(path, columns=None, mmap_mode="r"):
+    """Read columns of a store without reading the others.
+
+    Arguments:
+        path -- The path of the store directory.
+
+    Keyword Arguments:
+        columns -- The names of the columns, which may include the bitset
+                   columns "cluster_bits" and "effect_bits"
+                   (default: {None}, all columns of the specs file).
+        mmap_mode -- If set (e.g. "r"), numeric, factor and bitset columns
+                     are memory-mapped instead of read into memory
+                     (default: {"r"}).
+
+    Returns:
+        A dictionary with the values of each column as an array: factor
+        codes as int16, strings as objects and bitsets as uint8 arrays
+        of shape (specifications, bytes).
+    """
+    meta = read_meta(path)
+    n_specs = meta["n_specs"]
+    kinds = {column["name"]: column["kind"] for column in meta["columns"]}
+    files = {column["name"]: os.path.join(path, column["file"])
+             for column in meta["columns"]}
+    n_ids = {"cluster_bits": len(meta["cluster_ids"]),
+             "effect_bits": len(meta["effect_ids"])}
+    if columns is None:
+        columns = list(kinds)
+
+    arrays = {}
+    for name in columns:
+        if name in n_ids:
+            arrays[name] = _read_array(
+                os.path.join(path, f"{name}.bin"), np.uint8,
+                (n_specs, (n_ids[name] + 7) // 8), mmap_mode)
+        elif name not in kinds:
+            raise KeyError(f"Unknown specs column {name}")
+        elif kinds[name] == "factor":
+            arrays[name] = _read_array(f"{files[name]}.bin", np.int16,
+                                       (n_specs,), mmap_mode)
+        elif kinds[name] == "numeric":
+            arrays[name] = _read_array(f"{files[name]}.bin",
+                                       NUMERIC_TYPES[name], (n_specs,),
+                                       mmap_mode)
+        else:
+            ends = np.fromfile(f"{files[name]}.offsets", dtype=np.int64)
+            with open(f"{files[name]}.bin", "rb") as string_file:
+                data = string_file.read()
+            starts = np.concatenate([[0], ends[:-1]]).astype(np.int64)
+            arrays[name] = np.array([
+                data[start:end].decode("utf-8")
+                for start, end in zip(starts, ends)
+            ], dtype=object)
+    return arrays
+
+
+def read_old_ranks(path):
+    """Read the previous ranks of the specifications of an updated store.
+
+    Arguments:
+        path -- The path of the store directory.
+
+    Returns:
+        The previous rank of each specification (0 if it was refitted), or
+        None if the store was not written by an update.
+    """
+    meta = read_meta(path)
+    if "previous" not in meta:
+        return None
+    return _read_array(os.path.join(path, OLD_RANKS_FILE), np.int64,
+                       (meta["n_specs"],), None)
+
+
+def read_specs(path, columns=None):
+    """Read a store as the specification data of a specs file.
+
+    Arguments:
+        path -- The path of the store directory.
+
+    Keyword Arguments:
+        columns -- The names of the columns (default: {None}, all columns of
+                   the specs file).
+
+    Returns:
+        The specifications as a DataFrame ordered by rank, with factor
+        values in place of their codes.
+    """
+    meta = read_meta(path)
+    values = {column["name"]: column.get("values")
+              for column in meta["columns"]}
+    if columns is None:
+        columns = list(values)
+    arrays = read_columns(path, columns, mmap_mode=None)
+    specs = pd.DataFrame(index=pd.RangeIndex(meta["n_specs"]))
+    for name in columns:
+        if values[name] is not None:
+            specs[name] = np.array(values[name] + [None],
+                                   dtype=object)[arrays[name]]
+        else:
+            specs[name] = arrays[name]
+    return specs
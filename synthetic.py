@@ -0,0 +1,326 @@
+import argparse
+import copy
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import bootstrap
+import engine
+from config import read_config
+from data import prepare_data
+
+# Clusters generated at once. Every block of clusters draws from its own
+# seed, so the data only depends on the seed, not on how it is written.
+BLOCK_CLUSTERS = 10000
+
+# Mean number of effects per cluster; the numbers are geometrically
+# distributed, so most clusters have one or two effects and a few many
+MEAN_CLUSTER_SIZE = 4.0
+
+# Random-effects model of the log odds ratios: the overall mean and the
+# standard deviations between and within clusters
+MEAN_LOG_OR = 0.15
+SD_BETWEEN = 0.15
+SD_WITHIN = 0.05
+
+# Log-normal distribution of the sample sizes of the clusters
+MEDIAN_N = 2000
+SD_LOG_N = 1.2
+MIN_N = 20
+
+# Probability that an effect has the factor values of its cluster
+CLUSTER_SHARE = 0.7
+
+# Values of the which-factors added by add_which_factors()
+EXTRA_VALUES = ["A", "B", "C", "D"]
+
+
+def add_which_factors(config_json, n_factors):
+    """Add which-factors with the values EXTRA_VALUES to a configuration.
+
+    Each added factor multiplies the number of which-factor combinations by
+    up to the number of values plus one (for all values).
+
+    Arguments:
+        config_json -- The raw configuration as a dictionary.
+        n_factors -- The number of factors to add.
+
+    Returns:
+        The raw configuration with the added factors.
+    """
+    config_json = copy.deepcopy(config_json)
+    which = config_json["which"]
+    for j in range(n_factors):
+        which["n"] += 1
+        which["keys"].append(f"Synthetic.factor.{j + 1}")
+        which["keys_labels"].append(f"Synthetic {j + 1}")
+        which["add_all_values"].append(True)
+        which["values"].append(list(EXTRA_VALUES))
+        which["values_labels"].append(list(EXTRA_VALUES))
+    return config_json
+
+
+def _get_rng(seed, *key):
+    """Get the random number generator of a part of the data."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=key))
+
+
+def get_factor_probabilities(config_json, seed=0):
+    """Draw the probabilities of the values of each which-factor.
+
+    Arguments:
+        config_json -- The raw configuration as a dictionary.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+
+    Returns:
+        A dictionary with the probabilities of the values of each factor,
+        drawn from a flat Dirichlet distribution, so some values are
+        much more frequent than others.
+    """
+    rng = _get_rng(seed, 0)
+    which = config_json["which"]
+    return {
+        key: rng.dirichlet(np.ones(len(values)))
+        for key, values in zip(which["keys"], which["values"])
+    }
+
+
+def generate_block(config_json, block, first_e_id, n_max, seed=0,
+                   mean_cluster_size=MEAN_CLUSTER_SIZE, probabilities=None):
+    """Generate the effects of a block of clusters.
+
+    Arguments:
+        config_json -- The raw configuration as a dictionary.
+        block -- The index of the block; its clusters have the IDs
+                 block * BLOCK_CLUSTERS + 1 and up.
+        first_e_id -- The ID of the first effect.
+        n_max -- The maximum number of effects. The last cluster is cut
+                 short if the block has more.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+        mean_cluster_size -- The mean number of effects per cluster
+                             (default: {MEAN_CLUSTER_SIZE}).
+        probabilities -- The probabilities of the factor values
+                         (default: {None}, see get_factor_probabilities()).
+
+    Returns:
+        The effects as a DataFrame with the columns of the column-map and
+        the which-factors.
+    """
+    if probabilities is None:
+        probabilities = get_factor_probabilities(config_json, seed)
+    colmap = config_json["colmap"]
+    which = config_json["which"]
+    rng = _get_rng(seed, 1, block)
+
+    sizes = rng.geometric(1 / mean_cluster_size, BLOCK_CLUSTERS)
+    n_clusters = min(BLOCK_CLUSTERS,
+                     int(np.searchsorted(np.cumsum(sizes), n_max)) + 1)
+    sizes = sizes[:n_clusters]
+    sizes[-1] -= max(0, sizes.sum() - n_max)
+    clusters = np.repeat(np.arange(n_clusters), sizes)
+    n_effects = len(clusters)
+    c_ids = block * BLOCK_CLUSTERS + 1 + np.arange(n_clusters)
+
+    # Sample sizes are shared by the effects of a cluster, the share of
+    # cases differs between outcomes
+    n = np.maximum(MIN_N, np.round(np.exp(
+        np.log(MEDIAN_N) + SD_LOG_N * rng.standard_normal(n_clusters))))
+    n = n.astype(np.int64)[clusters]
+    cases = rng.uniform(0.02, 0.3, n_effects)
+    var = 1 / (n * cases) + 1 / (n * (1 - cases))
+    log_or = (MEAN_LOG_OR
+              + SD_BETWEEN * rng.standard_normal(n_clusters)[clusters]
+              + SD_WITHIN * rng.standard_normal(n_effects)
+              + np.sqrt(var) * rng.standard_normal(n_effects))
+
+    columns = {
+        colmap["key_c_id"]: c_ids[clusters],
+        colmap["key_c"]: np.char.add("Sample ", c_ids.astype(str))[clusters],
+        colmap["key_e_id"]: first_e_id + np.arange(n_effects),
+        colmap["key_n"]: n,
+        colmap["key_logOR"]: log_or,
+        colmap["key_logOR_se"]: np.sqrt(var),
+        colmap["key_logOR_var"]: var,
+        colmap["key_main_es"]: log_or,
+        colmap["key_main_es_se"]: np.sqrt(var)
+    }
+    for key, values in zip(which["keys"], which["values"]):
+        p = probabilities[key]
+        codes = rng.choice(len(values), n_clusters, p=p)[clusters]
+        own = rng.random(n_effects) >= CLUSTER_SHARE
+        codes[own] = rng.choice(len(values), own.sum(), p=p)
+        columns[key] = np.asarray(values, dtype=object)[codes]
+    return pd.DataFrame(columns)
+
+
+def generate_data(config_json, n_effects, seed=0,
+                  mean_cluster_size=MEAN_CLUSTER_SIZE):
+    """Generate meta-analytic data block by block.
+
+    Arguments:
+        config_json -- The raw configuration as a dictionary.
+        n_effects -- The number of effects.
+
+    Keyword Arguments:
+        seed -- The seed of the random number generator (default: {0}).
+        mean_cluster_size -- The mean number of effects per cluster
+                             (default: {MEAN_CLUSTER_SIZE}).
+
+    Returns:
+        An iterator over the blocks of effects, see generate_block().
+    """
+    probabilities = get_factor_probabilities(config_json, seed)
+    n_done = 0
+    block = 0
+    while n_done < n_effects:
+        effects = generate_block(config_json, block, n_done + 1,
+                                 n_effects - n_done, seed, mean_cluster_size,
+                                 probabilities)
+        n_done += len(effects)
+        block += 1
+        yield effects
+
+
+def write_data(path, blocks, n_effects=None, progress=True):
+    """Write blocks of meta-analytic data to a data file.
+
+    Only one block is held in memory at a time.
+
+    Arguments:
+        path -- The path of the data file.
+        blocks -- The blocks of effects as an iterable of DataFrames.
+
+    Keyword Arguments:
+        n_effects -- The total number of effects, for the progress
+                     (default: {None}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The number of effects written.
+    """
+    start = time.perf_counter()
+    n_done = 0
+    for i, effects in enumerate(blocks):
+        effects.to_csv(path, mode="a" if i else "w", header=not i,
+                       index=False, na_rep="NA")
+        n_done += len(effects)
+        if progress and n_effects:
+            engine.print_progress(n_done, n_effects, start, action="Written",
+                                  unit="effects")
+    return n_done
+
+
+def write_synthetic(config_json, directory, n_effects, name="synthetic",
+                    seed=0, mean_cluster_size=MEAN_CLUSTER_SIZE,
+                    data_only=False, store=False, n_workers=None,
+                    n_iter=None, memory_bytes=None, progress=True):
+    """Write a synthetic dataset.
+
+    The data file is streamed to disk, so it can be larger than memory.
+    The specs and boot files are computed from it with engine.py and
+    bootstrap.py, which need the data in memory.
+
+    Arguments:
+        config_json -- The raw configuration as a dictionary.
+        directory -- The directory of the dataset files.
+        n_effects -- The number of effects.
+
+    Keyword Arguments:
+        name -- The name of the dataset files, e.g. data_<name>.csv
+                (default: {"synthetic"}).
+        seed -- The seed of the random number generator (default: {0}).
+        mean_cluster_size -- The mean number of effects per cluster
+                             (default: {MEAN_CLUSTER_SIZE}).
+        data_only -- Whether to only write the configuration and data file
+                     (default: {False}).
+        store -- Whether to write the specifications as a specs store
+                 instead of a specs file (default: {False}).
+        n_workers -- The number of worker processes
+                     (default: {None}, the number of CPUs).
+        n_iter -- The number of bootstrap iterations
+                  (default: {None}, n_boot_iter of the configuration).
+        memory_bytes -- The memory budget of the bootstrap, see
+                        bootstrap.bootstrap_specs() (default: {None}).
+        progress -- Whether to print the progress (default: {True}).
+
+    Returns:
+        The paths of the written boot, config, data and specs files, in
+        that order, without those that were not written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    config_path = os.path.join(directory, f"config_{name}.json")
+    data_path = os.path.join(directory, f"data_{name}.csv")
+    specs_path = os.path.join(directory,
+                              f"specs_{name}" + ("" if store else ".csv"))
+    boot_path = os.path.join(directory, f"boot_{name}.csv")
+
+    with open(config_path, "w") as config_file:
+        json.dump(config_json, config_file, indent=4)
+    write_data(data_path,
+               generate_data(config_json, n_effects, seed, mean_cluster_size),
+               n_effects, progress)
+    if data_only:
+        return [config_path, data_path]
+
+    config = read_config(path=config_path)
+    data = prepare_data(config["colmap"], raw=data_path)
+    if engine.write_specs(data, config, specs_path, n_workers,
+                          progress=progress) is None:
+        return [config_path, data_path]
+    boot = bootstrap.bootstrap_specs(data, config, n_iter, seed, n_workers,
+                                     memory_bytes=memory_bytes,
+                                     progress=progress)
+    boot.to_csv(boot_path, index=False)
+    return [boot_path, config_path, data_path, specs_path]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic multiverse dataset for load and "
+                    "scale testing.")
+    parser.add_argument("config", help="path of the configuration file")
+    parser.add_argument("output", help="directory of the dataset files")
+    parser.add_argument("--effects", type=int, required=True,
+                        help="number of effects")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random number generator")
+    parser.add_argument("--name", default="synthetic",
+                        help="name of the dataset files")
+    parser.add_argument("--cluster-size", type=float,
+                        default=MEAN_CLUSTER_SIZE,
+                        help="mean number of effects per cluster")
+    parser.add_argument("--extra-factors", type=int, default=0,
+                        help="number of which-factors to add to the "
+                             "configuration")
+    parser.add_argument("--data-only", action="store_true",
+                        help="only write the configuration and data file")
+    parser.add_argument("--store", action="store_true",
+                        help="write a specs store instead of a specs file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="number of bootstrap iterations "
+                             "(default: n_boot_iter)")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="memory budget of the bootstrap in MB")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.config, "r") as config_file:
+        config_json = add_which_factors(json.load(config_file),
+                                        args.extra_factors)
+    memory_bytes = (args.memory_mb * 2**20 if args.memory_mb is not None
+                    else None)
+    paths = write_synthetic(config_json, args.output, args.effects,
+                            args.name, args.seed, args.cluster_size,
+                            args.data_only, args.store, args.workers,
+                            args.iterations, memory_bytes)
+    print(f"{', '.join(paths)} written in "
+          f"{time.perf_counter() - start:.2f}s")